@@ -5,6 +5,8 @@ r"""BREP module of aocxchange"""
 from __future__ import print_function
 
 import logging
+import os
+import tempfile
 
 import OCC
 from OCC.Core.BRep import BRep_Builder
@@ -14,12 +16,20 @@ if OCC.VERSION[0] == '7':
 else:
     from OCC.Core.Message import Handle_Message_ProgressIndicator
 from OCC.Core.TopoDS import TopoDS_Shape
+try:
+    from OCC.Core.BRepTools import breptools_WriteToString, \
+        breptools_ReadFromString
+    HAVE_BREP_STRINGS = True
+except ImportError:
+    HAVE_BREP_STRINGS = False
 
 # import aocxchange.exceptions
 from aocxchange.extensions import brep_extensions
 # import aocxchange.utils
 from aocxchange.checks import check_importer_filename, check_exporter_filename,\
     check_overwrite, check_shape
+from aocxchange.stats import Stats
+from aocxchange.topology import nb_faces
 
 logger = logging.getLogger(__name__)
 
@@ -30,10 +40,13 @@ class BrepImporter(object):
     Parameters
     ----------
     filename : str
+    callback : callable, optional
+        Called at the end of each phase, see aocxchange.stats.Stats
 
     """
-    def __init__(self, filename):
+    def __init__(self, filename, callback=None):
         logger.info("BrepImporter instantiated with filename : %s" % filename)
+        self.stats = Stats("BrepImporter", callback)
 
         check_importer_filename(filename, brep_extensions)
         self._filename = filename
@@ -46,8 +59,11 @@ class BrepImporter(object):
         r"""Read the BREP file and stores the result in a TopoDS_Shape"""
         shape = TopoDS_Shape()
         builder = BRep_Builder()
-        breptools_Read(shape, self._filename, builder)
+        with self.stats.phase("read"):
+            breptools_Read(shape, self._filename, builder)
         self._shape = shape
+        # Only counted if the counts are read (not for the cache entries)
+        self.stats.count("faces", lambda: nb_faces(shape))
 
     @property
     def shape(self):
@@ -64,10 +80,13 @@ class BrepExporter(object):
     Parameters
     ----------
     filename : str
+    callback : callable, optional
+        Called at the end of each phase, see aocxchange.stats.Stats
 
     """
-    def __init__(self, filename=None):
+    def __init__(self, filename=None, callback=None):
         logger.info("BrepExporter instantiated with filename : %s" % filename)
+        self.stats = Stats("BrepExporter", callback)
 
         check_exporter_filename(filename, brep_extensions)
         check_overwrite(filename)
@@ -86,13 +105,80 @@ class BrepExporter(object):
         """
         check_shape(a_shape)  # raises an exception if the shape is not valid
         self._shape = a_shape
+        self.stats.count("faces", lambda: nb_faces(a_shape))
 
     def write_file(self):
         r"""Write file"""
         logger.info("Writing brep : {cad_file}".format(cad_file=self._filename))
-        if OCC.VERSION[0] == '7':
-            builder = Handle_Message_ProgressIndicator_Create()
-        else:
-            builder = Handle_Message_ProgressIndicator()
-        breptools_Write(self._shape, self._filename, builder)
+        with self.stats.phase("write"):
+            breptools_Write(self._shape,
+                            self._filename,
+                            _progress_indicator())
         logger.info("Wrote BREP file")
+
+
+def _progress_indicator():
+    r"""Progress indicator argument of breptools_Write"""
+    if OCC.VERSION[0] == '7':
+        return Handle_Message_ProgressIndicator_Create()
+    return Handle_Message_ProgressIndicator()
+
+
+def shape_to_brep_string(a_shape):
+    r"""Serialize a shape to a BREP string
+
+    e.g. to send a shape to another process. Uses breptools_WriteToString
+    if available, a temporary BREP file otherwise.
+
+    Parameters
+    ----------
+    a_shape : TopoDS_Shape
+
+    Returns
+    -------
+    str
+
+    """
+    check_shape(a_shape)
+    if HAVE_BREP_STRINGS:
+        return breptools_WriteToString(a_shape)
+
+    fd, filename = tempfile.mkstemp(suffix=".brep")
+    os.close(fd)
+    try:
+        breptools_Write(a_shape, filename, _progress_indicator())
+        with open(filename) as f:
+            return f.read()
+    finally:
+        os.remove(filename)
+
+
+def brep_string_to_shape(brep_string):
+    r"""Deserialize a shape from a BREP string (see shape_to_brep_string)
+
+    Parameters
+    ----------
+    brep_string : str
+
+    Returns
+    -------
+    TopoDS_Shape
+
+    """
+    if HAVE_BREP_STRINGS:
+        shape = breptools_ReadFromString(brep_string)
+    else:
+        fd, filename = tempfile.mkstemp(suffix=".brep")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(brep_string)
+            shape = TopoDS_Shape()
+            breptools_Read(shape, filename, BRep_Builder())
+        finally:
+            os.remove(filename)
+
+    if shape.IsNull():
+        msg = "The BREP string does not contain a shape"
+        logger.error(msg)
+        raise ValueError(msg)
+    return shape
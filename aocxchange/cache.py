@@ -0,0 +1,256 @@
+# coding: utf-8
+
+r"""Persistent content-addressed cache of imported shapes
+
+Translating STEP and IGES files is slow. The shapes transferred from a
+file are stored as BREP files, under a key made of the hash of the file
+content and of the reader settings, and later imports of the same file
+(whatever its name or location) are served from the cache.
+
+"""
+
+from __future__ import print_function
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+
+import OCC
+try:
+    from OCC.Core.Interface import Interface_Static_CVal
+except ImportError:
+    # pythonocc >= 7.7.1
+    from OCC.Core.Interface import Interface_Static
+    Interface_Static_CVal = Interface_Static.CVal
+
+from aocxchange.brep import BrepImporter, BrepExporter
+
+logger = logging.getLogger(__name__)
+
+# Statistics of a cache, see BrepCache.stats
+CacheStats = collections.namedtuple("CacheStats",
+                                    ["hits",
+                                     "misses",
+                                     "evictions",
+                                     "entries",
+                                     "size"])
+
+# Shapes of a cache entry, with the root index and the entity type of the
+# roots they were transferred from
+CacheEntry = collections.namedtuple("CacheEntry",
+                                    ["shapes", "roots", "root_types"])
+
+
+def default_cache_directory():
+    r"""AOCXCHANGE_CACHE_DIR if defined, ~/.cache/aocxchange/brep otherwise"""
+    return os.environ.get("AOCXCHANGE_CACHE_DIR",
+                          os.path.join(os.path.expanduser("~"),
+                                       ".cache",
+                                       "aocxchange",
+                                       "brep"))
+
+
+def reader_settings(names):
+    r"""Current values of Interface_Static reader settings
+
+    Parameters
+    ----------
+    names : list[str]
+        e.g. ["read.precision.val", "xstep.cascade.unit"]
+
+    Returns
+    -------
+    dict
+        setting name -> value as a string
+
+    """
+    return dict((name, Interface_Static_CVal(name)) for name in names)
+
+
+class BrepCache(object):
+    r"""Size bounded, least recently used cache of transferred shapes
+
+    Each entry is a directory named after its key, holding a BREP file per
+    shape and a manifest. Entries are written to a temporary directory and
+    renamed, so that a cache directory can be shared by processes.
+
+    Parameters
+    ----------
+    directory : str, optional
+        Default is default_cache_directory()
+    max_size : int, optional
+        Maximum size of the cache in bytes (default is 1 GB). The least
+        recently used entries are evicted when an entry is added.
+
+    """
+    MANIFEST = "manifest.json"
+    HASH_BLOCK_SIZE = 1 << 20
+
+    def __init__(self, directory=None, max_size=1 << 30):
+        self.directory = directory if directory is not None \
+            else default_cache_directory()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def key(self, filename, settings=None):
+        r"""Key of the content of a file read with some settings
+
+        Parameters
+        ----------
+        filename : str
+        settings : dict, optional
+            Reader settings that change the transferred shapes
+
+        Returns
+        -------
+        str
+
+        """
+        digest = hashlib.sha256()
+        with open(filename, "rb") as f:
+            for block in iter(lambda: f.read(self.HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        settings = dict(settings or dict(), occ_version=OCC.VERSION)
+        digest.update(json.dumps(settings, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        r"""Cached shapes of a key
+
+        Returns
+        -------
+        CacheEntry or None if the key is not in the cache
+
+        """
+        entry_directory = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(entry_directory, self.MANIFEST)) as f:
+                manifest = json.load(f)
+            shapes = [BrepImporter(os.path.join(entry_directory,
+                                                "%i.brep" % i)).shape
+                      for i in range(len(manifest["roots"]))]
+        except (IOError, OSError, ValueError, KeyError, AssertionError) as e:
+            logger.debug("Cache miss for %s (%s)" % (key, e))
+            self.misses += 1
+            return None
+
+        # Least recently used order
+        try:
+            os.utime(entry_directory, None)
+        except OSError:
+            # Evicted by another process since it was read
+            logger.debug("Entry %s evicted while read" % key)
+        self.hits += 1
+        logger.info("Cache hit for %s" % key)
+        return CacheEntry(shapes, manifest["roots"], manifest["root_types"])
+
+    def put(self, key, shapes, roots=None, root_types=None):
+        r"""Store shapes under a key
+
+        Parameters
+        ----------
+        key : str
+        shapes : list[TopoDS_Shape]
+        roots : list[int], optional
+            Root index of each shape, default is 0, 1, 2 ...
+        root_types : list[str], optional
+            Entity type of every root of the file
+
+        Raises
+        ------
+        OSError
+            If the entry cannot be stored (e.g. no space left on device),
+            unless another process stored it
+
+        """
+        entry_directory = os.path.join(self.directory, key)
+        if os.path.isdir(entry_directory):
+            return
+
+        tmp_directory = tempfile.mkdtemp(prefix=".%s." % uuid.uuid4().hex,
+                                         dir=self.directory)
+        try:
+            for i, shape in enumerate(shapes):
+                exporter = BrepExporter(os.path.join(tmp_directory,
+                                                     "%i.brep" % i))
+                exporter.set_shape(shape)
+                exporter.write_file()
+            with open(os.path.join(tmp_directory, self.MANIFEST), "w") as f:
+                json.dump({"roots": roots if roots is not None
+                           else list(range(len(shapes))),
+                           "root_types": root_types or list()}, f)
+            os.rename(tmp_directory, entry_directory)
+        except OSError as e:
+            if not os.path.isdir(entry_directory):
+                # e.g. no space left on device
+                msg = "Cannot store entry %s in the cache (%s)" % (key, e)
+                logger.error(msg)
+                raise
+            # Another process stored the same entry in the meantime
+            logger.debug("Entry %s already stored" % key)
+        finally:
+            if os.path.isdir(tmp_directory):
+                shutil.rmtree(tmp_directory)
+        self.evict()
+
+    def evict(self):
+        r"""Remove the least recently used entries until the cache size is
+        at most max_size (the most recent entry is always kept)"""
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        size = sum(entry_size for _, _, entry_size in entries)
+        for name, _, entry_size in entries[:-1]:
+            if size <= self.max_size:
+                break
+            shutil.rmtree(os.path.join(self.directory, name),
+                          ignore_errors=True)
+            size -= entry_size
+            self.evictions += 1
+            logger.info("Evicted %s from the cache" % name)
+
+    def clear(self):
+        r"""Remove all the entries"""
+        for name, _, _ in self._entries():
+            shutil.rmtree(os.path.join(self.directory, name),
+                          ignore_errors=True)
+
+    def stats(self):
+        r"""Statistics of the cache
+
+        Returns
+        -------
+        CacheStats
+            hits, misses and evictions of this instance; number of entries
+            and size in bytes of the cache directory
+
+        """
+        entries = self._entries()
+        return CacheStats(self.hits,
+                          self.misses,
+                          self.evictions,
+                          len(entries),
+                          sum(entry_size for _, _, entry_size in entries))
+
+    def _entries(self):
+        r"""(name, last access time, size) of the entries"""
+        entries = list()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(path, f))
+                           for f in os.listdir(path))
+                entries.append((name, os.path.getmtime(path), size))
+            except OSError:
+                # Evicted by another process
+                continue
+        return entries
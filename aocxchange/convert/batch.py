@@ -0,0 +1,307 @@
+# coding: utf-8
+
+r"""Batch conversion of many CAD files
+
+Files are converted in a pool of worker processes that import the
+conversion function (and OCC) once, not once per file. A file whose
+conversion does not end within a timeout of its start (e.g. because its
+worker process crashed) is reported as failed.
+
+"""
+
+from __future__ import print_function
+
+import collections
+import glob
+import logging
+import multiprocessing
+import os
+import time
+import traceback
+
+from aocxchange.utils import extract_file_extension
+
+logger = logging.getLogger(__name__)
+
+# Interval between two checks of the pool results, in seconds
+POLL_INTERVAL = 0.05
+
+# Start time of each task, shared by the worker processes of a pool (0. for
+# the tasks that have not started)
+_task_starts = None
+
+# Outcome of the conversion of a file, error is None on success
+BatchResult = collections.namedtuple("BatchResult",
+                                     ["input_file",
+                                      "output_file",
+                                      "duration",
+                                      "error"])
+
+
+def expand_inputs(paths, extensions):
+    r"""Files designated by file paths, glob patterns and directories
+
+    Directories are searched recursively for the files with one of the
+    extensions (case insensitive).
+
+    Parameters
+    ----------
+    paths : list[str]
+    extensions : list[str]
+        e.g. aocxchange.extensions.step_extensions
+
+    Returns
+    -------
+    list[str]
+        Absolute paths, without duplicates, in a deterministic order
+
+    """
+    def has_extension(filename):
+        return extract_file_extension(filename).lower() in extensions
+
+    files = list()
+    for path in paths:
+        if os.path.isdir(path):
+            found = list()
+            for root, _, filenames in os.walk(path):
+                found.extend(os.path.join(root, f)
+                             for f in filenames if has_extension(f))
+            files.extend(sorted(found))
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            matches = sorted(f for f in glob.glob(path) if os.path.isfile(f))
+            if not matches:
+                logger.warning("No file matches %s" % path)
+            files.extend(matches)
+
+    unique = list()
+    seen = set()
+    for f in (os.path.abspath(f) for f in files):
+        if f not in seen:
+            seen.add(f)
+            unique.append(f)
+    return unique
+
+
+def output_path(input_file, extension, output_dir=None):
+    r"""Path of the converted file: input_file with the new extension, in
+    output_dir if not None"""
+    base = os.path.splitext(input_file)[0] + extension
+    if output_dir is None:
+        return base
+    return os.path.join(output_dir, os.path.basename(base))
+
+
+def output_paths(files, extension, output_dir=None):
+    r"""Paths of the converted files
+
+    The converted files are written flat in output_dir (see output_path),
+    unless two of them would have the same name (e.g. a/part.stp and
+    b/part.stp): the paths of the files relative to their common directory
+    are then kept in output_dir (a/part.stl and b/part.stl).
+
+    Parameters
+    ----------
+    files : list[str]
+    extension : str
+    output_dir : str, optional
+
+    Returns
+    -------
+    list[str]
+
+    Raises
+    ------
+    ValueError
+        If two files would still be converted to the same file, e.g.
+        part.stp and part.step of the same directory
+
+    """
+    paths = [output_path(f, extension, output_dir) for f in files]
+    if output_dir is not None and _has_duplicates(paths):
+        directories = [os.path.dirname(os.path.abspath(f)) + os.sep
+                       for f in files]
+        root = os.path.dirname(os.path.commonprefix(directories))
+        paths = [os.path.join(output_dir,
+                              os.path.splitext(os.path.relpath(
+                                  os.path.abspath(f), root))[0] + extension)
+                 for f in files]
+    if _has_duplicates(paths):
+        msg = "Several files would be converted to the same file"
+        logger.error(msg)
+        raise ValueError(msg)
+    return paths
+
+
+def _has_duplicates(paths):
+    r"""Do some paths designate the same file?"""
+    paths = [os.path.normcase(os.path.abspath(path)) for path in paths]
+    return len(set(paths)) != len(paths)
+
+
+def _init_worker(task_starts):
+    r"""Pool initializer, shares the start times of the tasks"""
+    global _task_starts
+    _task_starts = task_starts
+
+
+def _convert(task, index=None):
+    r"""Convert a file, timing it and catching any error (pool task)"""
+    function, input_file, output_file, kwargs = task
+    start = time.time()
+    if index is not None and _task_starts is not None:
+        _task_starts[index] = start
+    try:
+        function(input_file, output_file, **kwargs)
+        error = None
+    except Exception as e:
+        logger.debug(traceback.format_exc())
+        error = "%s: %s" % (type(e).__name__, e)
+    return BatchResult(input_file, output_file, time.time() - start, error)
+
+
+def convert_batch(function, files, extension, output_dir=None, jobs=1,
+                  timeout=3600., **kwargs):
+    r"""Convert files with function
+
+    Parameters
+    ----------
+    function : callable
+        function(input_file, output_file, **kwargs), a module level function
+        (e.g. step_to_stl) so that it can be sent to the worker processes
+    files : list[str]
+    extension : str
+        Extension of the converted files, e.g. ".stl"
+    output_dir : str, optional
+        Directory of the converted files, default is the directory of each
+        input file. See output_paths.
+    jobs : int
+        Number of worker processes, default is 1 (no pool)
+    timeout : float or None
+        Time in seconds from the start of the conversion of a file by the
+        pool after which it is reported as failed (e.g. its worker process
+        crashed), default is 3600. None waits forever.
+    kwargs
+        Passed to function
+
+    Returns
+    -------
+    list[BatchResult]
+        In the order of files, whatever jobs
+
+    """
+    outputs = output_paths(files, extension, output_dir)
+    for directory in set(os.path.dirname(f) for f in outputs):
+        if directory != "" and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    tasks = [(function, f, output_file, kwargs)
+             for f, output_file in zip(files, outputs)]
+    if jobs > 1 and len(tasks) > 1:
+        return _convert_in_pool(tasks, jobs, timeout)
+
+    results = list()
+    for task in tasks:
+        result = _convert(task)
+        _log_result(result, len(results) + 1, len(tasks))
+        results.append(result)
+    return results
+
+
+def _convert_in_pool(tasks, jobs, timeout):
+    r"""Run the conversion tasks in a pool of jobs processes
+
+    The results are collected as they come. A task whose result does not
+    come within timeout of its start (a crashed worker is replaced by the
+    pool, but its result never comes) gets a timeout error.
+
+    Returns
+    -------
+    list[BatchResult]
+        In the order of tasks
+
+    """
+    task_starts = multiprocessing.Array("d", len(tasks), lock=False)
+    pool = multiprocessing.Pool(min(jobs, len(tasks)),
+                                _init_worker,
+                                (task_starts, ))
+    results = [None] * len(tasks)
+    nb_done = 0
+    timed_out = False
+    try:
+        pending = [pool.apply_async(_convert, (task, i))
+                   for i, task in enumerate(tasks)]
+        while nb_done < len(tasks):
+            for i, (_, input_file, output_file, _) in enumerate(tasks):
+                if results[i] is not None:
+                    continue
+                if pending[i].ready():
+                    results[i] = pending[i].get()
+                elif timeout is not None and task_starts[i] > 0. and \
+                        time.time() - task_starts[i] > timeout:
+                    timed_out = True
+                    results[i] = BatchResult(input_file,
+                                             output_file,
+                                             time.time() - task_starts[i],
+                                             "Timeout: no result after "
+                                             "%.0f s, the worker process "
+                                             "may have crashed" % timeout)
+                else:
+                    continue
+                nb_done += 1
+                _log_result(results[i], nb_done, len(tasks))
+            if nb_done < len(tasks):
+                time.sleep(POLL_INTERVAL)
+    finally:
+        if timed_out or nb_done < len(tasks):
+            # Do not wait for the conversions that never end
+            pool.terminate()
+        else:
+            pool.close()
+        pool.join()
+    return results
+
+
+def _log_result(result, index, total):
+    r"""Log the outcome of the conversion of a file"""
+    if result.error is None:
+        logger.info("[%i/%i] %s converted in %.2f s" % (index,
+                                                        total,
+                                                        result.input_file,
+                                                        result.duration))
+    else:
+        logger.error("[%i/%i] %s failed : %s" % (index,
+                                                 total,
+                                                 result.input_file,
+                                                 result.error))
+
+
+def summary(results, wall_time=None):
+    r"""Human readable summary of batch results
+
+    Parameters
+    ----------
+    results : list[BatchResult]
+    wall_time : float, optional
+        Total elapsed time of the batch
+
+    Returns
+    -------
+    str
+
+    """
+    failures = [r for r in results if r.error is not None]
+    lines = ["%8.2f s  %s  %s" % (r.duration,
+                                  "FAILED" if r.error else "ok    ",
+                                  r.input_file) for r in results]
+    lines.append("%i file(s), %i converted, %i failed, "
+                 "%.2f s of conversion" % (len(results),
+                                           len(results) - len(failures),
+                                           len(failures),
+                                           sum(r.duration for r in results)))
+    if wall_time is not None:
+        lines[-1] += " in %.2f s" % wall_time
+    for r in failures:
+        lines.append("FAILED %s : %s" % (r.input_file, r.error))
+    return "\n".join(lines)
@@ -0,0 +1,188 @@
+# coding: utf-8
+
+r"""Convert OCC shapes to pymesh meshes, in memory
+
+The triangulation of the faces (BRep_Tool.Triangulation) is read directly
+into numpy arrays, without writing and reading back intermediate STL files.
+
+"""
+
+import itertools
+import logging
+
+import numpy
+
+from OCC.Core.BRep import BRep_Tool
+from OCC.Core.TopAbs import TopAbs_FACE, TopAbs_REVERSED
+from OCC.Core.TopExp import TopExp_Explorer
+from OCC.Core.TopLoc import TopLoc_Location
+try:
+    from OCC.Core.TopoDS import topods_Face
+except ImportError:
+    # pythonocc >= 7.7.1
+    from OCC.Core.TopoDS import topods
+    topods_Face = topods.Face
+
+from aocutils.mesh import mesh
+
+from aocxchange.pymesh.base import Region, weld_vertices
+from aocxchange.pymesh.indexed import IndexedMesh
+from aocxchange.utils import handle_object
+
+logger = logging.getLogger(__name__)
+
+
+def _is_null(handle):
+    r"""Is an OCC handle null ?"""
+    return handle is None or (hasattr(handle, "IsNull") and handle.IsNull())
+
+
+def face_triangulation(face):
+    r"""Triangulation of a meshed face as numpy arrays
+
+    The location of the face is applied to the nodes and the triangles of
+    reversed faces are flipped, so that all the triangles are consistently
+    oriented (outwards for a solid).
+
+    Parameters
+    ----------
+    face : TopoDS_Face
+
+    Returns
+    -------
+    tuple(nodes, triangles) or None if the face is not meshed
+        nodes : numpy.ndarray of shape (number of nodes, 3)
+        triangles : numpy.ndarray of shape (number of triangles, 3),
+            0 based indices in nodes
+
+    """
+    location = TopLoc_Location()
+    triangulation = BRep_Tool.Triangulation(face, location)
+    if _is_null(triangulation):
+        return None
+    triangulation = handle_object(triangulation)
+
+    nb_nodes = triangulation.NbNodes()
+    nb_triangles = triangulation.NbTriangles()
+    if hasattr(triangulation, "Node"):
+        # OCCT >= 7.6
+        points = (triangulation.Node(i) for i in range(1, nb_nodes + 1))
+        triangles = (triangulation.Triangle(i)
+                     for i in range(1, nb_triangles + 1))
+    else:
+        nodes_array = triangulation.Nodes()
+        triangles_array = triangulation.Triangles()
+        points = (nodes_array.Value(i) for i in range(1, nb_nodes + 1))
+        triangles = (triangles_array.Value(i)
+                     for i in range(1, nb_triangles + 1))
+
+    # Filled in a single pass, without intermediate lists of tuples
+    nodes = numpy.fromiter(
+        itertools.chain.from_iterable(point.Coord() for point in points),
+        dtype=numpy.float64,
+        count=3 * nb_nodes).reshape(-1, 3)
+    triangles = numpy.fromiter(
+        itertools.chain.from_iterable(triangle.Get()
+                                      for triangle in triangles),
+        dtype=numpy.int32,
+        count=3 * nb_triangles).reshape(-1, 3) - 1
+
+    if not location.IsIdentity():
+        trsf = location.Transformation()
+        matrix = numpy.array([[trsf.Value(row, column)
+                               for column in range(1, 5)]
+                              for row in range(1, 4)])
+        nodes = nodes.dot(matrix[:, :3].T) + matrix[:, 3]
+
+    if face.Orientation() == TopAbs_REVERSED:
+        triangles = triangles[:, [0, 2, 1]]
+    return nodes, triangles
+
+
+def shape_triangulation(shape):
+    r"""Triangulation of all the meshed faces of a shape
+
+    Parameters
+    ----------
+    shape : TopoDS_Shape
+        A shape that has been meshed (e.g. with aocutils.mesh.mesh)
+
+    Returns
+    -------
+    tuple(nodes, triangles)
+        Nodes are not shared between faces
+
+    """
+    all_nodes, all_triangles = list(), list()
+    nb_nodes, nb_unmeshed = 0, 0
+    explorer = TopExp_Explorer(shape, TopAbs_FACE)
+    while explorer.More():
+        triangulation = face_triangulation(topods_Face(explorer.Current()))
+        if triangulation is None:
+            nb_unmeshed += 1
+        else:
+            nodes, triangles = triangulation
+            all_nodes.append(nodes)
+            all_triangles.append(triangles + nb_nodes)
+            nb_nodes += len(nodes)
+        explorer.Next()
+
+    if nb_unmeshed > 0:
+        logger.warning("%i face(s) without triangulation" % nb_unmeshed)
+    if not all_triangles:
+        return numpy.zeros((0, 3)), numpy.zeros((0, 3), dtype=numpy.int32)
+    return numpy.concatenate(all_nodes), numpy.concatenate(all_triangles)
+
+
+def shape_to_mesh(shapes,
+                  scale=1.,
+                  factor=4000.,
+                  use_min_dim=False,
+                  names=None,
+                  tolerance=0.):
+    r"""Mesh shapes and convert them to an indexed mesh
+
+    Parameters
+    ----------
+    shapes : TopoDS_Shape or sequence of TopoDS_Shape
+    scale : float
+        Uniform scaling (origin centered) of the result
+    factor : float
+        Meshing factor, optional (default is 4000.)
+        The higher, the finer the mesh and the bigger the resulting file
+    use_min_dim : bool, optional (default is False)
+        Use the minimum dimension of the shape as a base for meshing
+        This is useful for shapes with a high aspect ratio
+    names : list[str], optional
+        Region name of each shape, default is patch0, patch1 ...
+    tolerance : float
+        Weld tolerance of the nodes, default is 0. (only identical nodes,
+        e.g. on the edges shared by faces, are merged)
+
+    Returns
+    -------
+    IndexedMesh
+        With a region per shape
+
+    """
+    if hasattr(shapes, "ShapeType"):
+        shapes = [shapes]
+    if names is None:
+        names = ["patch%i" % i for i in range(len(shapes))]
+
+    all_nodes, all_triangles, regions = list(), list(), list()
+    nb_nodes, nb_triangles = 0, 0
+    for name, shape in zip(names, shapes):
+        # Must mesh ! Otherwise there is no triangulation
+        mesh(shape, factor=factor, use_min_dim=use_min_dim)
+        nodes, triangles = shape_triangulation(shape)
+        all_nodes.append(nodes)
+        all_triangles.append(triangles + nb_nodes)
+        regions.append(Region(name, nb_triangles, len(triangles)))
+        nb_nodes += len(nodes)
+        nb_triangles += len(triangles)
+
+    nodes = numpy.concatenate(all_nodes) * scale
+    vertices, index = weld_vertices(nodes, tolerance)
+    return IndexedMesh(vertices, index[numpy.concatenate(all_triangles)],
+                       regions)
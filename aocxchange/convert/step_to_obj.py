@@ -4,14 +4,10 @@
 r"""Convert a STEP file to OBJ file"""
 
 import logging
-import shutil
-import tempfile
-import uuid
+import warnings
 
-from os.path import join, abspath
-from aocxchange.convert.step_to_stl import step_to_stl, ONE_SHAPE_PER_FILE
-
-from aocxchange.pymesh import stl
+from aocxchange.convert.shape_to_mesh import shape_to_mesh
+from aocxchange.step import StepImporter
 
 logger = logging.getLogger(__name__)
 
@@ -23,11 +19,12 @@ def step_to_obj(step_file_path,
                 group=True,
                 factor=4000.,
                 use_min_dim=False,
-                remove_intermediate_stl=True):
+                remove_intermediate_stl=None):
     r"""Convert a STEP file to a OBJ file
 
-    This function uses an intermediate conversion from STEP to STL then from
-    STL to OBJ
+    The triangulation of the shapes is converted in memory (no intermediate
+    STL file). The shapes of the STEP file are written as groups of the
+    OBJ file (patch0, patch1 ...).
 
     Parameters
     ----------
@@ -36,44 +33,36 @@ def step_to_obj(step_file_path,
     scale : float
     write_normals : bool
     group : bool, optional (default is True)
-        Add a g entry before the f entries if True, do not if False
+        Add a g entry before the f entries of each shape if True, do not
+        if False
     factor : float
         Meshing factor, optional (default is 4000.)
         The higher, the finer the mesh and the bigger the resulting file
     use_min_dim : bool, optional (default is False)
         Use the minimum dimension of the shape as a base for meshing
         This is useful for shapes with a high aspect ratio
-    remove_intermediate_stl : bool, optional (default is True)
-        Should the intermediate STL(s) be removed
+    remove_intermediate_stl : bool, optional
+        Deprecated and ignored, there is no intermediate STL anymore
 
     """
-    # Save as STL
-
-    # Create a tmp dir with 700 (read+write) rights
-    tmp_dir = tempfile.mkdtemp()
-
-    # Create a temporary STL file with a random name in tmp dir
-    stl_temp_file = abspath(join(tmp_dir, "%s.stl" % uuid.uuid4().hex))
-
-    list_of_files, _ = step_to_stl(step_file_path,
-                                   stl_temp_file,
-                                   scale,
-                                   factor,
-                                   use_min_dim,
-                                   ascii_mode=True,
-                                   multi_shape_mode=ONE_SHAPE_PER_FILE)
-
-    for stl_f in list_of_files:
-        # Open STL with pymesh
-        mesh = stl.Stl(stl_f)
-
-        # Save as OBJ
-        mesh.save_obj(obj_file_path,
-                      update_normals=True,
-                      group=group,
-                      write_normals=write_normals)
-
-    # Delete STL
-    if remove_intermediate_stl is True:
-        # remove(stl_f)
-        shutil.rmtree(tmp_dir)
+    if remove_intermediate_stl is not None:
+        msg = "remove_intermediate_stl is deprecated and ignored, " \
+              "there is no intermediate STL file anymore"
+        logger.warning(msg)
+        warnings.warn(msg, DeprecationWarning, stacklevel=2)
+
+    shapes = StepImporter(filename=step_file_path).shapes
+
+    if len(shapes) == 0:
+        msg = "The STEP file contains no shape"
+        logger.error(msg)
+        raise ValueError(msg)
+
+    mesh = shape_to_mesh(shapes,
+                         scale=scale,
+                         factor=factor,
+                         use_min_dim=use_min_dim)
+
+    mesh.save_obj(obj_file_path,
+                  write_normals=write_normals,
+                  group=group)
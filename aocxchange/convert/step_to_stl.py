@@ -3,10 +3,14 @@
 r"""Convert a STEP file to STL file"""
 
 import logging
+import multiprocessing
 
 # from os.path import join, dirname, abspath, isfile
-from os.path import isfile
+from os.path import isfile, splitext
 
+from aocxchange.brep import shape_to_brep_string, brep_string_to_shape
+from aocxchange.convert.shape_to_mesh import shape_triangulation
+from aocxchange.pymesh.writer import StlWriter, AsciiStlWriter
 from aocxchange.step import StepImporter
 from aocxchange.stl import StlExporter
 
@@ -22,13 +26,91 @@ ONE_SHAPE_PER_FILE = 0
 ALL_SHAPES_IN_ONE_FILE = 1
 
 
+def shape_to_stl(shape, stl_file, scale, ascii_mode, factor, use_min_dim):
+    r"""Write a single shape to an STL file
+
+    Parameters
+    ----------
+    shape : TopoDS_Shape
+    stl_file : str
+    scale : float
+    ascii_mode : bool
+    factor : float
+    use_min_dim : bool
+
+    """
+    exporter = StlExporter(filename=stl_file, ascii_mode=ascii_mode)
+
+    shape = scale_uniform(shape, (0, 0, 0), scale, False)
+
+    # Must mesh ! Otherwise the exporter does not write anything!
+    mesh(shape, factor=factor, use_min_dim=use_min_dim)
+
+    exporter.set_shape(shape)
+    exporter.write_file()
+
+
+def shapes_to_stl(shapes, stl_file, scale, ascii_mode, factor, use_min_dim):
+    r"""Write shapes to a single STL file, in a single pass
+
+    Each shape is meshed and its triangulation is appended to the file
+    straight away: as a solid named shape<index> in ASCII mode, with the
+    shape index as attribute of its triangles in binary mode.
+
+    Parameters
+    ----------
+    shapes : list[TopoDS_Shape]
+    stl_file : str
+    scale : float
+    ascii_mode : bool
+    factor : float
+    use_min_dim : bool
+
+    """
+    if ascii_mode is True:
+        writer = AsciiStlWriter(stl_file)
+    else:
+        if len(shapes) > StlWriter.MAX_ATTR + 1:
+            msg = "Too many shapes to tag them in a binary STL file"
+            logger.error(msg)
+            raise ValueError(msg)
+        writer = StlWriter(stl_file)
+
+    with writer:
+        for i, shape in enumerate(shapes):
+            # Scaled before meshing, as in shape_to_stl, for the same
+            # triangulation in both multi shape modes
+            shape = scale_uniform(shape, (0, 0, 0), scale, False)
+            # Must mesh ! Otherwise there is no triangulation
+            mesh(shape, factor=factor, use_min_dim=use_min_dim)
+            nodes, triangles = shape_triangulation(shape)
+            vectors = nodes[triangles]
+            if ascii_mode is True:
+                writer.write_solid("shape%i" % i, vectors)
+            else:
+                writer.write(vectors, attr=i)
+
+
+def _brep_string_to_stl(args):
+    r"""shape_to_stl of a shape serialized as BREP (process pool task)"""
+    brep_string, stl_file, scale, ascii_mode, factor, use_min_dim = args
+    shape_to_stl(brep_string_to_shape(brep_string),
+                 stl_file,
+                 scale,
+                 ascii_mode,
+                 factor,
+                 use_min_dim)
+    return stl_file
+
+
 def step_to_stl(step_file_path,
                 stl_file_path,
                 scale=1.,
                 factor=4000.,
                 use_min_dim=False,
                 ascii_mode=True,
-                multi_shape_mode=ONE_SHAPE_PER_FILE):
+                multi_shape_mode=ONE_SHAPE_PER_FILE,
+                workers=None):
     r"""Convert a STEP file to a STL file
 
     Parameters
@@ -47,6 +129,11 @@ def step_to_stl(step_file_path,
         Write STL in ascii mode if True, in binary mode if False
     multi_shape_mode : int, optional (default is 0 (ONE_SHAPE_PER_FILE)
         Mode to use in case there is more than 1 shape in the STEP file
+    workers : int, optional (default is None, no parallelism)
+        Number of processes meshing and writing the shapes in the
+        ONE_SHAPE_PER_FILE mode. The shapes are sent to the processes as
+        BREP strings. The file names and their order do not depend on
+        workers.
 
     Returns
     -------
@@ -55,28 +142,6 @@ def step_to_stl(step_file_path,
     multiple entities
 
     """
-    def shape_to_stl(shape_, stl_file_, scale, ascii_mode_, factor_, use_min_dim_):
-        r"""Write a single shape to an STL file
-    
-        Parameters
-        ----------
-        shape_
-        stl_file_
-        ascii_mode_
-        factor_
-        use_min_dim_
-
-        """
-        exporter = StlExporter(filename=stl_file_, ascii_mode=ascii_mode_)
-
-        shape_ = scale_uniform(shape_, (0, 0, 0), scale, False)
-
-        # Must mesh ! Otherwise the exporter does not write anything!
-        mesh(shape_, factor=factor_, use_min_dim=use_min_dim_)
-
-        exporter.set_shape(shape_)
-        exporter.write_file()
-
     # Read STEP
     shapes = StepImporter(filename=step_file_path).shapes
 
@@ -101,37 +166,40 @@ def step_to_stl(step_file_path,
 
     elif len(shapes) > 1:
         if multi_shape_mode == ONE_SHAPE_PER_FILE:
-            f, e = os.path.splitext(stl_file_path)
-            partial_files = list()
-            for i, shape in enumerate(shapes):
-                filename = f+"_"+str(i)+e
-                shape_to_stl(shape,
-                             filename,
-                             scale,
-                             ascii_mode,
-                             factor,
-                             use_min_dim)
-                partial_files.append(filename)
+            f, e = splitext(stl_file_path)
+            partial_files = [f + "_" + str(i) + e for i in range(len(shapes))]
+            if workers is not None and workers > 1:
+                tasks = [(shape_to_brep_string(shape),
+                          filename,
+                          scale,
+                          ascii_mode,
+                          factor,
+                          use_min_dim)
+                         for shape, filename in zip(shapes, partial_files)]
+                pool = multiprocessing.Pool(min(workers, len(tasks)))
+                try:
+                    # map keeps the order of the tasks
+                    pool.map(_brep_string_to_stl, tasks, chunksize=1)
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                for shape, filename in zip(shapes, partial_files):
+                    shape_to_stl(shape,
+                                 filename,
+                                 scale,
+                                 ascii_mode,
+                                 factor,
+                                 use_min_dim)
             return partial_files, len(shapes)
 
         elif multi_shape_mode == ALL_SHAPES_IN_ONE_FILE:
-            partial_files = list
-            for i, shape in enumerate(shapes):
-                filename = f + "_" + str(i) + e
-                shape_to_stl(shape,
-                             filename,
-                             scale,
-                             ascii_mode,
-                             factor,
-                             use_min_dim)
-                partial_files.append(filename)
-            with open(stl_file_path, "w") as stl_file:
-                for partial_file in partial_files:
-                    with open(partial_file) as pf:
-                        content = pf.readlines()
-                        stl_file.writelines(content)
-            for partial_file in partial_files:
-                os.remove(partial_file)
+            shapes_to_stl(shapes,
+                          stl_file_path,
+                          scale,
+                          ascii_mode,
+                          factor,
+                          use_min_dim)
             return [stl_file_path], len(shapes)
 
         else:
@@ -12,12 +12,15 @@ from OCC.Core.IGESControl import IGESControl_Controller, IGESControl_Reader, \
     IGESControl_Writer
 from OCC.Core.TopoDS import TopoDS_Compound
 
+from aocxchange.cache import BrepCache, reader_settings
 from aocxchange.exceptions import IgesFileReadException, \
     IgesFileWriteException, IgesUnknownFormatException
 # import aocxchange.utils
 from aocxchange.checks import check_importer_filename, check_exporter_filename,\
     check_overwrite, check_shape
 from aocxchange.extensions import iges_extensions
+from aocxchange.stats import Stats
+from aocxchange.topology import nb_faces
 
 from aocutils.types_ import topo_types_dict
 
@@ -31,56 +34,108 @@ class IgesImporter(object):
     ----------
     filename : str
         Absolute filepath
+    cache : BrepCache or bool, optional (default is None, no cache)
+        Cache of the transferred shapes, True for a BrepCache in the default
+        directory. The shapes of a file already in the cache are read from
+        BREP files, otherwise the transferred shapes are stored.
+    callback : callable, optional
+        Called at the end of each phase, see aocxchange.stats.Stats
 
     """
-    def __init__(self, filename=None):
+    # Reader settings that change the transferred shapes (cache key)
+    READER_SETTINGS = ["read.precision.mode",
+                       "read.precision.val",
+                       "read.maxprecision.mode",
+                       "read.maxprecision.val",
+                       "read.surfacecurve.mode",
+                       "read.iges.bspline.continuity",
+                       "read.iges.onlyvisible",
+                       "xstep.cascade.unit"]
+
+    def __init__(self, filename=None, cache=None, callback=None):
         logger.info("IgesImporter instantiated with filename : %s" % filename)
+        self.stats = Stats("IgesImporter", callback)
 
         check_importer_filename(filename, iges_extensions)
 
         self._shapes = list()
         self.nb_shapes = 0
         self._filename = filename
+        self.cache = BrepCache() if cache is True else (cache or None)
+
+        if self.cache is not None:
+            # The reader settings are defined once the IGES controller is
+            # initialized
+            IGESControl_Controller().Init()
+            settings = reader_settings(self.READER_SETTINGS)
+            settings["reader"] = "IGES"
+            with self.stats.phase("cache_read"):
+                key = self.cache.key(filename, settings)
+                entry = self.cache.get(key)
+            if entry is not None:
+                logger.info("Shapes read from the cache")
+                self._shapes = list(entry.shapes)
+                self.nb_shapes = len(self._shapes)
+                self._count_shapes()
+                return
 
         logger.info("Reading file ....")
         self.read_file()
 
+        if self.cache is not None:
+            with self.stats.phase("cache_write"):
+                try:
+                    self.cache.put(key, self._shapes)
+                except OSError as e:
+                    # The cache is only a speed-up, the import goes on
+                    logger.warning("Shapes not stored in the cache (%s)" % e)
+
     def read_file(self):
         """
         Read the IGES file and stores the result in a list of TopoDS_Shape
 
         """
         igescontrol_reader = IGESControl_Reader()
-        status = igescontrol_reader.ReadFile(self._filename)
+        with self.stats.phase("parse"):
+            status = igescontrol_reader.ReadFile(self._filename)
         igescontrol_reader.PrintCheckLoad(False, IFSelect_ItemsByEntity)
         nb_roots = igescontrol_reader.NbRootsForTransfer()
         logger.info("Nb roots for transfer : %i" % nb_roots)
+        self.stats.count("roots", nb_roots)
 
         if status == IFSelect_RetDone and nb_roots != 0:
 
             igescontrol_reader.PrintCheckTransfer(False, IFSelect_ItemsByEntity)
-            ok = igescontrol_reader.TransferRoots()
-            logger.info("TransferRoots status : %i" % ok)
-            self.nb_shapes = igescontrol_reader.NbShapes()
-
-            for n in range(1, nb_roots + 1):
-
-                logger.debug("Root index %i" % n)
-
-                # for i in range(1, self.nb_shapes + 1):
-                a_shape = igescontrol_reader.Shape(n)
-                if a_shape.IsNull():
-                    msg = "At least one shape in IGES cannot be transferred"
-                    logger.warning(msg)
-                else:
-                    self._shapes.append(a_shape)
-                    logger.debug("Appending a %s to list of shapes" %
-                                topo_types_dict[a_shape.ShapeType()])
+            with self.stats.phase("transfer"):
+                ok = igescontrol_reader.TransferRoots()
+                logger.info("TransferRoots status : %i" % ok)
+                self.nb_shapes = igescontrol_reader.NbShapes()
+
+                for n in range(1, nb_roots + 1):
+
+                    logger.debug("Root index %i" % n)
+
+                    # for i in range(1, self.nb_shapes + 1):
+                    a_shape = igescontrol_reader.Shape(n)
+                    if a_shape.IsNull():
+                        msg = "At least one shape in IGES cannot be " \
+                              "transferred"
+                        logger.warning(msg)
+                    else:
+                        self._shapes.append(a_shape)
+                        logger.debug("Appending a %s to list of shapes" %
+                                     topo_types_dict[a_shape.ShapeType()])
+            self._count_shapes()
         else:
             msg = "Status is not IFSelect_RetDone or No root for transfer"
             logger.error(msg)
             raise IgesFileReadException(msg)
 
+    def _count_shapes(self):
+        r"""Record the number of shapes and faces in stats"""
+        self.stats.count("shapes", len(self._shapes))
+        self.stats.count("faces", lambda: nb_faces(self._shapes))
+
     @property
     def compound(self):
         """ Create and returns a compound from the _shapes list
@@ -98,13 +153,14 @@ class IgesImporter(object):
         24 edges
 
         """
-        # Create a compound
-        compound = TopoDS_Compound()
-        brep_builder = BRep_Builder()
-        brep_builder.MakeCompound(compound)
-        # Populate the compound
-        for shape in self._shapes:
-            brep_builder.Add(compound, shape)
+        with self.stats.phase("compound"):
+            # Create a compound
+            compound = TopoDS_Compound()
+            brep_builder = BRep_Builder()
+            brep_builder.MakeCompound(compound)
+            # Populate the compound
+            for shape in self._shapes:
+                brep_builder.Add(compound, shape)
         return compound
 
     @property
@@ -126,9 +182,11 @@ class IgesExporter(object):
     ----------
     filename : str
     format_ : ["5.1", "5.3"]
+    callback : callable, optional
+        Called at the end of each phase, see aocxchange.stats.Stats
 
     """
-    def __init__(self, filename, format_="5.1"):
+    def __init__(self, filename, format_="5.1", callback=None):
         logger.info("IgesExporter instantiated with filename : %s" % filename)
         logger.info("IgesExporter format : %s" % format_)
 
@@ -142,6 +200,7 @@ class IgesExporter(object):
 
         self._shapes = list()
         self._filename = filename
+        self.stats = Stats("IgesExporter", callback)
 
         if format_ == "5.3":
             self._brepmode = True
@@ -168,13 +227,17 @@ class IgesExporter(object):
         bool
 
         """
-        IGESControl_Controller().Init()
-        iges_writer = IGESControl_Writer("write.iges.unit", self._brepmode)
-        for shape in self._shapes:
-            iges_writer.AddShape(shape)
-        iges_writer.ComputeModel()
-
-        write_status = iges_writer.Write(self._filename)
+        self.stats.count("shapes", len(self._shapes))
+        with self.stats.phase("transfer"):
+            IGESControl_Controller().Init()
+            iges_writer = IGESControl_Writer("write.iges.unit",
+                                             self._brepmode)
+            for shape in self._shapes:
+                iges_writer.AddShape(shape)
+            iges_writer.ComputeModel()
+
+        with self.stats.phase("write"):
+            write_status = iges_writer.Write(self._filename)
 
         if write_status == IFSelect_RetDone:
             logger.info("IGES file write successful.")
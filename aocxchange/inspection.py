@@ -0,0 +1,550 @@
+# coding: utf-8
+
+r"""Inspection of STEP and IGES files without any translation
+
+The metadata of a file (schema, originating system, units, entity counts,
+roots ...) are read from the text of the file, streaming it and stopping
+as soon as possible: nothing is handed to OCC and the geometry is never
+loaded. This module does not depend on OCC.
+
+"""
+
+from __future__ import print_function
+
+import collections
+import io
+import logging
+import os
+import re
+
+from aocxchange.exceptions import IncompatibleFileFormatException, \
+    IgesFileReadException, StepFileReadException
+from aocxchange.extensions import iges_extensions, step_extensions
+from aocxchange.utils import extract_file_extension
+
+logger = logging.getLogger(__name__)
+
+# Python 2 and 3 compatibility
+try:
+    FileNotFoundError
+except NameError:
+    FileNotFoundError = IOError
+
+BLOCK_SIZE = 1 << 20
+
+# Metadata of a STEP file. entity_counts, nb_entities, nb_roots and
+# length_unit are None unless the DATA section has been scanned
+# (count_entities=True)
+StepInfo = collections.namedtuple("StepInfo",
+                                  ["filename",
+                                   "schema",
+                                   "application_protocol",
+                                   "description",
+                                   "implementation_level",
+                                   "name",
+                                   "time_stamp",
+                                   "author",
+                                   "organization",
+                                   "preprocessor_version",
+                                   "originating_system",
+                                   "authorization",
+                                   "nb_entities",
+                                   "entity_counts",
+                                   "nb_roots",
+                                   "length_unit"])
+
+# Metadata of an IGES file
+IgesInfo = collections.namedtuple("IgesInfo",
+                                  ["filename",
+                                   "version",
+                                   "product_id",
+                                   "file_name",
+                                   "native_system",
+                                   "preprocessor_version",
+                                   "model_space_scale",
+                                   "unit",
+                                   "date",
+                                   "author",
+                                   "organization",
+                                   "section_counts",
+                                   "nb_entities",
+                                   "entity_counts",
+                                   "nb_roots"])
+
+# STEP schema name prefix -> application protocol
+STEP_PROTOCOLS = [("CONFIG_CONTROL_DESIGN", "AP203"),
+                  ("AP203", "AP203"),
+                  ("AUTOMOTIVE_DESIGN", "AP214"),
+                  ("AP214", "AP214"),
+                  ("AP242", "AP242")]
+
+# IGES global section version flag -> IGES version
+IGES_VERSIONS = {1: "1.0",
+                 2: "ANSI Y14.26M-1981",
+                 3: "2.0",
+                 4: "3.0",
+                 5: "ASME/ANSI Y14.26M-1987",
+                 6: "4.0",
+                 7: "ASME Y14.26M-1989",
+                 8: "5.0",
+                 9: "5.1",
+                 10: "5.2",
+                 11: "5.3"}
+
+# IGES global section unit flag -> unit (used if there is no unit name)
+IGES_UNITS = {1: "IN",
+              2: "MM",
+              4: "FT",
+              5: "MI",
+              6: "M",
+              7: "KM",
+              8: "MIL",
+              9: "UM",
+              10: "CM",
+              11: "UIN"}
+
+
+def inspect(filename, count_entities=False):
+    r"""Metadata of a STEP or IGES file, depending on its extension
+
+    Parameters
+    ----------
+    filename : str
+    count_entities : bool, optional (default is False)
+        See inspect_step
+
+    Returns
+    -------
+    StepInfo or IgesInfo
+
+    """
+    extension = extract_file_extension(filename).lower()
+    if extension in step_extensions:
+        return inspect_step(filename, count_entities=count_entities)
+    elif extension in iges_extensions:
+        return inspect_iges(filename)
+    else:
+        msg = "Cannot inspect a file with extension %s" % extension
+        logger.error(msg)
+        raise IncompatibleFileFormatException(msg)
+
+
+def inspect_step(filename, count_entities=False):
+    r"""Metadata of a STEP file
+
+    Only the HEADER section is read by default, whatever the size of the
+    file.
+
+    Parameters
+    ----------
+    filename : str
+    count_entities : bool, optional (default is False)
+        Also scan the DATA section (streamed, in a time proportional to the
+        size of the file) to count the entity instances by type, the roots
+        (product definitions that are not a component of an assembly) and
+        to find the length unit
+
+    Returns
+    -------
+    StepInfo
+
+    """
+    _check_file(filename)
+    with io.open(filename, "r", encoding="latin-1", newline="") as f:
+        records = _step_records(f)
+        header = dict()
+        for record in records:
+            keyword = record.split("(", 1)[0].strip().upper()
+            if keyword == "ENDSEC":
+                break
+            elif keyword in ("FILE_DESCRIPTION", "FILE_NAME", "FILE_SCHEMA"):
+                header[keyword] = _step_parameters(record[len(keyword):])
+            elif not header and keyword not in ("ISO-10303-21", "HEADER"):
+                msg = "%s is not a STEP file" % filename
+                logger.error(msg)
+                raise StepFileReadException(msg)
+        if "FILE_SCHEMA" not in header:
+            msg = "No FILE_SCHEMA in the header of %s" % filename
+            logger.error(msg)
+            raise StepFileReadException(msg)
+
+        entity_counts, nb_roots, length_unit = None, None, None
+        if count_entities is True:
+            entity_counts, nb_roots, length_unit = _scan_step_data(records)
+
+    description = _pad(header.get("FILE_DESCRIPTION"), 2)
+    name = _pad(header.get("FILE_NAME"), 7)
+    schemas = _pad(header["FILE_SCHEMA"], 1)[0] or [None]
+    schema = schemas[0] if isinstance(schemas, list) else schemas
+    protocol = None
+    for prefix, ap in STEP_PROTOCOLS:
+        if schema is not None and schema.upper().startswith(prefix):
+            protocol = ap
+            break
+
+    return StepInfo(filename=filename,
+                    schema=schema,
+                    application_protocol=protocol,
+                    description=_text(description[0]),
+                    implementation_level=description[1],
+                    name=name[0],
+                    time_stamp=name[1],
+                    author=_text(name[2]),
+                    organization=_text(name[3]),
+                    preprocessor_version=name[4],
+                    originating_system=name[5],
+                    authorization=name[6],
+                    nb_entities=None if entity_counts is None
+                    else sum(entity_counts.values()),
+                    entity_counts=entity_counts,
+                    nb_roots=nb_roots,
+                    length_unit=length_unit)
+
+
+def inspect_iges(filename):
+    r"""Metadata of an IGES file
+
+    The Start, Global and Directory Entry sections are streamed and the
+    reading stops at the Parameter Data section (the geometry). The section
+    line counts are read from the Terminate section at the end of the file.
+
+    The roots are the independent entities (subordinate entity switch 00)
+    used as geometry (entity use flag 00).
+
+    Parameters
+    ----------
+    filename : str
+
+    Returns
+    -------
+    IgesInfo
+
+    """
+    _check_file(filename)
+    global_lines = list()
+    entity_counts = collections.Counter()
+    nb_entities, nb_roots = 0, 0
+    with io.open(filename, "r", encoding="latin-1") as f:
+        for line in f:
+            section = line[72:73]
+            if section == "S":
+                continue
+            elif section == "G":
+                global_lines.append(line[:72])
+            elif section == "D":
+                nb_entities += 1
+                if nb_entities % 2 == 0:
+                    # Second line of the entry
+                    continue
+                try:
+                    entity_type = int(line[0:8])
+                except ValueError:
+                    msg = "Invalid directory entry in %s : %s" % (filename,
+                                                                  line)
+                    logger.error(msg)
+                    raise IgesFileReadException(msg)
+                entity_counts[entity_type] += 1
+                status = line[64:72].replace(" ", "0")
+                if status[2:4] == "00" and status[4:6] == "00":
+                    nb_roots += 1
+            elif section in ("P", "T"):
+                break
+            elif line.strip():
+                msg = "%s is not an IGES file" % filename
+                logger.error(msg)
+                raise IgesFileReadException(msg)
+
+    section_counts = _iges_terminate_section(filename)
+    if not global_lines:
+        msg = "No global section in %s" % filename
+        logger.error(msg)
+        raise IgesFileReadException(msg)
+
+    parameters = _pad(_iges_global_parameters("".join(global_lines)), 25)
+    unit_flag = _to_int(parameters[13])
+    version_flag = _to_int(parameters[22])
+
+    return IgesInfo(filename=filename,
+                    version=IGES_VERSIONS.get(version_flag),
+                    product_id=parameters[2],
+                    file_name=parameters[3],
+                    native_system=parameters[4],
+                    preprocessor_version=parameters[5],
+                    model_space_scale=_to_float(parameters[12]),
+                    unit=parameters[14] or IGES_UNITS.get(unit_flag),
+                    date=parameters[17],
+                    author=parameters[20],
+                    organization=parameters[21],
+                    section_counts=section_counts,
+                    nb_entities=nb_entities // 2,
+                    entity_counts=dict(entity_counts),
+                    nb_roots=nb_roots)
+
+
+def _check_file(filename):
+    r"""Raise FileNotFoundError if filename is not a file"""
+    if not os.path.isfile(filename):
+        msg = "%s could not be found" % filename
+        logger.error(msg)
+        raise FileNotFoundError(msg)
+
+
+def _pad(values, size):
+    r"""values (a list or None) padded with None to size"""
+    values = list(values or list())
+    return values + [None] * (size - len(values))
+
+
+def _text(value):
+    r"""A STEP list of strings as a single string"""
+    if isinstance(value, list):
+        return ", ".join(v for v in value if v and not isinstance(v, list))
+    return value
+
+
+def _to_int(value):
+    r"""value as an int, None if it is not an integer"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value):
+    r"""value (possibly in Fortran notation, e.g. 1.0D0) as a float, None if
+    it is not a number"""
+    try:
+        return float(value.upper().replace("D", "E"))
+    except (AttributeError, ValueError):
+        return None
+
+
+_STEP_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+
+
+def _step_records(f):
+    r"""Generator of the records (statements ended by ;) of a STEP file
+
+    Comments are removed. A ; in a string does not end a record (the
+    quotes of a record must be balanced).
+
+    """
+    pending = ""
+    while True:
+        block = f.read(BLOCK_SIZE)
+        if not block:
+            break
+        pending += block
+        if "/*" in pending:
+            end = pending.rfind("*/")
+            if pending.rfind("/*") > end:
+                # Unfinished comment, wait for the next block
+                continue
+            pending = _STEP_COMMENT.sub("", pending)
+        parts = pending.split(";")
+        pending = parts.pop()
+        record = ""
+        for part in parts:
+            record += part
+            if record.count("'") % 2 == 1:
+                record += ";"
+                continue
+            yield record.strip()
+            record = ""
+        pending = record + pending
+    if pending.strip():
+        yield pending.strip()
+
+
+_STEP_TOKEN = re.compile(r"'((?:[^']|'')*)'|([(),])|([^'(),\s]+)")
+
+
+def _step_parameters(text):
+    r"""Parameters of a STEP record: strings, lists (nested python lists) and
+    other values (numbers, enumerations, references ...) as strings, $ as
+    None
+
+    Parameters
+    ----------
+    text : str
+        e.g. "(('CONFIG_CONTROL_DESIGN'))"
+
+    Returns
+    -------
+    list
+
+    """
+    stack = [list()]
+    for string, delimiter, value in _STEP_TOKEN.findall(text):
+        if delimiter == "(":
+            stack.append(list())
+        elif delimiter == ")":
+            if len(stack) > 1:
+                values = stack.pop()
+                stack[-1].append(values)
+        elif delimiter == ",":
+            continue
+        elif value:
+            stack[-1].append(None if value == "$" else value)
+        else:
+            stack[-1].append(string.replace("''", "'").replace("\\\\", "\\"))
+    parameters = stack[0]
+    # The parameters of the record are in its outer parentheses
+    return parameters[0] if len(parameters) == 1 and \
+        isinstance(parameters[0], list) else parameters
+
+
+_STEP_INSTANCE = re.compile(r"#\d+\s*=\s*(\(?)\s*([A-Za-z][A-Za-z0-9_]*)")
+_STEP_REFERENCE = re.compile(r"#(\d+)")
+_STEP_NAME_OR_PARENTHESIS = re.compile(
+    r"'(?:[^']|'')*'|([A-Za-z][A-Za-z0-9_]*)\s*\(|(\()|(\))")
+
+
+def _scan_step_data(records):
+    r"""Count the entity instances of the DATA section of a STEP file
+
+    Parameters
+    ----------
+    records : generator of str
+        Records after the HEADER section (see _step_records)
+
+    Returns
+    -------
+    tuple(dict, int or None, str or None)
+        Number of instances by entity type (complex instances by their
+        partial types joined with a space), number of roots, length unit
+
+    """
+    entity_counts = collections.Counter()
+    product_definitions = set()
+    components = set()
+    length_unit = None
+    for record in records:
+        match = _STEP_INSTANCE.match(record)
+        if match is None:
+            # DATA, ENDSEC, END-ISO-10303-21
+            continue
+        if match.group(1):
+            types = _complex_types(record[match.start(1):])
+            entity_type = " ".join(types)
+            if length_unit is None and "LENGTH_UNIT" in types:
+                length_unit = _length_unit(record)
+        else:
+            entity_type = match.group(2).upper()
+            if entity_type == "PRODUCT_DEFINITION":
+                product_definitions.add(record.split("=", 1)[0].strip())
+            elif entity_type == "NEXT_ASSEMBLY_USAGE_OCCURRENCE":
+                # The related product definition is the second reference
+                references = _STEP_REFERENCE.findall(
+                    record.split("=", 1)[1])
+                if len(references) > 1:
+                    components.add("#" + references[1])
+        entity_counts[entity_type] += 1
+
+    nb_roots = len(product_definitions - components) \
+        if product_definitions else None
+    return dict(entity_counts), nb_roots, length_unit
+
+
+def _complex_types(text):
+    r"""Partial entity types of a complex instance, e.g. LENGTH_UNIT,
+    NAMED_UNIT, SI_UNIT for (LENGTH_UNIT() NAMED_UNIT(*) SI_UNIT(.MILLI.,
+    .METRE.))"""
+    types = list()
+    depth = 0
+    for match in _STEP_NAME_OR_PARENTHESIS.finditer(text):
+        name, opening, closing = match.groups()
+        if name:
+            if depth == 1:
+                types.append(name.upper())
+            depth += 1
+        elif opening:
+            depth += 1
+        elif closing:
+            depth -= 1
+    return types
+
+
+def _length_unit(record):
+    r"""Length unit of a complex LENGTH_UNIT instance, e.g. MILLIMETRE, INCH"""
+    si_unit = re.search(r"SI_UNIT\s*\(\s*(\$|\.\w+\.)\s*,\s*\.(\w+)\.", record,
+                        re.I)
+    if si_unit is not None:
+        prefix, unit = si_unit.groups()
+        return (prefix.strip(".") if prefix != "$" else "") + unit.upper()
+    conversion = re.search(r"CONVERSION_BASED_UNIT\s*\(\s*'([^']*)'", record,
+                           re.I)
+    if conversion is not None:
+        return conversion.group(1).upper()
+    return None
+
+
+_IGES_HOLLERITH = re.compile(r"\s*(\d+)H")
+
+
+def _iges_global_parameters(text):
+    r"""Parameters of the Global section of an IGES file
+
+    Parameters
+    ----------
+    text : str
+        Columns 1 to 72 of the lines of the Global section
+
+    Returns
+    -------
+    list
+        Strings (Hollerith constants) and other values as str, empty values
+        as None
+
+    """
+    parameter_delimiter, record_delimiter = ",", ";"
+    parameters = list()
+    i = 0
+    while i < len(text):
+        hollerith = _IGES_HOLLERITH.match(text, i)
+        if hollerith is not None:
+            start = hollerith.end()
+            value = text[start:start + int(hollerith.group(1))]
+            i = start + len(value)
+            # Skip the blanks before the delimiter
+            while i < len(text) and text[i] == " ":
+                i += 1
+        else:
+            j = i
+            while j < len(text) and \
+                    text[j] not in (parameter_delimiter, record_delimiter):
+                j += 1
+            value = text[i:j].strip() or None
+            i = j
+        parameters.append(value)
+        # The first 2 parameters define the delimiters
+        if len(parameters) == 1 and value:
+            parameter_delimiter = value
+        elif len(parameters) == 2 and value:
+            record_delimiter = value
+        if i >= len(text) or text[i] == record_delimiter:
+            break
+        i += 1
+    return parameters
+
+
+def _iges_terminate_section(filename):
+    r"""Line counts of the sections of an IGES file, read from the
+    Terminate section at the end of the file
+
+    Returns
+    -------
+    dict or None if there is no Terminate section
+        e.g. {"S": 1, "G": 4, "D": 290, "P": 841}
+
+    """
+    with open(filename, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 4 * 82))
+        tail = f.read().decode("latin-1")
+    lines = [line for line in tail.splitlines() if line.strip()]
+    if not lines or lines[-1][72:73] != "T":
+        logger.warning("No terminate section")
+        return None
+    return dict((section, int(count)) for section, count in
+                re.findall(r"([SGDP])\s*(\d+)", lines[-1][:72]))
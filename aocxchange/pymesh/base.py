@@ -6,15 +6,17 @@ from __future__ import absolute_import, print_function
 
 import logging
 
+import collections
 import datetime
 import math
 import os
-import struct
 
 import numpy
 
 # used in header of written STL or OBJ files
 from aocxchange import __name__, __version__, __url__
+from aocxchange.pymesh.writer import STL_DTYPE, StlWriter, AsciiStlWriter, \
+    format_block, number_format, triangle_normals
 
 
 logger = logging.getLogger(__name__)
@@ -24,35 +26,345 @@ MODE_STL_AUTO = 0
 MODE_STL_ASCII = 1
 MODE_STL_BINARY = 2
 
+# A named range of triangles of a mesh (e.g. a solid of an ASCII STL file)
+Region = collections.namedtuple("Region", ["name", "start", "count"])
+
+# Integral properties of a mesh, see BaseMesh.get_mass_properties
+MassProperties = collections.namedtuple(
+    "MassProperties",
+    ["volume", "area", "centroid", "inertia", "bounding_box"])
+
+
+def weld_vertices(points, tolerance=0.):
+    r"""Share identical (or close) points
+
+    Points are hashed as a whole (numpy.unique on a structured view) rather
+    than compared one by one, so the cost is O(n log n).
+
+    Parameters
+    ----------
+    points : numpy.ndarray of shape (n, 3)
+    tolerance : float
+        If > 0, points are snapped to a grid of that size before being
+        compared, so points closer than tolerance are usually merged
+        (points on both sides of a grid line are not). Default is 0.,
+        only identical points are merged.
+
+    Returns
+    -------
+    numpy.ndarray of shape (m, 3)
+        The unique points, in order of first appearance in points
+    numpy.ndarray of shape (n, )
+        Index of each point in the unique points
+
+    """
+    points = numpy.asarray(points)
+    if tolerance > 0:
+        keys = numpy.round(points / tolerance).astype(numpy.int64)
+    else:
+        # + 0. turns -0. into 0. so that they hash the same
+        keys = points + points.dtype.type(0.)
+    keys = numpy.ascontiguousarray(keys)
+    keys = keys.view(numpy.dtype((numpy.void,
+                                  keys.dtype.itemsize * keys.shape[1])))
+    _, first, inverse = numpy.unique(keys.ravel(),
+                                     return_index=True,
+                                     return_inverse=True)
+    # numpy.unique sorts, renumber in order of first appearance
+    order = numpy.argsort(first)
+    rank = numpy.empty_like(order)
+    rank[order] = numpy.arange(len(order))
+    return points[first[order]], rank[inverse.ravel()]
+
+
+def _write_blocks(fh, template, values):
+    r"""Write template formatted with each row of values, by blocks"""
+    block_size = BaseMesh.FORMAT_BLOCK_SIZE
+    for start in range(0, len(values), block_size):
+        fh.write(format_block(template, values[start:start + block_size]))
+
+
+def _write_obj(filename,
+               vertices,
+               faces,
+               normals=None,
+               normals_index=None,
+               group=True,
+               regions=None,
+               materials=None,
+               mtllib=None,
+               precision=None):
+    r"""Write an OBJ file from shared vertices and faces
+
+    Parameters
+    ----------
+    filename : str
+    vertices : numpy.ndarray of shape (number of vertices, 3)
+    faces : numpy.ndarray of shape (number of faces, 3)
+        0 based indices in vertices
+    normals : numpy.ndarray of shape (number of normals, 3), optional
+        If not None, vn entries are written and faces use the v//vn syntax
+    normals_index : numpy.ndarray of shape (number of faces, ), optional
+        0 based index in normals of the normal of each face
+    group : bool
+        Add g entries, one per region or a single g patch0 if there is no
+        region
+    regions : list[Region], optional
+        Named ranges of faces, written as groups
+    materials : list[Region], optional
+        Material of ranges of faces, written as usemtl entries
+    mtllib : list[str], optional
+        Material libraries, written as mtllib entries
+    precision : int, optional
+        Number of decimals of the coordinates, default is None (full
+        precision, see number_format)
+
+    """
+    # (index of the first face, entry), groups first
+    entries = list()
+    if group is True:
+        entries.extend((start, "g %s" % name)
+                       for name, start, _ in regions or [("patch0", 0, 0)])
+    entries.extend((start, "usemtl %s" % name)
+                   for name, start, _ in materials or list())
+    entries.sort(key=lambda entry: entry[0])
+
+    number = number_format(precision)
+    if normals is not None:
+        face = "f %d//%d %d//%d %d//%d\n"
+        face_values = numpy.column_stack((faces, normals_index))[
+            :, [0, 3, 1, 3, 2, 3]] + 1
+    else:
+        face = "f %d %d %d\n"
+        face_values = faces + 1
+
+    # with open(filename, "wb") as fh:
+    with open(filename, "w") as fh:
+        print("# {} {}".format(__name__, __version__), file=fh)
+        print("# {}".format(datetime.datetime.now()), file=fh)
+        print("# {}".format(__url__), file=fh)
+        # print("", file=fh)
+        for name in mtllib or list():
+            print("mtllib %s" % name, file=fh)
+        _write_blocks(fh, "v {0} {0} {0}\n".format(number), vertices)
+        if normals is not None:
+            _write_blocks(fh, "vn {0} {0} {0}\n".format(number), normals)
+        position = 0
+        for start, entry in entries:
+            _write_blocks(fh, face, face_values[position:start])
+            print(entry, file=fh)
+            position = start
+        _write_blocks(fh, face, face_values[position:])
+
 
 class BaseMesh(object):
     r"""Base mesh class"""
 
-    stl_dtype = numpy.dtype([
-        ('normals', numpy.float32, (3, )),
-        ('vectors', numpy.float32, (3, 3)),
-        ('attr', numpy.uint16, (1, )),
-    ])
+    stl_dtype = STL_DTYPE
+
+    ANALYZE_BLOCK_SIZE = 1 << 20
+    FORMAT_BLOCK_SIZE = 1 << 14
+
+    def __init__(self, dtype=None):
+        r"""
+        Parameters
+        ----------
+        dtype : None, numpy.float32 or numpy.float64
+            Storage of vectors. None (default) stores float64 homogeneous
+            coordinates (x, y, z, 1). numpy.float32 and numpy.float64 store
+            compact x, y, z; float32 vectors are views over data and use no
+            extra memory.
 
-    def __init__(self):
+        """
+        if dtype is not None:
+            dtype = numpy.dtype(dtype)
+            if dtype not in (numpy.float32, numpy.float64):
+                msg = "dtype should be None, numpy.float32 or numpy.float64"
+                logger.error(msg)
+                raise ValueError(msg)
+        self.dtype = dtype
         self.data = None
         self.normals = []
-        self.vectors = []
+        self._vectors = []
         self.attr = []
         self.mode = MODE_STL_BINARY
+        self.regions = list()
+        # Material of ranges of triangles and material libraries (OBJ)
+        self.materials = list()
+        self.mtllib = list()
+        self._pending_transform = None
 
     def set_initial_values(self):
-        """Set initial values form existing self.data value"""
+        """Set initial values form existing self.data value
+
+        If self.data is read-only (e.g. a memory-mapped file), normals,
+        vectors and attr are read-only views over it and vectors has no
+        homogeneous coordinate. A private copy is made on the first mutation.
+
+        """
         self.normals = self.data['normals']
-        self.vectors = numpy.ones((
-            self.data['vectors'].shape[0],
-            self.data['vectors'].shape[1],
-            self.data['vectors'].shape[2] + 1
-        ))
-        self.vectors[:, :, :-1] = self.data['vectors']
+        if self.read_only or self.dtype == numpy.float32:
+            self.vectors = self.data['vectors']
+        else:
+            self.vectors = self._vectors_from_xyz(self.data['vectors'])
         self.attr = self.data['attr']
         return
 
+    def _vectors_from_xyz(self, xyz):
+        r"""Convert vertices to the vectors storage of this mesh
+
+        Parameters
+        ----------
+        xyz : numpy.ndarray of shape (number of triangles, 3, 3 or 4)
+
+        Returns
+        -------
+        numpy.ndarray of shape (number of triangles, 3, 4) if self.dtype is
+        None, (number of triangles, 3, 3) of type self.dtype otherwise
+
+        """
+        if self.dtype is None:
+            vectors = numpy.ones((xyz.shape[0], xyz.shape[1], 4))
+            vectors[:, :, :3] = xyz[:, :, :3]
+            return vectors
+        return numpy.array(xyz[:, :, :3], dtype=self.dtype)
+
+    @property
+    def vectors(self):
+        r"""Triangle vertices, with the pending transforms applied
+
+        Returns
+        -------
+        numpy.ndarray of shape (number of triangles, 3, 3 or 4)
+
+        """
+        if self._pending_transform is not None:
+            self.__apply_pending_transform()
+        return self._vectors
+
+    @vectors.setter
+    def vectors(self, value):
+        self._pending_transform = None
+        self._vectors = value
+
+    def apply_transform(self, matrix):
+        r"""Transform the mesh by a 4x4 affine matrix
+
+        The matrix uses the same row-vector convention as the rotate_*,
+        translate_* and scale methods: points are row vectors multiplied
+        on the left and the translation is in the last row.
+
+        The transform is not applied immediately, it is composed with the
+        other pending transforms and the result is applied in a single
+        pass over the vertices when they are next accessed (or saved).
+
+        Parameters
+        ----------
+        matrix : array like of shape (4, 4)
+
+        Raises
+        ------
+        ValueError if matrix is not a 4x4 affine matrix
+
+        """
+        matrix = numpy.asarray(matrix, dtype=numpy.float64)
+        if matrix.shape != (4, 4) or \
+                not numpy.array_equal(matrix[:, 3], [0, 0, 0, 1]):
+            msg = "Expecting a 4x4 affine matrix with (0, 0, 0, 1) " \
+                  "as last column"
+            logger.error(msg)
+            raise ValueError(msg)
+
+        if self._pending_transform is None:
+            self._pending_transform = matrix
+        else:
+            self._pending_transform = self._pending_transform.dot(matrix)
+        return self
+
+    def __apply_pending_transform(self):
+        r"""Apply the composed pending transforms to the vertices"""
+        matrix = self._pending_transform
+        self._pending_transform = None
+        self._copy_on_write()
+        # Composed in float64, applied in the storage type (no float64
+        # temporaries for float32 vectors)
+        matrix = matrix.astype(self._vectors.dtype)
+        xyz = self._vectors[:, :, :3]
+        self._vectors[:, :, :3] = xyz.dot(matrix[:3, :3]) + matrix[3, :3]
+
+    @property
+    def read_only(self):
+        r"""Is the mesh data a read-only view (e.g. memory-mapped file)?
+
+        Returns
+        -------
+        bool
+
+        """
+        return self.data is not None and not self.data.flags.writeable
+
+    def _copy_on_write(self):
+        r"""Replace read-only data by a private in-memory copy"""
+        if self.read_only:
+            logger.debug("Copying read-only mesh data before mutation")
+            normals = self.normals
+            pending_transform = self._pending_transform
+            self.data = numpy.array(self.data)
+            if normals.flags.writeable:
+                # Keep normals already updated on a private copy
+                self.data['normals'] = normals
+            self.set_initial_values()
+            self._pending_transform = pending_transform
+
+    def _detach_from(self, filename):
+        r"""Copy the data off a memory-mapped file before it is overwritten
+
+        Opening the mapped file for writing truncates it, and reading the
+        map afterwards crashes the interpreter (SIGBUS).
+
+        Parameters
+        ----------
+        filename : str
+            The file that is about to be written
+
+        """
+        mapped_file = getattr(self.data, "filename", None)
+        if mapped_file is not None and os.path.exists(filename) and \
+                os.path.samefile(filename, mapped_file):
+            logger.debug("Copying memory-mapped data before overwriting %s"
+                         % filename)
+            self._copy_on_write()
+
+    def region_slice(self, region):
+        r"""Slice of the triangles of a region
+
+        Parameters
+        ----------
+        region : str or int
+            Region name or index in self.regions
+
+        Returns
+        -------
+        slice
+            e.g. mesh.vectors[mesh.region_slice("inlet")]
+
+        Raises
+        ------
+        KeyError if there is no region with that name
+
+        """
+        if isinstance(region, int):
+            _, start, count = self.regions[region]
+        else:
+            for name, start, count in self.regions:
+                if name == region:
+                    break
+            else:
+                msg = "No region named %s" % region
+                logger.error(msg)
+                raise KeyError(msg)
+        return slice(start, start + count)
+
     def rotate_x(self, deg):
         """Rotate mesh around x-axis
 
@@ -69,8 +381,7 @@ class BaseMesh(object):
             [0, -math.sin(rad), math.cos(rad), 0],
             [0, 0, 0, 1]
         ])
-        self.vectors = self.vectors.dot(mat)
-        return self
+        return self.apply_transform(mat)
 
     def rotate_y(self, deg):
         """Rotate mesh around y-axis
@@ -88,8 +399,7 @@ class BaseMesh(object):
             [math.sin(rad), 0, math.cos(rad), 0],
             [0, 0, 0, 1]
         ])
-        self.vectors = self.vectors.dot(mat)
-        return self
+        return self.apply_transform(mat)
 
     def rotate_z(self, deg):
         """Rotate mesh around z-axis
@@ -107,8 +417,7 @@ class BaseMesh(object):
             [0, 0, 1, 0],
             [0, 0, 0, 1]
         ])
-        self.vectors = self.vectors.dot(mat)
-        return self
+        return self.apply_transform(mat)
 
     def translate_x(self, d):
         """Translate mesh for x-direction
@@ -125,8 +434,7 @@ class BaseMesh(object):
             [0, 0, 1, 0],
             [d, 0, 0, 1]
         ])
-        self.vectors = self.vectors.dot(mat)
-        return self
+        return self.apply_transform(mat)
 
     def translate_y(self, d):
         """Translate mesh for y-direction
@@ -143,8 +451,7 @@ class BaseMesh(object):
             [0, 0, 1, 0],
             [0, d, 0, 1]
         ])
-        self.vectors = self.vectors.dot(mat)
-        return self
+        return self.apply_transform(mat)
 
     def translate_z(self, d):
         """Translate mesh for z-direction
@@ -161,8 +468,7 @@ class BaseMesh(object):
             [0, 0, 1, 0],
             [0, 0, d, 1]
         ])
-        self.vectors = self.vectors.dot(mat)
-        return self
+        return self.apply_transform(mat)
 
     def scale(self, sx, sy, sz):
         """Scale mesh
@@ -183,8 +489,120 @@ class BaseMesh(object):
             [0, 0, sz, 0],
             [0, 0, 0, 1]
         ])
-        self.vectors = self.vectors.dot(mat)
-        return self
+        return self.apply_transform(mat)
+
+    @classmethod
+    def concatenate(cls, meshes, names=None):
+        r"""Concatenate meshes into a new mesh
+
+        All the arrays are allocated once and filled in a single pass, so
+        concatenating many meshes costs a single copy of each of them
+        (repeated join calls copy the growing mesh at every call).
+
+        The triangles of each source mesh are recorded as a region of the
+        result (see region_slice and split). A source mesh that already has
+        regions keeps them (offset), unless names is given.
+
+        Parameters
+        ----------
+        meshes : iterable of BaseMesh
+        names : list[str], optional
+            Region name of each source mesh, default is part0, part1 ...
+
+        Returns
+        -------
+        BaseMesh of type cls, with the vectors storage (dtype) of the first
+        mesh
+
+        """
+        meshes = list(meshes)
+        if len(meshes) == 0:
+            msg = "At least one mesh is required"
+            logger.error(msg)
+            raise ValueError(msg)
+        for mesh in meshes:
+            if not isinstance(mesh, BaseMesh):
+                raise TypeError("meshes must be instances of BaseMesh")
+        if names is not None and len(names) != len(meshes):
+            msg = "Expecting %i names, got %i" % (len(meshes), len(names))
+            logger.error(msg)
+            raise ValueError(msg)
+
+        result = cls(dtype=meshes[0].dtype)
+        counts = [len(mesh.vectors) for mesh in meshes]
+        nb_triangles = sum(counts)
+        result.data = numpy.zeros(nb_triangles, dtype=BaseMesh.stl_dtype)
+        if result.dtype is None:
+            vectors = numpy.ones((nb_triangles, 3, 4))
+        elif result.dtype == numpy.float32:
+            # views over data, filled with it
+            vectors = result.data['vectors']
+        else:
+            vectors = numpy.empty((nb_triangles, 3, 3), dtype=result.dtype)
+
+        start = 0
+        for i, (mesh, count) in enumerate(zip(meshes, counts)):
+            if count == 0:
+                continue
+            end = start + count
+            result.data['normals'][start:end] = mesh.normals
+            result.data['vectors'][start:end] = mesh.vectors[:, :, :3]
+            result.data['attr'][start:end] = mesh.attr
+            if result.dtype != numpy.float32:
+                vectors[start:end, :, :3] = mesh.vectors[:, :, :3]
+
+            if names is None and mesh.regions:
+                result.regions.extend(Region(name, start + region_start, n)
+                                      for name, region_start, n
+                                      in mesh.regions)
+            else:
+                name = names[i] if names is not None else "part%i" % i
+                result.regions.append(Region(name, start, count))
+            start = end
+
+        result.normals = result.data['normals']
+        result.vectors = vectors
+        result.attr = result.data['attr']
+        result._update_indexed()
+        return result
+
+    def extract(self, region):
+        r"""Extract the triangles of a region as a new mesh
+
+        Parameters
+        ----------
+        region : str or int
+            Region name or index in self.regions
+
+        Returns
+        -------
+        BaseMesh of the same type and vectors storage (dtype) as self
+
+        """
+        _slice = self.region_slice(region)
+        mesh = type(self)(dtype=self.dtype)
+        mesh.data = numpy.array(self.data[_slice])
+        mesh.data['normals'] = self.normals[_slice]
+        mesh.data['vectors'] = self.vectors[_slice, :, :3]
+        mesh.set_initial_values()
+        if self.dtype != numpy.float32:
+            # Vertices at full precision, self.vectors may also be the raw
+            # (n, 3, 3) float32 view of a read-only mesh
+            mesh.vectors = mesh._vectors_from_xyz(self.vectors[_slice])
+        mesh._update_indexed()
+        return mesh
+
+    def split(self):
+        r"""Split the mesh by region, e.g. back into the meshes that were
+        concatenated
+
+        Returns
+        -------
+        list[BaseMesh]
+            One mesh per region, in the order of self.regions
+
+        """
+        return [self.extract(i) for i in range(len(self.regions))]
 
     def join(self, another):
         """Join mesh with another mesh
@@ -199,30 +617,71 @@ class BaseMesh(object):
         if not isinstance(another, BaseMesh):
             raise TypeError("anther must be an instance of BaseMesh")
 
-        self.data = numpy.append(self.data, another.data)
-        self.normals = numpy.append(self.normals, another.normals, axis=0)
-        self.vectors = numpy.append(self.vectors, another.vectors, axis=0)
-        self.attr = numpy.append(self.attr, another.attr, axis=0)
+        joined = BaseMesh.concatenate([self, another])
+        self.data = joined.data
+        self.normals = joined.normals
+        self.vectors = joined.vectors
+        self.attr = joined.attr
+        if self.regions or another.regions:
+            self.regions = joined.regions
+        self._update_indexed()
         return self
 
+    def _update_indexed(self):
+        r"""Update the attributes a subclass derives from the triangles
+        (e.g. the shared vertices of Obj) once they are replaced by
+        concatenate, extract or join. Nothing to update for a soup."""
+        return
+
     def update_normals(self):
-        r"""Update mesh normals"""
-        v0 = self.vectors[:, 0, :3]
-        v1 = self.vectors[:, 1, :3]
-        v2 = self.vectors[:, 2, :3]
-        _normals = numpy.cross(v1 - v0, v2 - v0)
+        r"""Update mesh normals
 
-        for i, _normal in enumerate(_normals):
-            norm = numpy.linalg.norm(_normal)
-            if norm != 0:
-                _normals[i] /= numpy.linalg.norm(_normal)
+        Degenerate (zero area) triangles get a (0, 0, 0) normal, see
+        count_degenerate.
+
+        Returns
+        -------
+        BaseMesh (self)
 
+        """
+        _normals = triangle_normals(self.vectors)
+        if not self.normals.flags.writeable:
+            # Only the normals get a private copy, vectors stay mapped
+            self.normals = numpy.array(self.normals)
         self.normals[:] = _normals
         return self
 
     #
     # Analyze functions
     #
+    def count_degenerate(self):
+        r"""Number of degenerate (zero area) triangles
+
+        Returns
+        -------
+        int
+
+        """
+        _normals = triangle_normals(self.vectors)
+        return int(numpy.count_nonzero(~_normals.any(axis=1)))
+
+    def _iter_triangle_blocks(self):
+        r"""Yield the xyz of the triangles as float64 blocks
+
+        Bounds the temporary memory of the analyze functions to
+        ANALYZE_BLOCK_SIZE triangles whatever the size of the mesh.
+
+        Yields
+        ------
+        tuple(numpy.ndarray) : v0, v1, v2 of shape (n, 3)
+
+        """
+        for start in range(0, len(self.vectors), BaseMesh.ANALYZE_BLOCK_SIZE):
+            block = numpy.asarray(
+                self.vectors[start:start + BaseMesh.ANALYZE_BLOCK_SIZE, :, :3],
+                dtype=numpy.float64)
+            yield block[:, 0], block[:, 1], block[:, 2]
+
     def get_volume(self):
         r"""Volume of the mesh
 
@@ -231,40 +690,170 @@ class BaseMesh(object):
         float : the volume
 
         """
-        total_volume = 0
-        for triangle in self.vectors:
-            total_volume += BaseMesh.__calc_signed_volume(triangle)
+        total_volume = 0.
+        for v0, v1, v2 in self._iter_triangle_blocks():
+            total_volume += numpy.einsum('ij,ij->',
+                                         v0, numpy.cross(v1, v2)) / 6.
         return total_volume
 
+    def get_area(self):
+        r"""Surface area of the mesh
+
+        Returns
+        -------
+        float : the area
+
+        """
+        total_area = 0.
+        for v0, v1, v2 in self._iter_triangle_blocks():
+            total_area += numpy.linalg.norm(numpy.cross(v1 - v0, v2 - v0),
+                                            axis=1).sum() / 2.
+        return total_area
+
+    def get_bounding_box(self):
+        r"""Axis aligned bounding box of the mesh
+
+        Returns
+        -------
+        tuple(numpy.ndarray, numpy.ndarray) : min and max corners
+
+        """
+        if len(self.vectors) == 0:
+            msg = "The bounding box of an empty mesh is undefined"
+            logger.error(msg)
+            raise ValueError(msg)
+        xyz = self.vectors[:, :, :3]
+        return (xyz.min(axis=(0, 1)).astype(numpy.float64),
+                xyz.max(axis=(0, 1)).astype(numpy.float64))
+
+    def get_centroid(self):
+        r"""Centroid of the volume enclosed by the mesh
+
+        Returns
+        -------
+        numpy.ndarray : x, y, z of the centroid
+
+        """
+        return self.get_mass_properties().centroid
+
+    def get_inertia(self):
+        r"""Inertia tensor of the enclosed volume, for a unit density
+
+        Returns
+        -------
+        numpy.ndarray : 3x3 inertia tensor at the centroid
+
+        """
+        return self.get_mass_properties().inertia
+
+    def get_mass_properties(self):
+        r"""Volume, area, centroid, inertia and bounding box in one pass
+
+        Volume integrals are computed with the divergence theorem over
+        the triangles (D. Eberly, Polyhedral Mass Properties), the mesh
+        should be closed and consistently oriented (normals pointing out).
+        If the enclosed volume is zero (e.g. an open surface), the centroid
+        is the area-weighted centroid of the triangles and the inertia
+        is zero.
+
+        Returns
+        -------
+        MassProperties
+
+        """
+        if len(self.vectors) == 0:
+            msg = "The mass properties of an empty mesh are undefined"
+            logger.error(msg)
+            raise ValueError(msg)
+
+        # 1, x, y, z, x2, y2, z2, xy, yz, zx integrals
+        integrals = numpy.zeros(10)
+        area = 0.
+        area_moment = numpy.zeros(3)
+        bb_min = numpy.full(3, numpy.inf)
+        bb_max = numpy.full(3, -numpy.inf)
+
+        for v0, v1, v2 in self._iter_triangle_blocks():
+            d = numpy.cross(v1 - v0, v2 - v0)
+            f1, f2, f3, g0, g1, g2 = BaseMesh.__subexpressions(v0, v1, v2)
+            integrals[0] += numpy.dot(d[:, 0], f1[:, 0])
+            integrals[1:4] += numpy.einsum('ij,ij->j', d, f2)
+            integrals[4:7] += numpy.einsum('ij,ij->j', d, f3)
+            # x.y, y.z and z.x products, with d's x, y and z respectively
+            rolled = [numpy.roll(a, -1, axis=1) for a in (v0, v1, v2)]
+            integrals[7:10] += numpy.einsum(
+                'ij,ij->j', d,
+                rolled[0] * g0 + rolled[1] * g1 + rolled[2] * g2)
+
+            triangle_areas = numpy.linalg.norm(d, axis=1) / 2.
+            area += triangle_areas.sum()
+            area_moment += numpy.dot(triangle_areas, v0 + v1 + v2) / 3.
+            bb_min = numpy.minimum(bb_min, numpy.minimum(
+                numpy.minimum(v0, v1), v2).min(axis=0))
+            bb_max = numpy.maximum(bb_max, numpy.maximum(
+                numpy.maximum(v0, v1), v2).max(axis=0))
+
+        integrals *= [1. / 6., 1. / 24., 1. / 24., 1. / 24.,
+                      1. / 60., 1. / 60., 1. / 60.,
+                      1. / 120., 1. / 120., 1. / 120.]
+        volume = integrals[0]
+
+        if volume == 0:
+            logger.warning("Zero volume, using the surface centroid")
+            centroid = area_moment / area if area > 0 else numpy.zeros(3)
+            inertia = numpy.zeros((3, 3))
+        else:
+            centroid = integrals[1:4] / volume
+            cx, cy, cz = centroid
+            x2, y2, z2, xy, yz, zx = integrals[4:10]
+            ixx = y2 + z2 - volume * (cy * cy + cz * cz)
+            iyy = z2 + x2 - volume * (cz * cz + cx * cx)
+            izz = x2 + y2 - volume * (cx * cx + cy * cy)
+            ixy = -(xy - volume * cx * cy)
+            iyz = -(yz - volume * cy * cz)
+            izx = -(zx - volume * cz * cx)
+            inertia = numpy.array([[ixx, ixy, izx],
+                                   [ixy, iyy, iyz],
+                                   [izx, iyz, izz]])
+
+        return MassProperties(volume, area, centroid, inertia,
+                              (bb_min, bb_max))
+
     @staticmethod
-    def __calc_signed_volume(triangle):
-        """ Calculate signed volume of given triangle
+    def __subexpressions(w0, w1, w2):
+        r"""Eberly's polynomial subexpressions, for x, y and z at once
 
         Parameters
         ----------
-        triangle : list[list]
+        w0, w1, w2 : numpy.ndarray
+            Vertices of the triangles, shape (n, 3)
 
         Returns
         -------
-        float
+        tuple(numpy.ndarray) : f1, f2, f3, g0, g1, g2 of shape (n, 3)
 
         """
-        v321 = triangle[2][0] * triangle[1][1] * triangle[0][2]
-        v231 = triangle[1][0] * triangle[2][1] * triangle[0][2]
-        v312 = triangle[2][0] * triangle[0][1] * triangle[1][2]
-        v132 = triangle[0][0] * triangle[2][1] * triangle[1][2]
-        v213 = triangle[1][0] * triangle[0][1] * triangle[2][2]
-        v123 = triangle[0][0] * triangle[1][1] * triangle[2][2]
-
-        signed_volume = (-v321 + v231 + v312 - v132 - v213 + v123) / 6.0
-        return signed_volume
+        temp0 = w0 + w1
+        f1 = temp0 + w2
+        temp1 = w0 * w0
+        temp2 = temp1 + w1 * temp0
+        f2 = temp2 + w2 * f1
+        f3 = w0 * temp1 + w1 * temp2 + w2 * f2
+        g0 = f2 + w0 * (f1 + w0)
+        g1 = f2 + w1 * (f1 + w1)
+        g2 = f2 + w2 * (f1 + w2)
+        return f1, f2, f3, g0, g1, g2
 
     #
     # Save functions
     #
 
     # STL
-    def save_stl(self, filename, mode=MODE_STL_AUTO, update_normals=True):
+    def save_stl(self,
+                 filename,
+                 mode=MODE_STL_AUTO,
+                 update_normals=True,
+                 precision=6):
         """Save data in stl format
         
         Parameters
@@ -276,12 +865,13 @@ class BaseMesh(object):
             1 : MODE_STL_ASCII
             2 : MODE_STL_BINARY
         update_normals: bool
+        precision : int
+            Number of decimals of the numbers in ASCII mode, default is 6
 
         """
         if update_normals:
             self.update_normals()
-
-        name = os.path.split(filename)[-1]
+        self._detach_from(filename)
 
         if mode is MODE_STL_AUTO:
             if self.mode == MODE_STL_BINARY:
@@ -296,49 +886,58 @@ class BaseMesh(object):
         elif mode is MODE_STL_BINARY:
             save_func = self.__save_stl_binary
 
+        elif mode is MODE_STL_ASCII:
+            save_func = self.__save_stl_ascii
+
         else:
             raise ValueError("Mode %r is invalid" % mode)
 
-        with open(name, 'wb') as fh:
-            save_func(fh, filename)
-
-    def __save_stl_binary(self, fh, name):
-        fh.write(("%s (%s) %s %s" % (
-            "{}".format(__name__),
-            "{}".format(__version__),
-            datetime.datetime.now(),
-            name
-        ))[:80].ljust(80, ' '))
-
-        bin_data = numpy.zeros(self.data.size, BaseMesh.stl_dtype)
-        bin_data['normals'] = self.normals[:]
-        bin_data['vectors'] = self.vectors[:, :, :3]
-        bin_data['attr'] = self.attr
-        fh.write(struct.pack('i', bin_data.size))
-        bin_data.tofile(fh)
-
-    def __save_stl_ascii(self, fh, name):
-        print("solid {}".format(name), file=fh)
-        for i, vector in enumerate(self.vectors):
-            print("facet normal %f %f %f" % tuple(self.normals[i][:3]),
-                  file=fh)
-            print("  outer loop", file=fh)
-            print("    vertex %f %f %f" % tuple(vector[0][:3]),
-                  file=fh)
-            print("    vertex %f %f %f" % tuple(vector[1][:3]),
-                  file=fh)
-            print("    vertex %f %f %f" % tuple(vector[2][:3]),
-                  file=fh)
-            print("  endloop", file=fh)
-            print("endfacet", file=fh)
-        print("endsolid {}".format(name), file=fh)
+        if save_func == self.__save_stl_ascii:
+            save_func(filename, precision)
+        else:
+            save_func(filename)
+
+    def __save_stl_binary(self, filename):
+        r"""Write the triangles with a StlWriter
+
+        data is written as is when it holds the current normals and
+        vectors (float32 views, nothing to update), by blocks otherwise.
+
+        """
+        header = "%s (%s) %s %s" % (__name__,
+                                    __version__,
+                                    datetime.datetime.now(),
+                                    os.path.split(filename)[-1])
+        with StlWriter(filename, header) as writer:
+            vectors = self.vectors
+            if self.data is not None and \
+                    numpy.may_share_memory(vectors, self.data) and \
+                    numpy.may_share_memory(self.normals, self.data) and \
+                    numpy.may_share_memory(self.attr, self.data):
+                writer.write_data(self.data)
+            else:
+                writer.write(vectors, self.normals, self.attr.ravel())
+
+    def __save_stl_ascii(self, filename, precision=6):
+        r"""Write the facets with an AsciiStlWriter, one solid per region"""
+        vectors = self.vectors
+        regions = self.regions or [Region(os.path.split(filename)[-1],
+                                          0,
+                                          len(vectors))]
+        with AsciiStlWriter(filename, precision) as writer:
+            for region_name, start, count in regions:
+                writer.write_solid(region_name,
+                                   vectors[start:start + count],
+                                   self.normals[start:start + count])
 
     # OBJ
     def save_obj(self,
                  filename,
                  update_normals=True,
                  write_normals=False,
-                 group=True):
+                 group=True,
+                 tolerance=0.,
+                 precision=None):
         """Save data in OBJ format
         
         Parameters
@@ -348,68 +947,36 @@ class BaseMesh(object):
         update_normals : bool
         write_normals : bool
         group : bool
-            Add a g entry before the f entries
+            Add g entries, one per region (e.g. the groups of a loaded OBJ
+            file) or a single g patch0 if there is no region
+        tolerance : float
+            Weld tolerance for vertices, default is 0. (only identical
+            vertices are shared). See weld_vertices.
+        precision : int, optional
+            Number of decimals of the coordinates, default is None (full
+            precision, see number_format)
 
         """
         if update_normals:
             self.update_normals()
+        self._detach_from(filename)
 
-        # Create triangle_list
-        vectors_key_list = []
-        vectors_list = []
-        normals_key_list = []
-        normals_list = []
-        triangle_list = []
-        for i, vector in enumerate(self.vectors):
-            one_triangle = []
-            for j in range(3):
-                v_key = ",".join(map(str, vector[j][:3]))
-                if v_key in vectors_key_list:
-                    v_index = vectors_key_list.index(v_key)
-                else:
-                    v_index = len(vectors_key_list)
-                    vectors_key_list.append(v_key)
-                    vectors_list.append(vector[j][:3])
-                one_triangle.append(v_index + 1)
-
-            n_key = ",".join(map(str, self.normals[i][:3]))
-            if n_key in normals_key_list:
-                n_index = normals_key_list.index(n_key)
-            else:
-                n_index = len(normals_key_list)
-                normals_key_list.append(n_key)
-                normals_list.append(self.normals[i][:3])
-
-            # print(normals_list)
-            triangle_list.append((one_triangle, n_index + 1))
-
-        # with open(filename, "wb") as fh:
-        with open(filename, "w") as fh:
-            print("# {} {}".format(__name__, __version__), file=fh)
-            print("# {}".format(datetime.datetime.now()), file=fh)
-            print("# {}".format(__url__), file=fh)
-            # print("", file=fh)
-            for v in vectors_list:
-                print("v {} {} {}".format(v[0], v[1], v[2]), file=fh)
-            if write_normals is True:
-                for vn in normals_list:
-                    print("vn {} {} {}".format(vn[0], vn[1], vn[2]), file=fh)
-            if group is True:
-                print("g patch0", file=fh)
-            for t in triangle_list:
-                faces = t[0]
-                normal = t[1]
-                if write_normals is True:
-                    print("f {}//{} {}//{} {}//{}".format(
-                        faces[0], normal,
-                        faces[1], normal,
-                        faces[2], normal,
-                    ), file=fh)
-                else:
-                    print("f {} {} {}".format(
-                        faces[0],
-                        faces[1],
-                        faces[2]
-                    ), file=fh)
-
+        # Shared vertices and normals, in order of first appearance
+        vertices, vertices_index = weld_vertices(
+            self.vectors[:, :, :3].reshape(-1, 3), tolerance)
+        if write_normals is True:
+            normals, normals_index = weld_vertices(self.normals[:, :3])
+        else:
+            normals, normals_index = None, None
+
+        _write_obj(filename,
+                   vertices,
+                   vertices_index.reshape(-1, 3),
+                   normals=normals,
+                   normals_index=normals_index,
+                   group=group,
+                   regions=self.regions,
+                   materials=self.materials,
+                   mtllib=self.mtllib,
+                   precision=precision)
         logger.info("Wrote %s" % filename)
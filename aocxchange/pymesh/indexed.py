@@ -0,0 +1,226 @@
+# coding: utf-8
+
+r"""Indexed (shared-vertex) mesh"""
+
+from __future__ import absolute_import, print_function
+
+import logging
+
+import numpy
+
+from aocxchange.pymesh.base import BaseMesh, MODE_STL_BINARY, \
+    weld_vertices, _write_obj
+from aocxchange.pymesh.obj import Obj
+from aocxchange.pymesh.stl import Stl
+from aocxchange.pymesh.writer import triangle_normals
+
+logger = logging.getLogger(__name__)
+
+
+class IndexedMesh(object):
+    r"""Indexed mesh class
+
+    Each vertex is stored once and triangles refer to their vertices
+    by index, instead of the triangle soup of BaseMesh where each triangle
+    stores three vertex copies.
+
+    Parameters
+    ----------
+    vertices : array like of shape (number of vertices, 3)
+    faces : array like of shape (number of faces, 3)
+        0 based vertex indices of each triangle
+    regions : list[Region], optional
+        Named ranges of faces
+
+    """
+    def __init__(self, vertices=None, faces=None, regions=None):
+        if vertices is None:
+            vertices = numpy.zeros((0, 3))
+        if faces is None:
+            faces = numpy.zeros((0, 3), dtype=numpy.int32)
+
+        self.vertices = numpy.asarray(vertices)
+        self.faces = numpy.asarray(faces, dtype=numpy.int32)
+        self.regions = list(regions) if regions is not None else list()
+
+        if self.vertices.ndim != 2 or self.vertices.shape[1] != 3 or \
+                self.faces.ndim != 2 or self.faces.shape[1] != 3:
+            msg = "vertices and faces should be of shape (n, 3)"
+            logger.error(msg)
+            raise ValueError(msg)
+
+    @property
+    def nb_vertices(self):
+        r"""Number of vertices"""
+        return len(self.vertices)
+
+    @property
+    def nb_faces(self):
+        r"""Number of faces (triangles)"""
+        return len(self.faces)
+
+    #
+    # Conversions
+    #
+    @classmethod
+    def from_soup(cls, mesh, tolerance=0.):
+        r"""Create an indexed mesh from a triangle soup mesh
+
+        Parameters
+        ----------
+        mesh : BaseMesh
+        tolerance : float
+            Weld tolerance, default is 0. (only identical vertices are
+            shared). See weld_vertices.
+
+        Returns
+        -------
+        IndexedMesh
+
+        """
+        if not isinstance(mesh, BaseMesh):
+            raise TypeError("mesh must be an instance of BaseMesh")
+        vertices, index = weld_vertices(
+            mesh.vectors[:, :, :3].reshape(-1, 3), tolerance)
+        logger.debug("%i vertices welded into %i" % (len(index),
+                                                     len(vertices)))
+        return cls(vertices, index.reshape(-1, 3), mesh.regions)
+
+    def to_soup(self, dtype=None):
+        r"""Create a triangle soup mesh from this indexed mesh
+
+        Parameters
+        ----------
+        dtype : None, numpy.float32 or numpy.float64
+            vectors storage of the soup mesh, see BaseMesh
+
+        Returns
+        -------
+        Stl
+            With updated normals
+
+        """
+        mesh = Stl(dtype=dtype)
+        xyz = self.vertices[self.faces]
+        mesh.data = numpy.zeros(self.nb_faces, dtype=BaseMesh.stl_dtype)
+        mesh.data['vectors'] = xyz
+        mesh.set_initial_values()
+        if mesh.dtype != numpy.float32:
+            # Vertices at full precision, not rounded by the float32 records
+            mesh.vectors = mesh._vectors_from_xyz(xyz)
+        mesh.regions = list(self.regions)
+        mesh.update_normals()
+        return mesh
+
+    #
+    # Topology
+    #
+    def get_edges(self, return_counts=False):
+        r"""Unique (undirected) edges of the mesh
+
+        Parameters
+        ----------
+        return_counts : bool
+            Also return the number of faces using each edge
+            (1 for a boundary edge, 2 for a manifold inner edge)
+
+        Returns
+        -------
+        numpy.ndarray of shape (number of edges, 2)
+            Vertex indices of each edge, smaller index first
+        numpy.ndarray of shape (number of edges, ), if return_counts is True
+
+        """
+        edges = numpy.sort(self.faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2),
+                           axis=1)
+        return numpy.unique(edges, axis=0, return_counts=return_counts)
+
+    #
+    # Load functions
+    #
+    @classmethod
+    def from_stl(cls, filename, tolerance=0.):
+        r"""Load an STL file as an indexed mesh
+
+        Parameters
+        ----------
+        filename : str
+        tolerance : float
+            Weld tolerance, see from_soup
+
+        """
+        return cls.from_soup(Stl(filename, dtype=numpy.float32), tolerance)
+
+    @classmethod
+    def from_obj(cls, filename, tolerance=0.):
+        r"""Load an OBJ file as an indexed mesh
+
+        The vertices and faces of the file are used as they are, vertices
+        are only welded if tolerance is greater than 0.
+
+        Parameters
+        ----------
+        filename : str
+        tolerance : float
+            Weld tolerance, see weld_vertices
+
+        """
+        obj = Obj(filename, dtype=numpy.float32)
+        if tolerance > 0:
+            vertices, index = weld_vertices(obj.vertices, tolerance)
+            return cls(vertices, index[obj.faces], obj.regions)
+        return cls(obj.vertices, obj.faces, obj.regions)
+
+    #
+    # Save functions
+    #
+    def save_stl(self, filename, mode=MODE_STL_BINARY, precision=6):
+        r"""Save in STL format
+
+        Parameters
+        ----------
+        filename : str
+        mode : int
+            1 : MODE_STL_ASCII
+            2 : MODE_STL_BINARY (default)
+        precision : int
+            Number of decimals of the numbers in ASCII mode
+
+        """
+        self.to_soup(dtype=numpy.float32).save_stl(filename,
+                                                   mode=mode,
+                                                   update_normals=False,
+                                                   precision=precision)
+
+    def save_obj(self, filename, write_normals=False, group=True,
+                 precision=None):
+        r"""Save in OBJ format, without re-welding the vertices
+
+        Parameters
+        ----------
+        filename : str
+        write_normals : bool
+            Write one (shared) normal per face
+        group : bool
+            Add g entries, one per region or a single g patch0 if there is
+            no region
+        precision : int, optional
+            Number of decimals of the coordinates, default is None (full
+            precision, see number_format)
+
+        """
+        if write_normals is True:
+            normals, normals_index = weld_vertices(
+                triangle_normals(self.vertices[self.faces]))
+        else:
+            normals, normals_index = None, None
+
+        _write_obj(filename,
+                   self.vertices,
+                   self.faces,
+                   normals=normals,
+                   normals_index=normals_index,
+                   group=group,
+                   regions=self.regions,
+                   precision=precision)
+        logger.info("Wrote %s" % filename)
@@ -6,88 +6,404 @@ from __future__ import absolute_import, print_function
 
 import logging
 import numpy
-from aocxchange.pymesh.base import BaseMesh
+from aocxchange.pymesh.base import BaseMesh, Region, weld_vertices
+from aocxchange.pymesh.writer import STL_DTYPE
 
 
 logger = logging.getLogger(__name__)
 
 
 class Obj(BaseMesh):
-    r"""OBJ mesh class"""
+    r"""OBJ mesh class
 
-    obj_dtype = numpy.dtype([
-        ('normals', numpy.float32, (3, )),
-        ('vectors', numpy.float32, (3, 3)),
-        ('attr', numpy.uint16, (1, )),
-    ])
+    Besides the triangle soup of BaseMesh, the shared vertices and the
+    triangles (faces) of the file are kept as loaded:
 
-    def __init__(self, filename=None):
+    - vertices : (number of vertices, 3) float64 array
+    - faces : (number of triangles, 3) int32 array of 0 based indices
+    - vertex_normals : (number of normals, 3) float64 array (vn)
+    - normals_index : (number of triangles, 3) int32 array of 0 based
+      indices in vertex_normals, None if the faces have no normals
+
+    The g and o statements are kept as regions (see BaseMesh.region_slice),
+    the usemtl statements as materials (Region tuples of material names)
+    and the mtllib statements as mtllib. Faces before the first g or o
+    statement are in a "default" region.
+
+    """
+
+    obj_dtype = STL_DTYPE
+
+    BLOCK_SIZE = 1 << 23
+
+    # line kinds
+    LINE_OTHER = 0
+    LINE_V = 1
+    LINE_VT = 2
+    LINE_VN = 3
+    LINE_F = 4
+    LINE_STATEMENT = 5
+
+    STATEMENTS = (b'g', b'o', b'usemtl', b'mtllib')
+
+    def __init__(self, filename=None, dtype=None):
         """Create an instance of Obj (Wavefront)
 
         Parameters
         ----------
         filename : str
+        dtype : None, numpy.float32 or numpy.float64
+            Storage of vectors, default is None (float64 homogeneous
+            coordinates). See BaseMesh.
 
         """
-        super(Obj, self).__init__()
+        super(Obj, self).__init__(dtype=dtype)
 
         if filename is None:
             # Create EMPTY data
             self.name = "empty"
+            self.vertices = numpy.zeros((0, 3))
+            self.faces = numpy.zeros((0, 3), dtype=numpy.int32)
+            self.vertex_normals = numpy.zeros((0, 3))
+            self.normals_index = None
             self.data = numpy.zeros(0, dtype=Obj.obj_dtype)
 
         else:
             # Create data from file
-            # with open(filename, "rb") as fh:
-            with open(filename, "r") as fh:
-                data = Obj.__load(fh)
+            with open(filename, "rb") as fh:
+                self.vertices, self.faces, self.vertex_normals, \
+                    self.normals_index, statements = Obj.__load(fh)
             self.name = filename
-            self.data = data
+            self.regions = _ranges(statements, (b'g', b'o'),
+                                   len(self.faces), "default")
+            self.materials = _ranges(statements, (b'usemtl', ),
+                                     len(self.faces))
+            self.mtllib = [name for keyword, name, _ in statements
+                           if keyword == b'mtllib']
+            self.data = Obj.__to_data(self.vertices,
+                                      self.faces,
+                                      self.vertex_normals,
+                                      self.normals_index)
 
         super(Obj, self).set_initial_values()
+        if self.dtype != numpy.float32:
+            # Vertices at full precision, not rounded by the float32 records
+            self.vectors = self._vectors_from_xyz(self.vertices[self.faces])
         return
 
+    def _update_indexed(self):
+        r"""Rebuild vertices, faces, vertex_normals and normals_index from
+        the triangles (e.g. of the result of concatenate or extract)
+
+        Identical vertices are shared. A triangle soup only has a normal
+        per triangle: it is used for the 3 corners, and there are no
+        normals if they are all (0, 0, 0).
+
+        """
+        vertices, index = weld_vertices(self.vectors[:, :, :3].reshape(-1, 3))
+        self.vertices = numpy.asarray(vertices, dtype=numpy.float64)
+        self.faces = index.reshape(-1, 3).astype(numpy.int32)
+        if numpy.any(self.normals):
+            vertex_normals, normals_index = weld_vertices(self.normals)
+            self.vertex_normals = numpy.asarray(vertex_normals,
+                                                dtype=numpy.float64)
+            self.normals_index = numpy.repeat(
+                normals_index.astype(numpy.int32)[:, None], 3, axis=1)
+        else:
+            self.vertex_normals = numpy.zeros((0, 3))
+            self.normals_index = None
+
     @staticmethod
-    def __load(fh):
-        return numpy.fromiter(Obj.__read(fh), dtype=Obj.obj_dtype)
+    def __to_data(vertices, faces, vertex_normals, normals_index):
+        r"""Triangle soup records of an indexed mesh
+
+        The normal of a triangle is the normalized mean of the vn of its
+        corners, (0, 0, 0) if the faces have no normals.
+
+        """
+        data = numpy.zeros(len(faces), dtype=Obj.obj_dtype)
+        data['vectors'] = vertices[faces]
+        if normals_index is not None:
+            normals = vertex_normals[normals_index].sum(axis=1)
+            norms = numpy.sqrt(numpy.einsum('ij,ij->i', normals, normals))
+            numpy.divide(normals, norms[:, None], out=normals,
+                         where=norms[:, None] > 0)
+            data['normals'] = normals
+        return data
 
     @staticmethod
-    def __read(fh):
-        vertices_list = []
-        triangles_list = []
+    def __load(fh):
+        r"""Parse an OBJ file by blocks of lines
+
+        Returns
+        -------
+        tuple(vertices, faces, vertex_normals, normals_index, statements)
+            statements is a list of (keyword, name, index of the next face)
 
+        Raises
+        ------
+        RuntimeError if the file is not a valid OBJ file
+
+        """
+        vertices, vertex_normals = list(), list()
+        faces, normals_index = list(), list()
+        statements = list()
+        nb_v, nb_vn, nb_f = 0, 0, 0
         try:
-            while True:
-                line = fh.readline()
-                if line == "":
-                    break
-
-                elif line.lstrip().startswith("vn"):
-                    continue
-
-                elif line.lstrip().startswith("v"):
-                    vertices = line.replace("\n", "").split(" ")[1:]
-                    # vertices_list.append(map(float, vertices))
-                    vertices_list.append([float(v) for v in vertices])
-
-                elif line.lstrip().startswith("f"):
-                    t_index_list = []
-                    for t in line.replace("\n", "").split(" ")[1:]:
-                        t_index = t.split("/")[0]
-                        t_index_list.append(int(t_index) - 1)
-                    triangles_list.append(t_index_list)
-
-                else:
-                    continue
-
-            for t in triangles_list:
-                yield ([0, 0, 0],
-                       (vertices_list[t[0]],
-                        vertices_list[t[1]],
-                        vertices_list[t[2]]),
-                       0)
-
-        except:
-            msg = "Failed to load OBJ file."
+            for block in Obj.__iter_blocks(fh):
+                v, vn, f, f_vn, block_statements = \
+                    Obj.__parse_block(block, nb_v, nb_vn)
+                vertices.append(v)
+                vertex_normals.append(vn)
+                faces.append(f)
+                normals_index.append(f_vn)
+                statements.extend((keyword, name, nb_f + index)
+                                  for keyword, name, index
+                                  in block_statements)
+                nb_v += len(v)
+                nb_vn += len(vn)
+                nb_f += len(f)
+        except (ValueError, IndexError) as e:
+            msg = "Failed to load OBJ file : %s" % e
             logger.error(msg)
             raise RuntimeError(msg)
+
+        vertices = numpy.concatenate(vertices)
+        vertex_normals = numpy.concatenate(vertex_normals)
+        faces = numpy.concatenate(faces)
+        if all(f_vn is not None for f_vn in normals_index) and len(faces):
+            normals_index = numpy.concatenate(normals_index)
+        else:
+            normals_index = None
+
+        for name, index, size in (("vertex", faces, nb_v),
+                                  ("normal", normals_index, nb_vn)):
+            if index is not None and len(index) and \
+                    (index.min() < 0 or index.max() >= size):
+                msg = "Failed to load OBJ file : %s index out of range" % name
+                logger.error(msg)
+                raise RuntimeError(msg)
+        return vertices, faces, vertex_normals, normals_index, statements
+
+    @staticmethod
+    def __iter_blocks(fh):
+        r"""Yield blocks of complete lines, line continuations joined"""
+        tail = b''
+        while True:
+            chunk = fh.read(Obj.BLOCK_SIZE)
+            if not chunk:
+                yield tail.replace(b'\\\r\n', b'   ').replace(b'\\\n', b'  ')
+                return
+            block = tail + chunk
+            cut = block.rfind(b'\n') + 1
+            while cut > 1 and block[cut - 2:cut - 1] == b'\\':
+                # Never cut a continued line
+                cut = block.rfind(b'\n', 0, cut - 1) + 1
+            tail = block[cut:]
+            # Join the continued lines
+            yield block[:cut].replace(b'\\\r\n', b'   ') \
+                .replace(b'\\\n', b'  ')
+
+    @staticmethod
+    def __parse_block(block, nb_v, nb_vn):
+        r"""Parse the v, vn, f, g, o, usemtl and mtllib lines of a block of
+        complete lines
+
+        Texture coordinates (vt lines and indices) are skipped.
+
+        Parameters
+        ----------
+        block : bytes
+        nb_v, nb_vn : int
+            Number of v and vn lines before the block, to resolve the
+            negative (relative) indices
+
+        Returns
+        -------
+        tuple(v, vn, faces, normals_index, statements)
+            0 based faces and normals_index, fan triangulated;
+            normals_index is None if some face has no normal;
+            statements is a list of (keyword, name, index in faces of the
+            next face)
+
+        """
+        if b'\n ' in block or b'\n\t' in block or block[:1] in b' \t':
+            block = b'\n'.join(line.lstrip() for line in block.split(b'\n'))
+
+        # Extra bytes to look at the 3 first characters of every line
+        chars = numpy.frombuffer(block + b'\n\n\n', dtype=numpy.uint8).copy()
+        starts = numpy.concatenate(
+            ([0], numpy.flatnonzero(chars[:len(block)] == ord('\n')) + 1))
+        lengths = numpy.diff(numpy.append(starts, len(block)))
+
+        first, second = chars[starts], chars[starts + 1]
+        second_blank = second <= ord(' ')
+        kinds = numpy.zeros(len(starts), dtype=numpy.int8)
+        kinds[(first == ord('v')) & second_blank] = Obj.LINE_V
+        kinds[(first == ord('v')) & (second == ord('t')) &
+              (chars[starts + 2] <= ord(' '))] = Obj.LINE_VT
+        kinds[(first == ord('v')) & (second == ord('n')) &
+              (chars[starts + 2] <= ord(' '))] = Obj.LINE_VN
+        kinds[(first == ord('f')) & second_blank] = Obj.LINE_F
+        kinds[numpy.isin(first, [ord('g'), ord('o'), ord('u'), ord('m')])] = \
+            Obj.LINE_STATEMENT
+
+        # Blank the keywords, the remaining bytes of a kind of line are
+        # then parsed at once
+        chars[starts[(kinds != Obj.LINE_OTHER) &
+                     (kinds != Obj.LINE_STATEMENT)]] = ord(' ')
+        chars[starts[(kinds == Obj.LINE_VT) | (kinds == Obj.LINE_VN)] + 1] = \
+            ord(' ')
+        chars = chars[:len(block)]
+        byte_kinds = numpy.repeat(kinds, lengths)
+
+        v = _parse_vectors(chars[byte_kinds == Obj.LINE_V], "v")
+        vn = _parse_vectors(chars[byte_kinds == Obj.LINE_VN], "vn")
+
+        # Number of v and vn before each f line
+        f_lines = kinds == Obj.LINE_F
+        v_before = numpy.cumsum(kinds == Obj.LINE_V)[f_lines] + nb_v
+        vn_before = numpy.cumsum(kinds == Obj.LINE_VN)[f_lines] + nb_vn
+        faces, normals_index, nb_triangles = \
+            _parse_faces(chars[byte_kinds == Obj.LINE_F], v_before, vn_before)
+
+        # Few lines, parsed one by one
+        line_triangles = numpy.zeros(len(starts), dtype=numpy.int64)
+        line_triangles[f_lines] = nb_triangles
+        triangles_before = numpy.cumsum(line_triangles) - line_triangles
+        statements = list()
+        for i in numpy.flatnonzero(kinds == Obj.LINE_STATEMENT):
+            fields = block[starts[i]:starts[i] + lengths[i]].split(None, 1)
+            if fields[0] in Obj.STATEMENTS:
+                name = fields[1].strip() if len(fields) > 1 else b''
+                statements.append((fields[0],
+                                   name.decode(),
+                                   int(triangles_before[i])))
+        return v, vn, faces, normals_index, statements
+
+
+def _tokens(chars):
+    r"""Whitespace separated tokens of lines of bytes
+
+    Returns
+    -------
+    tuple(starts, line_of_token, nb_lines)
+        Position of the first byte of each token, line index of each token,
+        number of (non empty) lines
+
+    """
+    blank = chars <= ord(' ')
+    is_start = ~blank
+    is_start[1:] &= blank[:-1]
+    starts = numpy.flatnonzero(is_start)
+    newlines = numpy.flatnonzero(chars == ord('\n'))
+    nb_lines = len(newlines) + int(chars[-1] != ord('\n'))
+    return starts, numpy.searchsorted(newlines, starts), nb_lines
+
+
+def _parse_vectors(chars, keyword):
+    r"""Parse the first 3 numbers of lines of numbers (e.g. v or vn lines)
+
+    Extra numbers (w, vertex colors) are skipped.
+
+    """
+    if len(chars) == 0:
+        return numpy.zeros((0, 3))
+    starts, line_of_token, nb_lines = _tokens(chars)
+    counts = numpy.bincount(line_of_token, minlength=nb_lines)
+
+    values = numpy.fromstring(chars.tobytes(), sep=' ')
+    if len(values) != len(starts):
+        raise ValueError("invalid number in %s lines" % keyword)
+    if counts.min() < 3:
+        raise ValueError("less than 3 numbers in a %s line" % keyword)
+    offsets = numpy.cumsum(counts) - counts
+    return values[offsets[:, None] + numpy.arange(3)]
+
+
+def _parse_faces(chars, v_before, vn_before):
+    r"""Parse and fan triangulate f lines
+
+    Parameters
+    ----------
+    chars : numpy.ndarray of uint8
+        The f lines, keyword blanked
+    v_before, vn_before : numpy.ndarray
+        Number of v and vn lines before each f line
+
+    Returns
+    -------
+    tuple(faces, normals_index, number of triangles of each f line)
+        0 based indices, normals_index is None if some face has no normal
+
+    """
+    if len(chars) == 0:
+        return numpy.zeros((0, 3), dtype=numpy.int32), \
+            numpy.zeros((0, 3), dtype=numpy.int32), \
+            numpy.zeros(0, dtype=numpy.int64)
+    starts, face_of_token, nb_faces = _tokens(chars)
+    counts = numpy.bincount(face_of_token, minlength=nb_faces)
+    if nb_faces != len(v_before) or counts.min() < 3:
+        raise ValueError("less than 3 vertices in a f line")
+
+    # v, v/vt, v//vn or v/vt/vn : number of fields of each token
+    token_of_slash = numpy.searchsorted(
+        starts, numpy.flatnonzero(chars == ord('/')), side='right') - 1
+    fields = numpy.bincount(token_of_slash, minlength=len(starts)) + 1
+    values = numpy.fromstring(
+        chars.tobytes().replace(b'//', b'/0/').replace(b'/', b' '),
+        dtype=numpy.int64,
+        sep=' ')
+    if fields.max() > 3 or len(values) != fields.sum():
+        raise ValueError("invalid f line")
+    offsets = numpy.cumsum(fields) - fields
+
+    v = _absolute_index(values[offsets], v_before[face_of_token])
+    if (fields == 3).all():
+        vn = _absolute_index(values[offsets + 2], vn_before[face_of_token])
+    else:
+        vn = None
+
+    # Fan triangulation (0, i, i + 1) of the polygons
+    nb_triangles = counts - 2
+    first = numpy.repeat(numpy.cumsum(counts) - counts, nb_triangles)
+    i = numpy.arange(nb_triangles.sum()) - numpy.repeat(
+        numpy.cumsum(nb_triangles) - nb_triangles, nb_triangles) + 1
+    corners = numpy.column_stack((first, first + i, first + i + 1))
+    return v[corners], vn[corners] if vn is not None else None, nb_triangles
+
+
+def _absolute_index(index, before):
+    r"""0 based index of 1 based or negative (relative) OBJ indices"""
+    return numpy.where(index < 0, index + before, index - 1).astype(
+        numpy.int32)
+
+
+def _ranges(statements, keywords, nb_faces, default=None):
+    r"""Table of the face ranges started by statements
+
+    Parameters
+    ----------
+    statements : list[tuple(keyword, name, index of the next face)]
+    keywords : tuple(bytes)
+        Keywords of the statements that start a new range
+    nb_faces : int
+    default : str, optional
+        Name of the range of the faces before the first statement, these
+        faces are in no range if None
+
+    Returns
+    -------
+    list[Region]
+        Empty ranges are dropped
+
+    """
+    starts = [(name or "default", index)
+              for keyword, name, index in statements if keyword in keywords]
+    if not starts:
+        return list()
+    if default is not None and starts[0][1] > 0:
+        starts.insert(0, (default, 0))
+    ends = [index for _, index in starts[1:]] + [nb_faces]
+    return [Region(name, start, end - start)
+            for (name, start), end in zip(starts, ends) if end > start]
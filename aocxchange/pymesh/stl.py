@@ -3,56 +3,82 @@
 r"""STL format mesh"""
 
 import os.path
-import sys
+import re
 import logging
 import numpy
 import os
 import struct
 
-if sys.version_info > (3, 0):
-    PY3 = True
-else:
-    PY3 = False
-
-from .base import BaseMesh
+from .base import BaseMesh, Region
+from .writer import STL_DTYPE
 
 
 logger = logging.getLogger(__name__)
 
 
+def detect_format(filename):
+    r"""Detect if an STL file is binary, without reading the whole file
+
+    The decision is made in O(1): a file whose size is exactly
+    84 + 50 * N, where N is the triangle count stored after the 80 bytes
+    header, is binary (even if its header starts with 'solid'). Otherwise
+    the first kilobyte is sniffed for a NUL byte.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the file
+
+    Returns
+    -------
+    tuple(bool, int or None)
+        True and the triangle count if the file is binary,
+        False and None if the file is ASCII
+
+    Raises
+    ------
+    EnvironmentError    if the file does not exist or cannot be accessed.
+
+    """
+    preamble_size = Stl.HEADER_SIZE + Stl.COUNT_SIZE
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as fh:
+        sniff = fh.read(Stl.SNIFF_SIZE)
+
+    if size >= preamble_size:
+        count, = struct.unpack("<I", sniff[Stl.HEADER_SIZE:preamble_size])
+        if size == preamble_size + Stl.stl_dtype.itemsize * count:
+            return True, count
+        if b'\0' in sniff:
+            logger.warning("Binary STL size does not match its "
+                           "triangle count (%i)" % count)
+            return True, count
+
+    elif b'\0' in sniff:
+        return True, 0
+
+    return False, None
+
+
 def is_binary(filename):
     """
     Return True if the given filename is binary, False otherwise.
+
     Parameters
     ----------
     filename : str
         Path to the file
+
     Raises
     ------
     EnvironmentError    if the file does not exist or cannot be accessed.
-    Reference
-    ---------
-    http://bytes.com/topic/python/answers/21222-determine-file-type-binary-text
-    on 6/08/2010
-    """
-    fin = open(filename, 'rb')
-    try:
-        CHUNKSIZE = 1024
-        while 1:
-            chunk = fin.read(CHUNKSIZE)
-
-            if PY3:
-                backslash_zero = '\0'.encode()
-            else:
-                backslash_zero = '\0'
 
-            if backslash_zero in chunk:  # found null byte
-                return True
-            if len(chunk) < CHUNKSIZE:
-                break  # done
-    finally:
-        fin.close()
-    return False
+    See Also
+    --------
+    detect_format
+
+    """
+    return detect_format(filename)[0]
 
 
 class Stl(BaseMesh):
@@ -64,16 +90,29 @@ class Stl(BaseMesh):
 
     HEADER_SIZE = 80
     COUNT_SIZE = 4
-    MAX_COUNT = 1e6
-    BUFFER_SIZE = 4096
-
-    stl_dtype = numpy.dtype([
-        ('normals', numpy.float32, (3, )),
-        ('vectors', numpy.float32, (3, 3)),
-        ('attr', numpy.uint16, (1, )),
-    ])
-
-    def __init__(self, filename=None, mode_policy=MODE_AUTO):
+    SNIFF_SIZE = 1024
+    ASCII_BLOCK_SIZE = 8 * 1024 * 1024
+    CHUNK_TRIANGLES = 65536
+
+    # Numbers of a facet, in 4 groups (normal, 3 vertices) each followed
+    # by a whitespace so that the groups can be joined without separator
+    ASCII_FACET_RE = re.compile(
+        br"facet\s+normal\s+(\S+\s+\S+\s+\S+\s+)outer\s+loop"
+        br"\s+vertex\s+(\S+\s+\S+\s+\S+\s+)"
+        br"vertex\s+(\S+\s+\S+\s+\S+\s+)"
+        br"vertex\s+(\S+\s+\S+\s+\S+\s+)endloop\s+endfacet")
+
+    # solid <name> and endsolid [<name>] lines. Starting with the literal
+    # keeps the search fast, what precedes it on the line is checked after
+    ASCII_SOLID_RE = re.compile(br"solid\b[ \t]*([^\r\n]*)")
+
+    stl_dtype = STL_DTYPE
+
+    def __init__(self,
+                 filename=None,
+                 mode_policy=MODE_AUTO,
+                 mmap=False,
+                 dtype=None):
         """Create a instance of Stl.
 
         Parameters
@@ -82,71 +121,111 @@ class Stl(BaseMesh):
             The filename to open
         mode_policy: int
             The mode to open, default is MODE_AUTO.
-            0 : MODE_AUTO
-            1 : MODE_ASCII
-            2 : MODE_BINARY
+            0 : MODE_AUTO, the format is detected (see detect_format)
+            1 : MODE_ASCII, the file is parsed as ASCII
+            2 : MODE_BINARY, the file is read as binary
+        mmap : bool
+            Memory-map a binary file instead of reading it, default is False.
+            data, normals, vectors and attr are then read-only views over
+            the file and a private copy is only made on the first mutation.
+            Ignored (the file is read) for ASCII files.
+        dtype : None, numpy.float32 or numpy.float64
+            Storage of vectors, default is None (float64 homogeneous
+            coordinates). numpy.float32 keeps the compact x, y, z of the
+            file as a view over data, with no extra memory.
 
         """
-        super(Stl, self).__init__()
+        super(Stl, self).__init__(dtype=dtype)
 
         if filename is None:
             # Create EMPTY data
             self.name = "empty"
             self.data = numpy.zeros(0, dtype=Stl.stl_dtype)
             self.mode = Stl.MODE_BINARY
+            regions = list()
 
         else:
             # Create data from file
-            # if py3() is True:
-            if is_binary(filename):
-                mode = "rb"
+            binary, count = Stl.__format(filename, mode_policy)
+            if mmap is True and binary:
+                name, data, mode = "", Stl.__map_binary(filename, count), \
+                                   Stl.MODE_BINARY
+                regions = list()
             else:
-                mode = "r"
-            # else:
-            #     mode = "rb"
-            with open(filename, mode) as fh:
-                name, data, mode = Stl.__load(fh, mode=mode_policy)
+                if mmap is True:
+                    logger.warning("Cannot memory-map an ASCII STL file, "
+                                   "reading it instead")
+                with open(filename, "rb") as fh:
+                    name, data, mode, regions = Stl.__load(fh, binary)
             self.name = name
             self.data = data
             self.mode = mode
 
         super(Stl, self).set_initial_values()
+        self.regions = regions
         return
 
     @staticmethod
-    def __load(fh, mode=MODE_AUTO):
+    def __format(filename, mode_policy):
+        r"""Is the file to be read as binary, and its triangle count
+
+        Parameters
+        ----------
+        filename : str
+        mode_policy : int
+            MODE_AUTO, MODE_ASCII or MODE_BINARY
+
+        Returns
+        -------
+        tuple(bool, int or None), as detect_format
+
+        """
+        if mode_policy == Stl.MODE_AUTO:
+            return detect_format(filename)
+        elif mode_policy == Stl.MODE_ASCII:
+            return False, None
+        elif mode_policy == Stl.MODE_BINARY:
+            with open(filename, "rb") as fh:
+                fh.seek(Stl.HEADER_SIZE)
+                if len(fh.read(Stl.COUNT_SIZE)) != Stl.COUNT_SIZE:
+                    msg = "Binary STL file is too short"
+                    logger.error(msg)
+                    raise RuntimeError(msg)
+                fh.seek(Stl.HEADER_SIZE)
+                return True, Stl.__read_count(fh)
+        else:
+            msg = "Invalid mode_policy %r" % mode_policy
+            logger.error(msg)
+            raise ValueError(msg)
+
+    @staticmethod
+    def __load(fh, binary):
         """Load Mesh from STL file
 
         Parameters
         ----------
         fh : FileIO
-            The file handle to open
-        mode : int
-            The mode to open, default is MODE_AUTO.
-            0 : MODE_AUTO
-            1 : MODE_ASCII
-            2 : MODE_BINARY
+            The file handle to open, in binary mode
+        binary : bool
+            Is the file a binary STL?
 
         """
-        header = fh.read(Stl.HEADER_SIZE).lower()
-        name = ""
-        data = None
-        if not header.strip():
-            return
-
-        if fh.mode == "r":
-            try:
-                name = header.split('\n', 1)[0][:5].strip()
-                data = Stl.__load_ascii(fh, header)
-                mode = Stl.MODE_ASCII
-            except:
-                # NO pass after except (GF 27 OCT 2017)
-                msg = "Error in header splitting or ascii loading"
-                logger.warning(msg)
-                # pass
-        elif fh.mode == "rb":
+        header = fh.read(Stl.HEADER_SIZE)
+
+        if binary:
+            # The header of a binary file may be blank
+            name = ""
             data = Stl.__load_binary(fh)
             mode = Stl.MODE_BINARY
+            regions = list()
+        else:
+            if not header.strip():
+                msg = "Empty STL file"
+                logger.error(msg)
+                raise RuntimeError(msg)
+            name = header.lower().split(b'\n', 1)[0][:5].strip().decode()
+            data, regions = Stl.__load_ascii(fh, header)
+            mode = Stl.MODE_ASCII
 
         # if mode in (Stl.MODE_AUTO, Stl.MODE_ASCII) and \
         #         header.startswith('solid'):
@@ -164,129 +243,236 @@ class Stl(BaseMesh):
         #     data = Stl.__load_binary(fh)
         #     mode = Stl.MODE_BINARY
 
-        return name, data, mode
+        return name, data, mode, regions
 
     @staticmethod
-    def __load_binary(fh):
-        # Read the triangle count
-        count, = struct.unpack("i", fh.read(Stl.COUNT_SIZE))
-        # assert count < Stl.MAX_COUNT, \
-        #     'File too large, got {} triangles ' \
-        #     'which exceeds the maximum of {}' .format(count, Stl.MAX_COUNT)
-        if count >= Stl.MAX_COUNT:
-            msg = 'File too large, got {} triangles which exceeds ' \
-                  'the maximum of {}' .format(count, Stl.MAX_COUNT)
+    def iter_chunks(filename, chunk_triangles=CHUNK_TRIANGLES):
+        r"""Iterate over the triangles of a binary STL file by blocks
+
+        Only one block is held in memory at a time, whatever the number
+        of triangles in the file.
+
+        Parameters
+        ----------
+        filename : str
+            Path to a binary STL file
+        chunk_triangles : int
+            Maximum number of triangles per block
+
+        Yields
+        ------
+        numpy.ndarray with the stl_dtype record layout
+
+        Examples
+        --------
+        >>> volume = 0.
+        >>> for chunk in Stl.iter_chunks("big.stl"):
+        ...     volume += numpy.linalg.det(chunk['vectors']).sum() / 6.
+
+        """
+        if chunk_triangles < 1:
+            msg = "chunk_triangles must be a positive integer"
+            logger.error(msg)
+            raise ValueError(msg)
+
+        if not is_binary(filename):
+            msg = "Chunked reading is only available for binary STL files"
             logger.error(msg)
             raise RuntimeError(msg)
-        return numpy.fromfile(fh, Stl.stl_dtype, count=count)
+
+        with open(filename, "rb") as fh:
+            fh.seek(Stl.HEADER_SIZE)
+            remaining = Stl.__read_count(fh)
+            while remaining > 0:
+                chunk = numpy.empty(min(remaining, chunk_triangles),
+                                    dtype=Stl.stl_dtype)
+                Stl.__read_binary_into(fh, chunk, chunk_triangles)
+                remaining -= chunk.size
+                yield chunk
 
     @staticmethod
-    def __load_ascii(fh, header):
-        return numpy.fromiter(Stl.__ascii_reader(fh, header),
-                              dtype=Stl.stl_dtype)
+    def __read_count(fh):
+        r"""Read the triangle count that follows the header"""
+        count, = struct.unpack("<I", fh.read(Stl.COUNT_SIZE))
+        return count
 
     @staticmethod
-    def __ascii_reader(fh, header):
+    def __read_binary_into(fh, out, chunk_triangles=CHUNK_TRIANGLES):
+        r"""Fill out (stl_dtype records) from fh, chunk_triangles at a time
+
+        Raises
+        ------
+        RuntimeError if the file ends before out is filled
+
         """
-        
+        for start in range(0, out.size, chunk_triangles):
+            buf = out[start:start + chunk_triangles].view(numpy.uint8)
+            if fh.readinto(buf) != buf.size:
+                msg = "Binary STL file is truncated, expected {} " \
+                      "triangles".format(out.size)
+                logger.error(msg)
+                raise RuntimeError(msg)
+
+    @staticmethod
+    def __load_binary(fh):
+        data = numpy.empty(Stl.__read_count(fh), dtype=Stl.stl_dtype)
+        Stl.__read_binary_into(fh, data)
+        return data
+
+    @staticmethod
+    def __map_binary(filename, count):
+        r"""Memory-map the triangles of a binary STL file (read-only)
+
         Parameters
         ----------
-        fh
-        header
-        
+        filename : str
+        count : int
+            The triangle count, as returned by detect_format
+
+        Returns
+        -------
+        numpy.memmap with the stl_dtype record layout
+
         """
+        expected_size = Stl.HEADER_SIZE + Stl.COUNT_SIZE + \
+            count * Stl.stl_dtype.itemsize
+        if os.path.getsize(filename) < expected_size:
+            msg = "Binary STL file is truncated, expected {} triangles"\
+                .format(count)
+            logger.error(msg)
+            raise RuntimeError(msg)
 
-        lines = header.split('\n')
-        recoverable = [True]
+        if count == 0:
+            # numpy cannot map an empty region
+            return numpy.zeros(0, dtype=Stl.stl_dtype)
+        return numpy.memmap(filename,
+                            dtype=Stl.stl_dtype,
+                            mode="r",
+                            offset=Stl.HEADER_SIZE + Stl.COUNT_SIZE,
+                            shape=(count, ))
 
-        def get(prefix=''):
-            r"""
-            
-            Parameters
-            ----------
-            prefix : str
+    @staticmethod
+    def __load_ascii(fh, header):
+        r"""Parse all the solids of an ASCII STL file in a single pass
 
-            Returns
-            -------
-            list[float] if prefix evaluates to True
-            str if prefix evaluates to False
+        The file is read by blocks of ASCII_BLOCK_SIZE bytes cut after an
+        endfacet. The numbers of all the facets of a block are extracted
+        at once and converted by numpy, without any per-line Python work.
 
-            """
-            if lines:
-                line = lines.pop(0)
-            else:
-                raise RuntimeError(recoverable[0], 'Unable to find more lines')
-
-            if not lines:
-                recoverable[0] = False
-
-                # Read more lines and make sure we prepend any old data
-                lines[:] = fh.read(Stl.BUFFER_SIZE).split('\n')
-                line += lines.pop(0)
-            line = line.lower().strip()
-
-            if prefix:
-                if line.startswith(prefix):
-                    values = line.replace(prefix, '', 1).strip().split()
-                elif line.startswith('endsolid'):
-                    raise StopIteration()
-                else:
-                    raise RuntimeError(recoverable[0],
-                                       '%r should start with %r' % (line,
-                                                                    prefix))
-
-                if len(values) == 3:
-                    vertex = [float(v) for v in values]
-                    return vertex
-                else:  # pragma: no cover
-                    raise RuntimeError(recoverable[0],
-                                       'Incorrect value %r' % line)
-            else:
-                return line
+        Parameters
+        ----------
+        fh : FileIO
+            The file handle, positioned right after header
+        header : bytes
+            The first bytes of the file, already read
+
+        Returns
+        -------
+        numpy.ndarray with the stl_dtype record layout,
+        list[Region] with one region per solid, in file order
+
+        """
+        if not header.lstrip().lower().startswith(b'solid'):
+            msg = "ASCII STL file should start with 'solid'"
+            logger.error(msg)
+            raise RuntimeError(msg)
+
+        blocks = list()
+        regions = list()
+        # True between solid and endsolid
+        in_solid = [False]
+
+        def add_facets(facets):
+            r"""Append facets to the current (last) region"""
+            if len(facets) == 0:
+                return
+            if not in_solid[0]:
+                msg = "Facet outside of a solid in ASCII STL file"
+                logger.error(msg)
+                raise RuntimeError(msg)
+            blocks.append(facets)
+            name, start, count = regions[-1]
+            regions[-1] = Region(name, start, count + len(facets))
+
+        for block, lower_block in Stl.__iter_ascii_blocks(fh, header):
+            position = 0
+            for match in Stl.ASCII_SOLID_RE.finditer(lower_block):
+                line_start = lower_block.rfind(b'\n', 0, match.start()) + 1
+                keyword = lower_block[line_start:match.start()].strip()
+                if keyword not in (b'', b'end'):
+                    continue
+                add_facets(Stl.__parse_ascii_facets(
+                    lower_block[position:line_start]))
+                in_solid[0] = keyword == b''
+                if keyword == b'':
+                    # solid <name> : a new region starts
+                    name = block[match.start(1):match.end(1)].strip()
+                    start = regions[-1].start + regions[-1].count \
+                        if regions else 0
+                    regions.append(Region(name.decode(), start, 0))
+                position = match.end()
+            add_facets(Stl.__parse_ascii_facets(lower_block[position:]))
+
+        data = numpy.zeros(sum(len(b) for b in blocks), dtype=Stl.stl_dtype)
+        start = 0
+        for block in blocks:
+            data['normals'][start:start + len(block)] = block[:, :3]
+            data['vectors'][start:start + len(block)] = \
+                block[:, 3:].reshape(-1, 3, 3)
+            start += len(block)
+        return data, regions
 
-        line = get()
-        if not line.startswith('solid ') and line.startswith('solid'):
-            msg = "Missing space after solid"
-            logger.warning(msg)
-            # print("Error")
+    @staticmethod
+    def __iter_ascii_blocks(fh, header):
+        r"""Yield blocks of an ASCII STL file ending on a facet
 
-        if not lines:
-            raise RuntimeError(recoverable[0],
-                               'No lines found, impossible to read')
+        Yields
+        ------
+        tuple(bytes, bytes) : the block and its lowercase version
 
+        """
+        tail = header
         while True:
-            # Read from the header lines first, until that point we can recover
-            # and go to the binary option. After that we cannot due to
-            # unseekable files such as sys.stdin
-            #
-            # Numpy doesn't support any non-file types so wrapping with a
-            # buffer and/or StringIO does not work.
-            try:
-                normals = get('facet normal')
-                # assert get() == 'outer loop'
-                if get() != 'outer loop':
-                    msg = "get() is different from 'outer_loop'"
-                    logger.error(msg)
-                    raise AssertionError(msg)
-                v0 = get('vertex')
-                v1 = get('vertex')
-                v2 = get('vertex')
-                # assert get() == 'endloop'
-                if get() != 'endloop':
-                    msg = "get() is different from 'endloop'"
-                    logger.error(msg)
-                    raise AssertionError(msg)
-                # assert get() == 'endfacet'
-                if get() != 'endfacet':
-                    msg = "get() is different from 'endfacet'"
-                    logger.error(msg)
-                    raise AssertionError(msg)
-                attrs = 0
-                yield (normals, (v0, v1, v2), attrs)
-            except AssertionError as e:
-                raise RuntimeError(recoverable[0], e)
-            except StopIteration:
-                if any(lines):
-                    # Seek back to where the next solid should begin
-                    fh.seek(-len('\n'.join(lines)), os.SEEK_CUR)
-                raise
+            chunk = fh.read(Stl.ASCII_BLOCK_SIZE)
+            if not chunk:
+                yield tail, tail.lower()
+                return
+            block = tail + chunk
+            lower_block = block.lower()
+            cut = lower_block.rfind(b'endfacet')
+            if cut == -1:
+                tail = block
+            else:
+                cut += len(b'endfacet')
+                tail = block[cut:]
+                yield block[:cut], lower_block[:cut]
+
+    @staticmethod
+    def __parse_ascii_facets(block):
+        r"""Parse all the facets of a lowercase ASCII STL block
+
+        Returns
+        -------
+        numpy.ndarray of shape (number of facets, 12)
+            normal and 3 vertices of each facet
+
+        """
+        facets = Stl.ASCII_FACET_RE.findall(block)
+        if len(facets) != block.count(b'endfacet'):
+            msg = "Malformed facet in ASCII STL file"
+            logger.error(msg)
+            raise RuntimeError(msg)
+        if not facets:
+            return numpy.zeros((0, 12), dtype=numpy.float32)
+
+        try:
+            values = numpy.fromstring(b''.join(b''.join(f) for f in facets),
+                                      dtype=numpy.float32,
+                                      sep=' ')
+        except ValueError:
+            values = None
+        if values is None or values.size != 12 * len(facets):
+            msg = "Invalid number in ASCII STL file"
+            logger.error(msg)
+            raise RuntimeError(msg)
+        return values.reshape(-1, 12)
@@ -0,0 +1,315 @@
+# coding: utf-8
+
+r"""Streaming STL writers"""
+
+from __future__ import absolute_import, print_function
+
+import logging
+
+import datetime
+import struct
+
+import numpy
+
+# used in header of written STL files
+from aocxchange import __name__, __version__
+
+
+logger = logging.getLogger(__name__)
+
+
+# Record of a triangle of a binary STL file
+STL_DTYPE = numpy.dtype([
+    ('normals', numpy.float32, (3, )),
+    ('vectors', numpy.float32, (3, 3)),
+    ('attr', numpy.uint16, (1, )),
+])
+
+
+class StlWriter(object):
+    r"""Binary STL file written incrementally
+
+    The header is written and the triangle count reserved when the file is
+    opened. Triangles are then written by blocks (write) and the count is
+    patched when the writer is closed, so that a mesh never has to be held
+    in memory as a whole.
+
+    Examples
+    --------
+    >>> with StlWriter("part.stl") as writer:
+    ...     for vectors in blocks:
+    ...         writer.write(vectors)
+
+    Parameters
+    ----------
+    filename : str
+    header : str or bytes, optional
+        Truncated or padded to 80 bytes, default is the aocxchange version
+        and the date
+
+    """
+    HEADER_SIZE = 80
+    BLOCK_SIZE = 1 << 16
+    MAX_COUNT = 0xffffffff
+    MAX_ATTR = 0xffff
+
+    def __init__(self, filename, header=None):
+        if header is None:
+            header = "%s (%s) %s" % (__name__,
+                                     __version__,
+                                     datetime.datetime.now())
+        if not isinstance(header, bytes):
+            header = header.encode("ascii", "replace")
+
+        self.filename = filename
+        self.count = 0
+        self._buffer = None
+        self._fh = open(filename, "wb")
+        self._fh.write(header[:self.HEADER_SIZE].ljust(self.HEADER_SIZE,
+                                                       b" "))
+        self._fh.write(struct.pack("<I", 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def closed(self):
+        r"""Has the writer been closed?"""
+        return self._fh is None
+
+    def write(self, vectors, normals=None, attr=0):
+        r"""Write a block of triangles
+
+        Parameters
+        ----------
+        vectors : array like of shape (number of triangles, 3, 3 or 4)
+            Only x, y, z are written
+        normals : array like of shape (number of triangles, 3), optional
+            Computed from vectors if None
+        attr : int or array like of shape (number of triangles, )
+            Attribute byte count of the triangles, e.g. a solid tag
+
+        Returns
+        -------
+        StlWriter (self)
+
+        """
+        vectors = numpy.asarray(vectors)
+        if vectors.ndim != 3 or vectors.shape[1] != 3 or \
+                vectors.shape[2] not in (3, 4):
+            msg = "Expecting vectors of shape (n, 3, 3) or (n, 3, 4)"
+            logger.error(msg)
+            raise ValueError(msg)
+        attr = numpy.broadcast_to(numpy.asarray(attr, dtype=numpy.uint16),
+                                  (len(vectors), ))
+
+        for start in range(0, len(vectors), self.BLOCK_SIZE):
+            end = min(start + self.BLOCK_SIZE, len(vectors))
+            block = self.__get_buffer(end - start)
+            block['vectors'] = vectors[start:end, :, :3]
+            if normals is None:
+                block['normals'] = triangle_normals(block['vectors'])
+            else:
+                block['normals'] = normals[start:end]
+            block['attr'][:, 0] = attr[start:end]
+            self.write_data(block)
+        return self
+
+    def write_data(self, data):
+        r"""Write a block of binary STL records as they are
+
+        Parameters
+        ----------
+        data : numpy.ndarray of dtype STL_DTYPE (e.g. BaseMesh.data)
+
+        Returns
+        -------
+        StlWriter (self)
+
+        """
+        if self.closed:
+            msg = "Writing to a closed StlWriter"
+            logger.error(msg)
+            raise RuntimeError(msg)
+        if data.dtype != STL_DTYPE:
+            msg = "Expecting binary STL records, got %s" % data.dtype
+            logger.error(msg)
+            raise ValueError(msg)
+        if self.count + data.size > self.MAX_COUNT:
+            msg = "Too many triangles for a binary STL file"
+            logger.error(msg)
+            raise RuntimeError(msg)
+
+        self._fh.write(numpy.ascontiguousarray(data).data)
+        self.count += data.size
+        return self
+
+    def close(self):
+        r"""Patch the triangle count and close the file"""
+        if self.closed:
+            return
+        self._fh.seek(self.HEADER_SIZE)
+        self._fh.write(struct.pack("<I", self.count))
+        self._fh.close()
+        self._fh = None
+        self._buffer = None
+        logger.info("Wrote %i triangles to %s" % (self.count, self.filename))
+
+    def __get_buffer(self, size):
+        r"""Reusable block of records"""
+        if self._buffer is None or len(self._buffer) < size:
+            self._buffer = numpy.zeros(size, dtype=STL_DTYPE)
+        return self._buffer[:size]
+
+
+class AsciiStlWriter(object):
+    r"""ASCII STL file written incrementally, one solid at a time
+
+    Facets are formatted by blocks of BLOCK_SIZE with a single % operation
+    per block.
+
+    Examples
+    --------
+    >>> with AsciiStlWriter("assembly.stl") as writer:
+    ...     for name, vectors in parts:
+    ...         writer.write_solid(name, vectors)
+
+    Parameters
+    ----------
+    filename : str
+    precision : int
+        Number of decimals of the numbers, default is 6
+
+    """
+    BLOCK_SIZE = 1 << 14
+
+    def __init__(self, filename, precision=6):
+        self.filename = filename
+        self.count = 0
+        self._facet = ("facet normal {0} {0} {0}\n"
+                       "  outer loop\n"
+                       "    vertex {0} {0} {0}\n"
+                       "    vertex {0} {0} {0}\n"
+                       "    vertex {0} {0} {0}\n"
+                       "  endloop\n"
+                       "endfacet\n").format("%.{}f".format(precision))
+        self._fh = open(filename, "wb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def closed(self):
+        r"""Has the writer been closed?"""
+        return self._fh is None
+
+    def write_solid(self, name, vectors, normals=None):
+        r"""Write a solid
+
+        Parameters
+        ----------
+        name : str
+        vectors : array like of shape (number of triangles, 3, 3 or 4)
+            Only x, y, z are written
+        normals : array like of shape (number of triangles, 3), optional
+            Computed from vectors if None
+
+        Returns
+        -------
+        AsciiStlWriter (self)
+
+        """
+        if self.closed:
+            msg = "Writing to a closed AsciiStlWriter"
+            logger.error(msg)
+            raise RuntimeError(msg)
+
+        self._fh.write("solid {}\n".format(name).encode())
+        for start in range(0, len(vectors), self.BLOCK_SIZE):
+            block_vectors = numpy.asarray(
+                vectors[start:start + self.BLOCK_SIZE])[:, :, :3]
+            if normals is None:
+                block_normals = triangle_normals(block_vectors)
+            else:
+                block_normals = normals[start:start + self.BLOCK_SIZE, :3]
+            values = numpy.hstack((block_normals,
+                                   block_vectors.reshape(-1, 9)))
+            self._fh.write(format_block(self._facet, values).encode())
+        self._fh.write("endsolid {}\n".format(name).encode())
+        self.count += len(vectors)
+        return self
+
+    def close(self):
+        r"""Close the file"""
+        if self.closed:
+            return
+        self._fh.close()
+        self._fh = None
+        logger.info("Wrote %i triangles to %s" % (self.count, self.filename))
+
+
+def number_format(precision=None):
+    r"""% format of a coordinate
+
+    Parameters
+    ----------
+    precision : int or None
+        Number of decimals, None for 17 significant digits (float64 values
+        are written without any loss)
+
+    Returns
+    -------
+    str
+
+    """
+    return "%.17g" if precision is None else "%.{}f".format(precision)
+
+
+def format_block(template, values):
+    r"""Format template with each row of values and join the results
+
+    Parameters
+    ----------
+    template : str
+        A % format string with as many fields as values has columns
+    values : numpy.ndarray of shape (n, number of fields)
+
+    Returns
+    -------
+    str
+
+    """
+    return (template * len(values)) % tuple(values.ravel().tolist())
+
+
+def triangle_normals(vectors):
+    r"""Unit normals of triangles
+
+    Parameters
+    ----------
+    vectors : numpy.ndarray
+        (number of triangles, 3, 3) vertices, or (number of triangles, 3, 4)
+        homogeneous coordinates
+
+    Returns
+    -------
+    numpy.ndarray
+        (number of triangles, 3) unit normals, (0, 0, 0) for the degenerate
+        (zero area) triangles
+
+    """
+    v0 = vectors[:, 0, :3]
+    normals = numpy.cross(vectors[:, 1, :3] - v0, vectors[:, 2, :3] - v0)
+    norms = numpy.sqrt(numpy.einsum('ij,ij->i', normals, normals))
+    # not (norm > 0) also catches NaN coming from invalid vertices
+    degenerate = ~(norms > 0)
+    numpy.divide(normals, norms[:, None], out=normals,
+                 where=~degenerate[:, None])
+    normals[degenerate] = 0
+    return normals
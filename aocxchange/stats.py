@@ -0,0 +1,164 @@
+# coding: utf-8
+
+r"""Instrumentation of the importers and exporters
+
+Each importer and exporter has a stats attribute (a Stats) recording the
+wall time and CPU time of its phases (e.g. parse, transfer, write) with the
+peak memory of the process, and some counts (e.g. roots, shapes, faces,
+triangles). An optional callback is called at the end of each phase, e.g.
+to export the phases to a metrics system.
+
+"""
+
+from __future__ import print_function
+
+import collections
+import contextlib
+import logging
+import os
+import sys
+import timeit
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# A phase of an importer or exporter. process_peak_rss is the peak resident
+# set size of the process since it started (not of the phase), read at the
+# end of the phase, in bytes (None if unknown)
+PhaseStats = collections.namedtuple("PhaseStats",
+                                    ["name",
+                                     "wall_time",
+                                     "cpu_time",
+                                     "process_peak_rss"])
+
+
+def cpu_time():
+    r"""User + system CPU time of the process, in seconds"""
+    times = os.times()
+    return times[0] + times[1]
+
+
+def process_peak_rss():
+    r"""Peak resident set size of the process since it started, in bytes
+
+    Returns
+    -------
+    int or None if unknown (Windows)
+
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Stats(object):
+    r"""Phases and counts of an importer or exporter
+
+    Examples
+    --------
+    >>> def export(stats, phase):
+    ...     print(stats.name, phase.name, phase.wall_time)
+    >>> importer = StepImporter("part.stp", callback=export)
+    >>> importer.stats.counts["roots"]
+
+    Parameters
+    ----------
+    name : str
+        e.g. the class name of the importer or exporter
+    callback : callable, optional
+        callback(stats, phase), called with this Stats and the PhaseStats
+        at the end of each phase
+
+    """
+    def __init__(self, name, callback=None):
+        self.name = name
+        self.callback = callback
+        self.phases = list()
+        self._counts = dict()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        r"""Context manager measuring a phase
+
+        The phase is recorded even if it raises an exception.
+
+        Parameters
+        ----------
+        name : str
+
+        """
+        wall_start, cpu_start = timeit.default_timer(), cpu_time()
+        try:
+            yield
+        finally:
+            phase = PhaseStats(name,
+                               timeit.default_timer() - wall_start,
+                               cpu_time() - cpu_start,
+                               process_peak_rss())
+            self.phases.append(phase)
+            logger.debug("%s %s : %.3f s (CPU %.3f s)" % (self.name,
+                                                          name,
+                                                          phase.wall_time,
+                                                          phase.cpu_time))
+            if self.callback is not None:
+                self.callback(self, phase)
+
+    def count(self, name, value):
+        r"""Record a count, e.g. count("roots", 2)
+
+        Parameters
+        ----------
+        name : str
+        value : int or callable
+            A callable returning the count is only called when the counts
+            are read (counts, as_dict), for the counts that are long to
+            compute (e.g. the faces of the shapes)
+
+        """
+        self._counts[name] = value
+
+    @property
+    def counts(self):
+        r"""Counts by name, the callables being evaluated (once)
+
+        Returns
+        -------
+        dict
+
+        """
+        for name in list(self._counts):
+            if callable(self._counts[name]):
+                self._counts[name] = self._counts[name]()
+        return self._counts
+
+    @property
+    def wall_time(self):
+        r"""Total wall time of the phases"""
+        return sum(phase.wall_time for phase in self.phases)
+
+    @property
+    def cpu_time(self):
+        r"""Total CPU time of the phases"""
+        return sum(phase.cpu_time for phase in self.phases)
+
+    def as_dict(self):
+        r"""Phases and counts as plain python types (e.g. for JSON)
+
+        Returns
+        -------
+        dict
+            {"name": ..., "phases": [{"name": ..., "wall_time": ...,
+            "cpu_time": ..., "process_peak_rss": ...}, ...],
+            "counts": {...}}
+
+        """
+        return {"name": self.name,
+                "phases": [dict(phase._asdict()) for phase in self.phases],
+                "counts": dict(self.counts)}
@@ -5,8 +5,15 @@ r"""step module of aocxchange"""
 from __future__ import print_function
 
 import logging
+import multiprocessing
 import warnings
 
+try:
+    from collections.abc import Sequence
+except ImportError:
+    # Python 2
+    from collections import Sequence
+
 from OCC.Core.BRep import BRep_Builder
 from OCC.Core.IFSelect import IFSelect_ItemsByEntity, IFSelect_RetDone
 from OCC.Core.Interface import Interface_Static_SetCVal
@@ -16,6 +23,8 @@ from OCC.Core.TopoDS import TopoDS_Compound
 
 from aocutils.types_ import topo_types_dict
 
+from aocxchange.brep import shape_to_brep_string, brep_string_to_shape
+from aocxchange.cache import BrepCache, reader_settings
 from aocxchange.exceptions import StepFileReadException, \
     StepFileWriteException, StepShapeTransferException, \
     StepUnknownSchemaException
@@ -23,6 +32,9 @@ from aocxchange.exceptions import StepFileReadException, \
 from aocxchange.checks import check_importer_filename, check_exporter_filename,\
     check_overwrite, check_shape
 from aocxchange.extensions import step_extensions
+from aocxchange.stats import Stats
+from aocxchange.topology import nb_faces
+from aocxchange.utils import handle_object
 
 logger = logging.getLogger(__name__)
 
@@ -33,19 +45,64 @@ class StepImporter(object):
     Parameters
     ----------
     filename : str
+    lazy : bool, optional (default is False)
+        If False, all the roots are transferred to shapes when the file is
+        read. If True, the file is only parsed: the roots and their entity
+        types are available (nb_roots, root_types) and a root is transferred
+        when it is first accessed (shape(i) or shapes[i]).
+    cache : BrepCache or bool, optional (default is None, no cache)
+        Cache of the transferred shapes, True for a BrepCache in the default
+        directory. The shapes of a file already in the cache are read from
+        BREP files, otherwise the shapes are stored once all the roots are
+        transferred (by read_file, or on access in lazy mode).
+    workers : int, optional (default is None, serial transfer)
+        Number of processes transferring the roots in read_file. The roots
+        are split in contiguous ranges, each worker reads the file again,
+        transfers its range and sends the shapes back as BREP strings. Only
+        worth it for files with many roots that are long to transfer.
+    callback : callable, optional
+        Called at the end of each phase, see aocxchange.stats.Stats
 
     """
-    def __init__(self, filename=None):
+    # Reader settings that change the transferred shapes (cache key)
+    READER_SETTINGS = ["read.precision.mode",
+                       "read.precision.val",
+                       "read.maxprecision.mode",
+                       "read.maxprecision.val",
+                       "read.surfacecurve.mode",
+                       "read.step.product.mode",
+                       "read.step.product.context",
+                       "read.step.shape.repr",
+                       "read.step.assembly.level",
+                       "xstep.cascade.unit"]
+
+    def __init__(self, filename=None, lazy=False, cache=None, workers=None,
+                 callback=None):
         logger.info("StepImporter instantiated with filename : %s" % filename)
+        self.stats = Stats("StepImporter", callback)
         self._shapes = list()
         self._number_of_shapes = 0
+        self._reader = None
+        self._root_types = list()
+        # root index -> transferred shape (None if the transfer failed)
+        self._transferred = dict()
+        self.lazy = lazy
+        self.workers = workers
+        self.cache = BrepCache() if cache is True else (cache or None)
+        self._cache_key_value = None
 
         check_importer_filename(filename, step_extensions)
 
         self._filename = filename
 
-        logger.info("Reading file ....")
-        self.read_file()
+        if self.cache is not None and self._read_cache():
+            logger.info("Shapes read from the cache")
+        elif lazy is True:
+            logger.info("Parsing file ....")
+            self._parse_file()
+        else:
+            logger.info("Reading file ....")
+            self.read_file()
 
     # CONFUSING !! Comes from an assignment in ReadFile
     #              but looks like the len of shapes
@@ -60,75 +117,330 @@ class StepImporter(object):
     #     """
     #     return self._number_of_shapes
 
+    def _parse_file(self):
+        r"""Read the STEP file into a STEPControl_Reader, without any
+        transfer"""
+        stepcontrol_reader = STEPControl_Reader()
+        with self.stats.phase("parse"):
+            status = stepcontrol_reader.ReadFile(self._filename)
+
+        if status != IFSelect_RetDone:
+            msg = "Status is not IFSelect_RetDone"
+            logger.error(msg)
+            raise StepFileReadException(msg)
+
+        stepcontrol_reader.PrintCheckLoad(False, IFSelect_ItemsByEntity)
+        nb_roots = stepcontrol_reader.NbRootsForTransfer()
+        logger.info("%i root(s)" % nb_roots)
+        if nb_roots == 0:
+            msg = "No root for transfer"
+            logger.error(msg)
+            raise StepFileReadException(msg)
+
+        self._reader = stepcontrol_reader
+        self._root_types = [
+            handle_object(
+                stepcontrol_reader.RootForTransfer(n)).DynamicType().Name()
+            for n in range(1, nb_roots + 1)]
+        self._number_of_shapes = stepcontrol_reader.NbShapes()
+        self.stats.count("roots", nb_roots)
+
     def read_file(self):
         """
         Read the STEP file and stores the result in a _shapes list
         """
-        stepcontrol_reader = STEPControl_Reader()
-        status = stepcontrol_reader.ReadFile(self._filename)
-
-        if status == IFSelect_RetDone:
-            stepcontrol_reader.PrintCheckLoad(False, IFSelect_ItemsByEntity)
-            nb_roots = stepcontrol_reader.NbRootsForTransfer()
-            logger.info("%i root(s)" % nb_roots)
-            if nb_roots == 0:
-                msg = "No root for transfer"
-                logger.error(msg)
-                raise StepFileReadException(msg)
-
-            stepcontrol_reader.PrintCheckTransfer(False, IFSelect_ItemsByEntity)
-
-            self._number_of_shapes = stepcontrol_reader.NbShapes()
-
-            for n in range(1, nb_roots + 1):
-                logger.info("Root index %i" % n)
-                ok = stepcontrol_reader.TransferRoot(n)
-                logger.info("TransferRoots status : %i" % ok)
-
-                if ok:
-                    # for i in range(1, self.nb_shapes + 1):
-                    a_shape = stepcontrol_reader.Shape(n)
-                    if a_shape.IsNull():
-                        msg = "At least one shape in IGES cannot be transferred"
-                        logger.warning(msg)
-                    else:
-                        self._shapes.append(a_shape)
-                        logger.info("Appending a %s to list of shapes" %
-                                    topo_types_dict[a_shape.ShapeType()])
-                else:
-                    msg = "One shape could not be transferred"
-                    logger.warning(msg)
-                    warnings.warn(msg)
-            return True
+        self._parse_file()
+        self._reader.PrintCheckTransfer(False, IFSelect_ItemsByEntity)
+
+        with self.stats.phase("transfer"):
+            if self.workers is not None and self.workers > 1 and \
+                    self.nb_roots > 1:
+                self._transfer_parallel()
+
+            for i in range(self.nb_roots):
+                a_shape = self._transfer(i)
+                if a_shape is not None:
+                    self._shapes.append(a_shape)
+                    logger.info("Appending a %s to list of shapes" %
+                                topo_types_dict[a_shape.ShapeType()])
+
+        # Everything is transferred, free the STEP model
+        self._reader = None
+        self._count_shapes()
+
+        if self.cache is not None:
+            self._write_cache()
+        return True
+
+    def _count_shapes(self):
+        r"""Record the number of shapes and faces in stats"""
+        self.stats.count("shapes", len(self._shapes))
+        self.stats.count("faces", lambda: nb_faces(self._shapes))
+
+    def _transfer_parallel(self):
+        r"""Transfer all the roots in a pool of self.workers processes"""
+        nb_workers = min(self.workers, self.nb_roots)
+        bounds = [self.nb_roots * k // nb_workers
+                  for k in range(nb_workers + 1)]
+        tasks = [(self._filename, list(range(start, end)))
+                 for start, end in zip(bounds[:-1], bounds[1:])]
+        logger.info("Transferring %i roots with %i workers" % (self.nb_roots,
+                                                               nb_workers))
+        pool = multiprocessing.Pool(nb_workers)
+        try:
+            # map keeps the order of the tasks, hence of the roots
+            results = pool.map(_transfer_roots, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+        for i, brep_string in (item for items in results for item in items):
+            self._transferred[i] = None if brep_string is None \
+                else brep_string_to_shape(brep_string)
+
+    def _cache_key(self):
+        r"""Cache key of the file content and of the reader settings"""
+        if self._cache_key_value is None:
+            # The reader settings are defined once a STEP reader is created
+            STEPControl_Reader()
+            settings = reader_settings(self.READER_SETTINGS)
+            settings["reader"] = "STEP"
+            self._cache_key_value = self.cache.key(self._filename, settings)
+        return self._cache_key_value
+
+    def _write_cache(self):
+        r"""Store the shapes of the roots, all transferred, in the cache"""
+        roots = [i for i in range(self.nb_roots)
+                 if self._transferred[i] is not None]
+        with self.stats.phase("cache_write"):
+            try:
+                self.cache.put(self._cache_key(),
+                               [self._transferred[i] for i in roots],
+                               roots=roots,
+                               root_types=self._root_types)
+            except OSError as e:
+                # The cache is only a speed-up, the import goes on
+                logger.warning("Shapes not stored in the cache (%s)" % e)
+
+    def _write_cache_if_complete(self):
+        r"""In lazy mode, store the shapes in the cache once the last root
+        is transferred"""
+        if self.cache is not None and \
+                len(self._transferred) == self.nb_roots:
+            self._write_cache()
+
+    def _read_cache(self):
+        r"""Read the shapes of the roots from the cache
+
+        Returns
+        -------
+        bool
+            False if the file is not in the cache
+
+        """
+        with self.stats.phase("cache_read"):
+            entry = self.cache.get(self._cache_key())
+        if entry is None:
+            return False
+        self._root_types = list(entry.root_types)
+        self._transferred = dict.fromkeys(range(len(entry.root_types)))
+        self._transferred.update(zip(entry.roots, entry.shapes))
+        self._shapes = list(entry.shapes)
+        self._number_of_shapes = len(self._shapes)
+        self.stats.count("roots", self.nb_roots)
+        self._count_shapes()
+        return True
+
+    def _transfer(self, i):
+        r"""Transfer a root (memoized)
+
+        Parameters
+        ----------
+        i : int
+            0 based root index
+
+        Returns
+        -------
+        TopoDS_Shape or None if the root could not be transferred
+
+        """
+        if i in self._transferred:
+            return self._transferred[i]
+
+        logger.info("Root index %i" % (i + 1))
+        nb_shapes = self._reader.NbShapes()
+        ok = self._reader.TransferRoot(i + 1)
+        logger.info("TransferRoots status : %i" % ok)
+
+        a_shape = None
+        if ok and self._reader.NbShapes() > nb_shapes:
+            # The result of a transfer is appended to the shapes of the reader
+            a_shape = self._reader.Shape(self._reader.NbShapes())
+            if a_shape.IsNull():
+                msg = "At least one shape in STEP cannot be transferred"
+                logger.warning(msg)
+                a_shape = None
         else:
-            msg = "Status is not IFSelect_RetDone"
+            msg = "One shape could not be transferred"
+            logger.warning(msg)
+            warnings.warn(msg)
+
+        self._transferred[i] = a_shape
+        return a_shape
+
+    @property
+    def nb_roots(self):
+        r"""Number of roots (transferable entities) of the STEP file"""
+        return len(self._root_types)
+
+    @property
+    def root_types(self):
+        r"""STEP entity type of each root
+
+        Returns
+        -------
+        list[str]
+            e.g. StepShape_ManifoldSolidBrep, StepBasic_ProductDefinition
+
+        """
+        return list(self._root_types)
+
+    def shape(self, i):
+        r"""Shape of a root, transferred on first access in lazy mode
+
+        Parameters
+        ----------
+        i : int
+            0 based root index
+
+        Returns
+        -------
+        TopoDS_Shape
+
+        Raises
+        ------
+        IndexError if there is no such root
+        StepShapeTransferException if the root cannot be transferred
+
+        """
+        if not -self.nb_roots <= i < self.nb_roots:
+            raise IndexError("Root index %i out of range (%i roots)" %
+                             (i, self.nb_roots))
+        i %= self.nb_roots
+        if i not in self._transferred and self._reader is None:
+            msg = "Root %i is not available" % i
             logger.error(msg)
-            raise StepFileReadException(msg)
+            raise StepShapeTransferException(msg)
+        if i in self._transferred:
+            a_shape = self._transferred[i]
+        else:
+            with self.stats.phase("transfer"):
+                a_shape = self._transfer(i)
+            self._write_cache_if_complete()
+        if a_shape is None:
+            msg = "Root %i could not be transferred" % i
+            logger.error(msg)
+            raise StepShapeTransferException(msg)
+        return a_shape
 
     @property
     def compound(self):
         """ Create and returns a compound from the _shapes list"""
-        # Create a compound
-        compound = TopoDS_Compound()
-        brep_builder = BRep_Builder()
-        brep_builder.MakeCompound(compound)
-        # Populate the compound
-        for shape in self._shapes:
-            brep_builder.Add(compound, shape)
+        shapes = self._all_shapes()
+        with self.stats.phase("compound"):
+            # Create a compound
+            compound = TopoDS_Compound()
+            brep_builder = BRep_Builder()
+            brep_builder.MakeCompound(compound)
+            # Populate the compound
+            for shape in shapes:
+                brep_builder.Add(compound, shape)
         return compound
 
+    def _all_shapes(self):
+        r"""Shapes of all the roots that can be transferred"""
+        if self.lazy is False:
+            return self._shapes
+        if len(self._transferred) < self.nb_roots:
+            with self.stats.phase("transfer"):
+                for i in range(self.nb_roots):
+                    self._transfer(i)
+            self._write_cache_if_complete()
+        return [self._transferred[i] for i in range(self.nb_roots)
+                if self._transferred[i] is not None]
+
     @property
     def shapes(self):
         r"""Shapes
 
+        In lazy mode, a sequence of the shapes of the roots, a root being
+        transferred when it is first accessed. Unlike the list of the eager
+        mode, that skips the roots that cannot be transferred, it has a
+        shape per root (its length is nb_roots, see LazyShapes).
+
         Returns
         -------
-        list[TopoDS_Shape]
+        list[TopoDS_Shape] or LazyShapes in lazy mode
 
         """
+        if self.lazy is True:
+            return LazyShapes(self)
         return self._shapes
 
 
+def _transfer_roots(task):
+    r"""Transfer some roots of a STEP file (pool task)
+
+    Parameters
+    ----------
+    task : tuple(str, list[int])
+        STEP file and 0 based root indices
+
+    Returns
+    -------
+    list[tuple(int, str or None)]
+        Root index and BREP string of its shape (None if the root could not
+        be transferred)
+
+    """
+    filename, roots = task
+    importer = StepImporter(filename, lazy=True)
+    result = list()
+    for i in roots:
+        a_shape = importer._transfer(i)
+        result.append((i, None if a_shape is None
+                       else shape_to_brep_string(a_shape)))
+    return result
+
+
+class LazyShapes(Sequence):
+    r"""Sequence of the shapes of the roots of a lazy StepImporter
+
+    The sequence is indexed by root, whether or not the roots can be
+    transferred: its length is the number of roots, known without any
+    transfer, and accessing (or iterating over) a root that cannot be
+    transferred raises a StepShapeTransferException. The shapes of the
+    eager mode skip these roots, use StepImporter.compound to get all the
+    shapes that can be transferred, whatever the mode.
+
+    Parameters
+    ----------
+    importer : StepImporter
+
+    """
+    def __init__(self, importer):
+        self._importer = importer
+
+    def __len__(self):
+        return self._importer.nb_roots
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._importer.shape(j)
+                    for j in range(*i.indices(len(self)))]
+        return self._importer.shape(i)
+
+
 class StepExporter(object):
     r"""STEP file exporter
 
@@ -141,13 +453,16 @@ class StepExporter(object):
     schema : ["AP203", "AP214CD"]
         which STEP schema to use, either AP214CD or AP203
     tolerance : float
+    callback : callable, optional
+        Called at the end of each phase, see aocxchange.stats.Stats
 
     """
     def __init__(self,
                  filename,
                  verbose=False,
                  schema="AP214CD",
-                 tolerance=1e-4):
+                 tolerance=1e-4,
+                 callback=None):
         logger.info("StepExporter instantiated with filename : %s" % filename)
         logger.info("StepExporter schema : %s" % schema)
         logger.info("StepExporter tolerance : %s" % str(tolerance))
@@ -163,6 +478,7 @@ class StepExporter(object):
         self._filename = filename
         self._shapes = list()
         self.verbose = verbose
+        self.stats = Stats("StepExporter", callback)
 
         self._stepcontrol_writer = STEPControl_Writer()
         self._stepcontrol_writer.SetTolerance(tolerance)
@@ -182,16 +498,19 @@ class StepExporter(object):
 
     def write_file(self):
         r"""Write STEP file"""
-        for shp in self._shapes:
-            transfer_status = self._stepcontrol_writer.Transfer(shp,
-                                                                STEPControl_AsIs)
-            if transfer_status != IFSelect_RetDone:
-                msg = "An error occurred while transferring a " \
-                      "shape to the STEP writer"
-                logger.error(msg)
-                raise StepShapeTransferException(msg)
-
-        write_status = self._stepcontrol_writer.Write(self._filename)
+        self.stats.count("shapes", len(self._shapes))
+        with self.stats.phase("transfer"):
+            for shp in self._shapes:
+                transfer_status = self._stepcontrol_writer.Transfer(
+                    shp, STEPControl_AsIs)
+                if transfer_status != IFSelect_RetDone:
+                    msg = "An error occurred while transferring a " \
+                          "shape to the STEP writer"
+                    logger.error(msg)
+                    raise StepShapeTransferException(msg)
+
+        with self.stats.phase("write"):
+            write_status = self._stepcontrol_writer.Write(self._filename)
 
         if self.verbose:
             self._stepcontrol_writer.PrintStatsTransfer()
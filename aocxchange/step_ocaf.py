@@ -27,13 +27,24 @@ from aocxchange.checks import check_importer_filename, check_exporter_filename,\
 from aocxchange.exceptions import StepFileWriteException, \
     StepShapeTransferException
 from aocxchange.extensions import step_extensions
+from aocxchange.stats import Stats
+from aocxchange.topology import nb_faces
 
 logger = logging.getLogger(__name__)
 
 
 class StepOcafImporter(object):
-    r"""Imports STEP file that support layers & colors"""
-    def __init__(self, filename):
+    r"""Imports STEP file that support layers & colors
+
+    Parameters
+    ----------
+    filename : str
+    callback : callable, optional
+        Called at the end of each phase, see aocxchange.stats.Stats
+
+    """
+    def __init__(self, filename, callback=None):
+        self.stats = Stats("StepOcafImporter", callback)
 
         check_importer_filename(filename, step_extensions)
 
@@ -110,11 +121,13 @@ class StepOcafImporter(object):
         step_reader.SetNameMode(True)
         step_reader.SetMatMode(True)
 
-        status = step_reader.ReadFile(str(self.filename))
+        with self.stats.phase("parse"):
+            status = step_reader.ReadFile(str(self.filename))
 
         if status == IFSelect_RetDone:
             logger.info("Transfer doc to STEPCAFControl_Reader")
-            step_reader.Transfer(doc.GetHandle())
+            with self.stats.phase("transfer"):
+                step_reader.Transfer(doc.GetHandle())
 
         labels = TDF_LabelSequence()
         _ = TDF_LabelSequence()
@@ -123,6 +136,7 @@ class StepOcafImporter(object):
         h_shape_tool.GetObject().GetFreeShapes(labels)
 
         logger.info('Number of shapes at root :%i' % labels.Length())
+        self.stats.count("roots", labels.Length())
 
         # for i in range(labels.Length()):
         #     a_shape = h_shape_tool.GetObject().GetShape(labels.Value(i+1))
@@ -170,14 +184,28 @@ class StepOcafImporter(object):
                 self._colors.append(color)
                 self._layers.append(string_seq)
 
+        self.stats.count("shapes", len(self._shapes))
+        self.stats.count("faces", lambda: nb_faces(self._shapes))
         return True
 
 
 class StepOcafExporter(object):
-    r"""STEP export that support layers & colors"""
-    def __init__(self, filename, layer_name='layer-00'):
+    r"""STEP export that support layers & colors
+
+    Parameters
+    ----------
+    filename : str
+    layer_name : str
+        Name of the initial layer
+    callback : callable, optional
+        Called at the end of each phase, see aocxchange.stats.Stats
+
+    """
+    def __init__(self, filename, layer_name='layer-00', callback=None):
         logger.info("StepOcafExporter instantiated with "
                     "filename : %s" % filename)
+        self.stats = Stats("StepOcafExporter", callback)
+        self.stats.count("shapes", 0)
 
         check_exporter_filename(filename, step_extensions)
         check_overwrite(filename)
@@ -266,6 +294,7 @@ class StepOcafExporter(object):
         check_shape(shape)
 
         shp_label = self.shape_tool.AddShape(shape)
+        self.stats.count("shapes", self.stats.counts["shapes"] + 1)
 
         if color is None:
             self.colors.SetColor(shp_label,
@@ -297,7 +326,8 @@ class StepOcafExporter(object):
         work_session = XSControl_WorkSession()
         writer = STEPCAFControl_Writer(work_session.GetHandle(), False)
 
-        transfer_status = writer.Transfer(self.h_doc, STEPControl_AsIs)
+        with self.stats.phase("transfer"):
+            transfer_status = writer.Transfer(self.h_doc, STEPControl_AsIs)
         if transfer_status != IFSelect_RetDone:
             msg = "An error occurred while transferring a shape " \
                   "to the STEP writer"
@@ -305,7 +335,8 @@ class StepOcafExporter(object):
             raise StepShapeTransferException(msg)
         logger.info('Writing STEP file')
 
-        write_status = writer.Write(self.filename)
+        with self.stats.phase("write"):
+            write_status = writer.Write(self.filename)
         if write_status == IFSelect_RetDone:
             logger.info("STEP file write successful.")
         else:
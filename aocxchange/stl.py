@@ -6,14 +6,27 @@ from __future__ import print_function
 
 import logging
 
+from OCC.Core.BRep import BRep_Tool
 from OCC.Core.StlAPI import StlAPI_Reader, StlAPI_Writer
+from OCC.Core.TopAbs import TopAbs_FACE
+from OCC.Core.TopExp import TopExp_Explorer
+from OCC.Core.TopLoc import TopLoc_Location
 from OCC.Core.TopoDS import TopoDS_Shape
+try:
+    from OCC.Core.TopoDS import topods_Face
+except ImportError:
+    # pythonocc >= 7.7.1
+    from OCC.Core.TopoDS import topods
+    topods_Face = topods.Face
 
 from aocutils.mesh import mesh
 
 from aocxchange.extensions import stl_extensions
 from aocxchange.checks import check_importer_filename, check_exporter_filename,\
     check_overwrite, check_shape
+from aocxchange.stats import Stats
+from aocxchange.topology import nb_faces
+from aocxchange.utils import handle_object
 
 logger = logging.getLogger(__name__)
 
@@ -24,10 +37,13 @@ class StlImporter(object):
     Parameters
     ----------
     filename : str
+    callback : callable, optional
+        Called at the end of each phase, see aocxchange.stats.Stats
 
     """
-    def __init__(self, filename):
+    def __init__(self, filename, callback=None):
         logger.info("StlImporter instantiated with filename : %s" % filename)
+        self.stats = Stats("StlImporter", callback)
 
         check_importer_filename(filename, stl_extensions)
         self._filename = filename
@@ -41,8 +57,11 @@ class StlImporter(object):
         stl_reader = StlAPI_Reader()
         shape = TopoDS_Shape()
         print(self._filename)
-        stl_reader.Read(shape, self._filename)
+        with self.stats.phase("read"):
+            stl_reader.Read(shape, self._filename)
         self._shape = shape
+        # A face per triangle, only counted if the counts are read
+        self.stats.count("faces", lambda: nb_faces(shape))
 
     @property
     def shape(self):
@@ -61,8 +80,10 @@ class StlExporter(object):
     filename : str
     ascii_mode : bool
         (default is False)
+    callback : callable, optional
+        Called at the end of each phase, see aocxchange.stats.Stats
     """
-    def __init__(self, filename=None, ascii_mode=False):
+    def __init__(self, filename=None, ascii_mode=False, callback=None):
         logger.info("StlExporter instantiated with filename : %s" % filename)
         logger.info("StlExporter ascii : %s" % str(ascii_mode))
 
@@ -72,6 +93,7 @@ class StlExporter(object):
         self._shape = None  # only one shape can be exported
         self._ascii_mode = ascii_mode
         self._filename = filename
+        self.stats = Stats("StlExporter", callback)
 
     def set_shape(self, a_shape, factor=4000., use_min_dim=False):
         """
@@ -89,8 +111,11 @@ class StlExporter(object):
         """
         # raises an exception if the shape is not valid
         check_shape(a_shape)
-        mesh(shape=a_shape, factor=factor, use_min_dim=use_min_dim)
+        with self.stats.phase("mesh"):
+            mesh(shape=a_shape, factor=factor, use_min_dim=use_min_dim)
         self._shape = a_shape
+        self.stats.count("faces", lambda: nb_faces(a_shape))
+        self.stats.count("triangles", lambda: nb_triangles(a_shape))
 
     def write_file(self):
         r"""Write file"""
@@ -101,11 +126,14 @@ class StlExporter(object):
         stl_writer = StlAPI_Writer()
 
         # Cross OCC versions STL writing
-        try:
-            status = stl_writer.Write(self._shape, self._filename, self._ascii_mode)
-        except TypeError:
-            stl_writer.SetASCIIMode(self._ascii_mode)
-            status = stl_writer.Write(self._shape, self._filename)
+        with self.stats.phase("write"):
+            try:
+                status = stl_writer.Write(self._shape,
+                                          self._filename,
+                                          self._ascii_mode)
+            except TypeError:
+                stl_writer.SetASCIIMode(self._ascii_mode)
+                status = stl_writer.Write(self._shape, self._filename)
 
         if status != 0:
             msg = "STL write failed with code %i (%s)" % (status,
@@ -115,3 +143,28 @@ class StlExporter(object):
 
         # stl_writer.Write(self._shape, self._filename)
         logger.info("Wrote STL file")
+
+
+def nb_triangles(a_shape):
+    r"""Number of triangles of the triangulation of the faces of a shape
+
+    Parameters
+    ----------
+    a_shape : TopoDS_Shape
+        A meshed shape
+
+    Returns
+    -------
+    int
+
+    """
+    count = 0
+    explorer = TopExp_Explorer(a_shape, TopAbs_FACE)
+    while explorer.More():
+        face = topods_Face(explorer.Current())
+        triangulation = BRep_Tool.Triangulation(face, TopLoc_Location())
+        if triangulation is not None and not (hasattr(triangulation, "IsNull")
+                                              and triangulation.IsNull()):
+            count += handle_object(triangulation).NbTriangles()
+        explorer.Next()
+    return count
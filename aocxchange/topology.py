@@ -0,0 +1,38 @@
+# coding: utf-8
+
+r"""Topology counts of the shapes of the importers and exporters"""
+
+from OCC.Core.TopAbs import TopAbs_FACE
+from OCC.Core.TopTools import TopTools_IndexedMapOfShape
+try:
+    from OCC.Core.TopExp import topexp_MapShapes
+except ImportError:
+    # pythonocc >= 7.7.1
+    from OCC.Core.TopExp import topexp
+    topexp_MapShapes = topexp.MapShapes
+
+
+def nb_faces(shapes):
+    r"""Number of distinct faces of shapes
+
+    The faces are collected in a hashed map, in linear time (whereas
+    aocutils.topology.Topo compares every face to the faces already found).
+
+    Parameters
+    ----------
+    shapes : TopoDS_Shape or list[TopoDS_Shape]
+
+    Returns
+    -------
+    int
+        Sum of the numbers of distinct faces of the shapes
+
+    """
+    if hasattr(shapes, "ShapeType"):
+        shapes = [shapes]
+    count = 0
+    for a_shape in shapes:
+        faces = TopTools_IndexedMapOfShape()
+        topexp_MapShapes(a_shape, TopAbs_FACE, faces)
+        count += faces.Extent()
+    return count
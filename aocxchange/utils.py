@@ -55,3 +55,19 @@ def extract_file_extension(filename):
 
     # Switching to a more cross-OS version
     return os.path.splitext(filename)[1][1:]
+
+
+def handle_object(handle):
+    r"""Object referenced by an OCC handle
+
+    Handles are explicit in pythonocc < 7 (GetObject) and transparent in
+    later versions.
+
+    Parameters
+    ----------
+    handle : OCC handle or object
+
+    """
+    if hasattr(handle, "GetObject"):
+        return handle.GetObject()
+    return handle
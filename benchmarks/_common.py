@@ -0,0 +1,52 @@
+# coding: utf-8
+
+r"""Helpers shared by the benchmark scripts
+
+The scripts run from a checkout, either as modules (python -m
+benchmarks.benchmark_obj_read) or as scripts (python
+benchmarks/benchmark_obj_read.py), see the sys.path insert at their top.
+
+"""
+
+from __future__ import print_function
+
+import logging
+import timeit
+
+from os.path import abspath, join, dirname, getsize
+
+MODELS_IN = abspath(join(dirname(__file__), "..", "tests", "models_in"))
+
+
+def model(name):
+    r"""Path of a test model, e.g. model("2_boxes_binary.stl")"""
+    return join(MODELS_IN, name)
+
+
+def setup_logging(level=logging.INFO):
+    r"""Log format of the benchmarks"""
+    logging.basicConfig(level=level,
+                        format='%(asctime)s :: %(levelname)6s :: %(module)20s '
+                               ':: %(lineno)3d :: %(message)s')
+
+
+def timed(func, *args, **kwargs):
+    r"""Run func(*args, **kwargs), return the elapsed time in seconds"""
+    start = timeit.default_timer()
+    func(*args, **kwargs)
+    return timeit.default_timer() - start
+
+
+def best_time(func, *args, **kwargs):
+    r"""Best elapsed time of repeat runs of func(*args, **kwargs)
+
+    repeat is a keyword argument, default is 3
+
+    """
+    repeat = kwargs.pop("repeat", 3)
+    return min(timed(func, *args, **kwargs) for _ in range(repeat))
+
+
+def throughput(func, filename, repeat=3):
+    r"""Best throughput of func(filename) in MB/s"""
+    return getsize(filename) / 1e6 / best_time(func, filename, repeat=repeat)
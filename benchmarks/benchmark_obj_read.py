@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+r"""Benchmark of OBJ reading throughput (MB/s)
+
+Compares the block parser of aocxchange.pymesh.obj.Obj with a reference
+line-by-line reader equivalent to the previous implementation (triangles
+only, no normals).
+
+"""
+
+from __future__ import print_function
+
+import logging
+import shutil
+import sys
+import tempfile
+
+from os.path import abspath, join, dirname, getsize
+
+if __package__ in (None, ""):
+    # Run as a script from the checkout (python benchmarks/...py)
+    sys.path.insert(0, abspath(join(dirname(__file__), "..")))
+
+import numpy
+
+from aocxchange.pymesh.obj import Obj
+from aocxchange.pymesh.stl import Stl
+from benchmarks._common import model, setup_logging, throughput
+
+logger = logging.getLogger(__name__)
+
+
+def make_obj(filename, source, copies, write_normals):
+    r"""Write an OBJ made of translated copies of the STL file source"""
+    mesh = Stl.concatenate(Stl(source).translate_z(1000. * i)
+                           for i in range(copies))
+    mesh.save_obj(filename, write_normals=write_normals)
+
+
+def line_reader(filename):
+    r"""Reference line-by-line OBJ reader"""
+    def records(fh):
+        vertices_list = []
+        triangles_list = []
+        for line in fh:
+            if line.lstrip().startswith("vn"):
+                continue
+            elif line.lstrip().startswith("v"):
+                vertices_list.append([float(v) for v in line.split()[1:]])
+            elif line.lstrip().startswith("f"):
+                triangles_list.append([int(t.split("/")[0]) - 1
+                                       for t in line.split()[1:]])
+        for t in triangles_list:
+            yield ([0, 0, 0],
+                   (vertices_list[t[0]],
+                    vertices_list[t[1]],
+                    vertices_list[t[2]]),
+                   0)
+
+    with open(filename, "r") as fh:
+        return numpy.fromiter(records(fh), dtype=Obj.obj_dtype)
+
+
+if __name__ == "__main__":
+    setup_logging(logging.INFO)
+    source = model("2_boxes_binary.stl")
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for copies in (100, 1000):
+            for write_normals in (False, True):
+                obj_file = join(tmp_dir, "benchmark_%i.obj" % copies)
+                make_obj(obj_file, source, copies, write_normals)
+                print("%8.1f MB (normals: %5s) : line reader %7.1f MB/s, "
+                      "block parser %7.1f MB/s" % (
+                          getsize(obj_file) / 1e6,
+                          write_normals,
+                          throughput(line_reader, obj_file),
+                          throughput(Obj, obj_file)))
+    finally:
+        shutil.rmtree(tmp_dir)
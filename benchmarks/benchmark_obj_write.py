@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+r"""Benchmark of the vertex deduplication of BaseMesh.save_obj
+
+The test models are scaled up by concatenating translated copies. The reference
+list-based deduplication (previous implementation, O(n^2)) is only run on
+the smaller meshes.
+
+"""
+
+from __future__ import print_function
+
+import logging
+import shutil
+import sys
+import tempfile
+
+from os.path import abspath, join, dirname
+
+if __package__ in (None, ""):
+    # Run as a script from the checkout (python benchmarks/...py)
+    sys.path.insert(0, abspath(join(dirname(__file__), "..")))
+
+from aocxchange.pymesh.base import weld_vertices
+from aocxchange.pymesh.stl import Stl
+from benchmarks._common import model, setup_logging, timed
+
+logger = logging.getLogger(__name__)
+
+
+def scaled_up_mesh(filename, copies):
+    r"""A mesh made of translated copies of the mesh in filename"""
+    return Stl.concatenate(Stl(filename).translate_z(1000. * i)
+                           for i in range(copies))
+
+
+def list_dedup(vectors):
+    r"""Reference list-based vertex deduplication"""
+    keys = []
+    for vector in vectors:
+        for j in range(3):
+            key = ",".join(map(str, vector[j][:3]))
+            if key not in keys:
+                keys.append(key)
+    return len(keys)
+
+
+if __name__ == "__main__":
+    setup_logging(logging.WARNING)
+    source = model("2_boxes_binary.stl")
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for copies in (10, 100, 1000):
+            mesh = scaled_up_mesh(source, copies)
+            xyz = mesh.vectors[:, :, :3].reshape(-1, 3)
+            line = "%8i triangles : weld %7.3f s, save_obj %7.3f s" % (
+                len(mesh.vectors),
+                timed(weld_vertices, xyz),
+                timed(mesh.save_obj, join(tmp_dir, "benchmark.obj")))
+            if copies <= 10:
+                line += ", list dedup %7.3f s" % timed(list_dedup,
+                                                       mesh.vectors)
+            print(line)
+    finally:
+        shutil.rmtree(tmp_dir)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+r"""Benchmark of the transfer of the roots of STEP files
+
+Compares the serial transfer of StepImporter with the transfer by a pool of
+worker processes (workers=), on STEP files made of many translated copies of
+the 2_boxes and aube_pleine test models, each copy being a root.
+
+"""
+
+from __future__ import print_function
+
+import logging
+import shutil
+import sys
+import tempfile
+
+from os.path import abspath, join, dirname, getsize
+
+if __package__ in (None, ""):
+    # Run as a script from the checkout (python benchmarks/...py)
+    sys.path.insert(0, abspath(join(dirname(__file__), "..")))
+
+from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_Transform
+from OCC.Core.gp import gp_Trsf, gp_Vec
+
+from aocxchange.step import StepImporter, StepExporter
+from benchmarks._common import best_time, model, setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def make_step(filename, source, copies):
+    r"""Write a STEP file made of translated copies of the shapes of the STEP
+    file source, a root per copy"""
+    shapes = StepImporter(source).shapes
+    exporter = StepExporter(filename)
+    for i in range(copies):
+        trsf = gp_Trsf()
+        trsf.SetTranslation(gp_Vec(0., 0., 1000. * i))
+        for shape in shapes:
+            exporter.add_shape(BRepBuilderAPI_Transform(shape,
+                                                        trsf,
+                                                        True).Shape())
+    exporter.write_file()
+
+
+def duration(filename, workers, repeat=3):
+    r"""Best duration of the import of filename"""
+    return best_time(StepImporter, filename, workers=workers, repeat=repeat)
+
+
+if __name__ == "__main__":
+    setup_logging(logging.WARNING)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for name in ("2_boxes_203.stp", "aube_pleine.stp"):
+            for copies in (8, 32):
+                step_file = join(tmp_dir, "benchmark_%i.stp" % copies)
+                make_step(step_file, model(name), copies)
+                serial = duration(step_file, None)
+                print("%s x %i (%.1f MB) : serial %6.2f s" % (
+                    name, copies, getsize(step_file) / 1e6, serial))
+                for workers in (2, 4):
+                    parallel = duration(step_file, workers)
+                    print("%38s workers=%i %6.2f s (x %.2f)" % (
+                        "", workers, parallel, serial / parallel))
+    finally:
+        shutil.rmtree(tmp_dir)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+r"""Benchmark of ASCII STL reading throughput (MB/s)
+
+Compares the block parser of aocxchange.pymesh.stl.Stl with a reference
+line-by-line reader equivalent to the previous implementation.
+
+"""
+
+from __future__ import print_function
+
+import logging
+import shutil
+import sys
+import tempfile
+
+from os.path import abspath, join, dirname, getsize
+
+if __package__ in (None, ""):
+    # Run as a script from the checkout (python benchmarks/...py)
+    sys.path.insert(0, abspath(join(dirname(__file__), "..")))
+
+import numpy
+
+from aocxchange.pymesh.stl import Stl
+from benchmarks._common import model, setup_logging, throughput
+
+logger = logging.getLogger(__name__)
+
+
+def make_ascii_stl(filename, source, copies):
+    r"""Write an ASCII STL made of copies of the facets of source
+
+    Parameters
+    ----------
+    filename : str
+        The STL file to write
+    source : str
+        An ASCII STL file with a single solid
+    copies : int
+        Number of copies of the facets of source
+
+    """
+    with open(source, "rb") as fh:
+        content = fh.read()
+    facets = content[content.index(b"\n") + 1:content.rindex(b"endsolid")]
+    with open(filename, "wb") as fh:
+        fh.write(b"solid benchmark\n")
+        for _ in range(copies):
+            fh.write(facets)
+        fh.write(b"endsolid benchmark\n")
+
+
+def line_reader(filename):
+    r"""Reference line-by-line ASCII STL reader"""
+    def records(fh):
+        for line in fh:
+            line = line.lower().strip()
+            if line.startswith("facet normal"):
+                normal = [float(v) for v in line.split()[2:]]
+                vertices = list()
+            elif line.startswith("vertex"):
+                vertices.append([float(v) for v in line.split()[1:]])
+            elif line.startswith("endfacet"):
+                yield normal, vertices, 0
+            elif line.startswith("endsolid"):
+                return
+
+    with open(filename, "r") as fh:
+        return numpy.fromiter(records(fh), dtype=Stl.stl_dtype)
+
+
+if __name__ == "__main__":
+    setup_logging(logging.INFO)
+    source = model("2_boxes_ascii.stl")
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for copies in (100, 1000):
+            stl_file = join(tmp_dir, "benchmark_%i.stl" % copies)
+            make_ascii_stl(stl_file, source, copies)
+            print("%8.1f MB : line reader %7.1f MB/s, "
+                  "block parser %7.1f MB/s" % (
+                      getsize(stl_file) / 1e6,
+                      throughput(line_reader, stl_file),
+                      throughput(Stl, stl_file)))
+    finally:
+        shutil.rmtree(tmp_dir)
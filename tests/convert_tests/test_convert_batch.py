@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+r"""batch.py module tests"""
+
+import os
+import shutil
+import time
+
+import pytest
+
+from corelib.core.files import p_
+
+from aocxchange.convert.batch import expand_inputs, convert_batch, \
+    output_paths, summary
+from aocxchange.extensions import step_extensions
+from aocxchange.pymesh.stl import Stl
+
+
+def test_expand_inputs():
+    r"""Test files, globs and directories"""
+    models_in = p_(__file__, "../models_in")
+    box = os.path.join(models_in, "box_203.stp")
+    files = expand_inputs([box,
+                           os.path.join(models_in, "box_*.stp"),
+                           models_in,
+                           os.path.join(models_in, "nothing_*.stp")],
+                          step_extensions)
+    assert files[0] == box
+    assert files[1] == os.path.join(models_in, "box_214.stp")
+    assert len(files) == len(set(files))
+    assert os.path.join(models_in, "aube_pleine.stp") in files
+    assert all(f.endswith(".stp") for f in files)
+
+
+def _stl_to_stl(input_file, output_file, scale=1.):
+    r"""Module level conversion function used by the pool"""
+    mesh = Stl(input_file)
+    mesh.scale(scale, scale, scale)
+    mesh.save_stl(output_file)
+
+
+def _crash(input_file, output_file):
+    r"""Conversion function killing its worker process"""
+    os._exit(1)
+
+
+def _hang(input_file, output_file):
+    r"""Conversion function that never ends"""
+    time.sleep(3600.)
+
+
+def test_convert_batch():
+    r"""Test the results of a batch with a failure, with a pool"""
+    output_dir = p_(__file__, "../models_out/batch")
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    files = [p_(__file__, "../models_in/box_binary.stl"),
+             p_(__file__, "../models_in/missing.stl"),
+             p_(__file__, "../models_in/2_boxes_binary.stl")]
+    results = convert_batch(_stl_to_stl, files, ".stl",
+                            output_dir=output_dir, jobs=2, scale=2.)
+    assert [r.input_file for r in results] == files
+    assert [r.error is None for r in results] == [True, False, True]
+    assert os.path.isfile(os.path.join(output_dir, "box_binary.stl"))
+    assert "1 failed" in summary(results)
+    shutil.rmtree(output_dir)
+
+
+def test_output_paths_collisions():
+    r"""Test that files with the same name keep their relative paths"""
+    output_dir = p_(__file__, "../models_out/batch")
+    a = os.path.join("in", "a", "part.stp")
+    b = os.path.join("in", "b", "part.stp")
+    assert output_paths([a, b], ".stl", output_dir) == \
+        [os.path.join(output_dir, "a", "part.stl"),
+         os.path.join(output_dir, "b", "part.stl")]
+    assert output_paths([a], ".stl", output_dir) == \
+        [os.path.join(output_dir, "part.stl")]
+    with pytest.raises(ValueError):
+        output_paths([a, os.path.join("in", "a", "part.step")], ".stl",
+                     output_dir)
+
+
+def test_convert_batch_worker_crash():
+    r"""Test that a crashed worker process is reported as a failure"""
+    output_dir = p_(__file__, "../models_out/batch")
+    files = [p_(__file__, "../models_in/box_binary.stl"),
+             p_(__file__, "../models_in/2_boxes_binary.stl")]
+    results = convert_batch(_crash, files, ".stl",
+                            output_dir=output_dir, jobs=2, timeout=2.)
+    assert [r.error is None for r in results] == [False, False]
+    assert all(r.error.startswith("Timeout") for r in results)
+    shutil.rmtree(output_dir)
+
+
+def test_convert_batch_timeout_from_start():
+    r"""Test that the timeout of each file runs from its start"""
+    output_dir = p_(__file__, "../models_out/batch")
+    files = [p_(__file__, "../models_in/box_binary.stl"),
+             p_(__file__, "../models_in/2_boxes_binary.stl")]
+    start = time.time()
+    results = convert_batch(_hang, files, ".stl",
+                            output_dir=output_dir, jobs=2, timeout=2.)
+    # Both files time out together, not one after the other
+    assert time.time() - start < 3.5
+    assert all(r.error.startswith("Timeout") for r in results)
+    shutil.rmtree(output_dir)
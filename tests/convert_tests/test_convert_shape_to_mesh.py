@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+r"""shape_to_mesh.py module tests"""
+
+from OCC.Core.GProp import GProp_GProps
+try:
+    from OCC.Core.BRepGProp import brepgprop_VolumeProperties
+except ImportError:
+    # pythonocc >= 7.7.1
+    from OCC.Core.BRepGProp import brepgprop
+    brepgprop_VolumeProperties = brepgprop.VolumeProperties
+
+from corelib.core.files import p_
+
+from aocxchange.convert.shape_to_mesh import shape_to_mesh
+from aocxchange.step import StepImporter
+
+
+def test_shape_to_mesh():
+    r"""Test the in-memory triangulation against the shape volume"""
+    shapes = StepImporter(p_(__file__, "../models_in/aube_pleine.stp")).shapes
+    mesh = shape_to_mesh(shapes)
+    assert mesh.nb_faces > 0
+    assert [region.name for region in mesh.regions] == \
+        ["patch%i" % i for i in range(len(shapes))]
+
+    shapes_volume = 0.
+    for shape in shapes:
+        properties = GProp_GProps()
+        brepgprop_VolumeProperties(shape, properties)
+        shapes_volume += properties.Mass()
+    # Consistently (outwards) oriented triangles give the shapes volume
+    volume = mesh.to_soup().get_volume()
+    assert abs(volume - shapes_volume) < 0.02 * abs(shapes_volume)
@@ -3,7 +3,7 @@
 
 r"""step_to_obj.py module tests"""
 
-# import pytest
+import pytest
 
 from os.path import isfile
 
@@ -16,3 +16,11 @@ def test_happy_path():
     step_to_obj(p_(__file__, "../models_in/aube_pleine.stp"),
                 obj_file_path=p_(__file__, "../models_out/aube_pleine.obj"))
     assert isfile(p_(__file__, "../models_out/aube_pleine.obj"))
+
+
+def test_remove_intermediate_stl_deprecated():
+    with pytest.warns(DeprecationWarning):
+        step_to_obj(p_(__file__, "../models_in/aube_pleine.stp"),
+                    obj_file_path=p_(__file__,
+                                     "../models_out/aube_pleine.obj"),
+                    remove_intermediate_stl=False)
@@ -7,12 +7,72 @@ r"""step_to_stl.py module tests"""
 
 from os.path import isfile
 
+import numpy
+
+from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakeBox
+from OCC.Core.gp import gp_Pnt
+
 from corelib.core.files import p_
 
-from aocxchange.convert.step_to_stl import step_to_stl
+from aocxchange.convert.step_to_stl import step_to_stl, ONE_SHAPE_PER_FILE, \
+    ALL_SHAPES_IN_ONE_FILE
+from aocxchange.pymesh.stl import Stl
+from aocxchange.step import StepExporter
 
 
 def test_happy_path():
     step_to_stl(p_(__file__, "../models_in/aube_pleine.stp"),
                 stl_file_path=p_(__file__, "../models_out/aube_pleine.stl"))
     assert isfile(p_(__file__, "../models_out/aube_pleine.stl"))
+
+
+def _write_3_roots_step(step_file):
+    r"""Write a STEP file with 3 boxes as separate roots"""
+    exporter = StepExporter(step_file)
+    for i in range(3):
+        exporter.add_shape(BRepPrimAPI_MakeBox(gp_Pnt(20. * i, 0., 0.),
+                                               10., 10., 10.).Shape())
+    exporter.write_file()
+
+
+def test_workers():
+    r"""Test the parallel meshing of a STEP file with several roots"""
+    step_file = p_(__file__, "../models_out/3_roots.stp")
+    _write_3_roots_step(step_file)
+
+    stl_file = p_(__file__, "../models_out/3_roots.stl")
+    files, nb_shapes = step_to_stl(step_file,
+                                   stl_file,
+                                   multi_shape_mode=ONE_SHAPE_PER_FILE,
+                                   workers=2)
+    assert nb_shapes == 3
+    assert files == [p_(__file__, "../models_out/3_roots_%i.stl" % i)
+                     for i in range(3)]
+    assert all(isfile(f) for f in files)
+
+
+def test_all_shapes_in_one_file():
+    r"""Test writing all the shapes in a single STL file"""
+    step_file = p_(__file__, "../models_out/3_roots.stp")
+    _write_3_roots_step(step_file)
+
+    ascii_file = p_(__file__, "../models_out/3_roots_ascii.stl")
+    assert step_to_stl(step_file,
+                       ascii_file,
+                       multi_shape_mode=ALL_SHAPES_IN_ONE_FILE) == \
+        ([ascii_file], 3)
+    s_ascii = Stl(ascii_file)
+    assert [region.name for region in s_ascii.regions] == \
+        ["shape0", "shape1", "shape2"]
+    # Outwards oriented triangles
+    assert numpy.isclose(s_ascii.get_volume(), 3000., rtol=1e-3)
+
+    binary_file = p_(__file__, "../models_out/3_roots_binary.stl")
+    step_to_stl(step_file,
+                binary_file,
+                ascii_mode=False,
+                multi_shape_mode=ALL_SHAPES_IN_ONE_FILE)
+    s_binary = Stl(binary_file)
+    assert s_binary.mode == Stl.MODE_BINARY
+    assert numpy.unique(s_binary.attr).tolist() == [0, 1, 2]
+    assert numpy.allclose(s_binary.vectors, s_ascii.vectors, atol=1e-5)
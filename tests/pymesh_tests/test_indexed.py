@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+r"""indexed.py module tests"""
+
+import numpy
+
+from corelib.core.files import p_
+from aocxchange.pymesh.base import MODE_STL_ASCII
+from aocxchange.pymesh.indexed import IndexedMesh
+from aocxchange.pymesh.stl import Stl
+
+
+def test_from_stl():
+    r"""Test the vertex sharing of a box"""
+    m = IndexedMesh.from_stl(p_(__file__, "../models_in/box_binary.stl"))
+    assert m.nb_vertices == 56
+    assert m.nb_faces == 108
+    assert m.faces.dtype == numpy.int32
+
+    edges, counts = m.get_edges(return_counts=True)
+    assert (counts == 2).all()
+    assert m.nb_vertices - len(edges) + m.nb_faces == 2
+
+
+def test_soup_round_trip():
+    r"""Test going back to a triangle soup"""
+    filename = p_(__file__, "../models_in/2_boxes_binary.stl")
+    s = Stl(filename=filename)
+    m = IndexedMesh.from_soup(s)
+    soup = m.to_soup()
+    assert numpy.allclose(soup.vectors, s.vectors)
+    assert numpy.allclose(soup.normals, s.normals, atol=1e-6)
+
+    stl_file = p_(__file__, "../models_out/2_boxes_indexed.stl")
+    m.save_stl(stl_file, mode=MODE_STL_ASCII)
+    assert numpy.allclose(Stl(filename=stl_file).vectors, s.vectors,
+                          atol=1e-5)
+
+
+def test_soup_round_trip_float64():
+    r"""Test that float64 vertices are kept by the triangle soup"""
+    vertices = numpy.array([[123456.789, 0.1, 0.],
+                            [123457.789, 0.1, 0.],
+                            [123456.789, 1.1, -987654.321]])
+    m = IndexedMesh(vertices, [[0, 1, 2]])
+    assert (m.to_soup().vectors[0, :, :3] == vertices).all()
+    assert (m.to_soup(dtype=numpy.float64).vectors[0] == vertices).all()
+    m = IndexedMesh.from_soup(m.to_soup())
+    assert (m.vertices == vertices).all()
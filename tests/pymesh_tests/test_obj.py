@@ -7,9 +7,12 @@ r"""checks.py module tests"""
 
 from os.path import isfile
 
+import numpy
+
 from corelib.core.files import p_
 from aocxchange.pymesh.stl import Stl
 from aocxchange.pymesh.obj import Obj
+from aocxchange.pymesh.indexed import IndexedMesh
 
 
 def test_happy_path():
@@ -36,3 +39,114 @@ def test_happy_path():
                   write_normals=True)
 
     assert isfile(p_(__file__, "../models_out/2_boxes_with_normals.obj"))
+
+
+def test_save_obj_shared_vertices():
+    r"""Test that identical vertices are written once"""
+    mesh = Stl(filename=p_(__file__, "../models_in/box_binary.stl"))
+    obj_file = p_(__file__, "../models_out/box_shared_vertices.obj")
+    mesh.save_obj(obj_file)
+
+    with open(obj_file) as fh:
+        lines = fh.readlines()
+    assert len([line for line in lines if line.startswith("v ")]) == 56
+    assert len([line for line in lines if line.startswith("f ")]) == 108
+
+
+def test_save_obj_full_precision():
+    r"""Test that the coordinates are written without loss by default"""
+    vertices = numpy.array([[0.1, 1. / 3., 2. ** 0.5],
+                            [1e-7, 123456.789012345, -0.3],
+                            [numpy.pi, numpy.e, 0.]])
+    obj_file = p_(__file__, "../models_out/full_precision.obj")
+    IndexedMesh(vertices, [[0, 1, 2]]).save_obj(obj_file)
+    assert (Obj(obj_file).vertices == vertices).all()
+
+
+def test_float64_precision():
+    r"""Test that float64 vectors keep the coordinates of the file"""
+    obj_file = p_(__file__, "../models_out/large_coordinates.obj")
+    with open(obj_file, "w") as fh:
+        fh.write("v 123456.789 0.1 0\nv 123457.789 0.1 0\n"
+                 "v 123456.789 1.1 -987654.321\nf 1 2 3\n")
+    expected = numpy.array([[123456.789, 0.1, 0.],
+                            [123457.789, 0.1, 0.],
+                            [123456.789, 1.1, -987654.321]])
+    mesh = Obj(obj_file, dtype=numpy.float64)
+    assert (mesh.vectors[0] == expected).all()
+    mesh = Obj(obj_file)
+    assert (mesh.vectors[0, :, :3] == expected).all()
+
+
+def test_polygons_and_negative_indices():
+    r"""Test the fan triangulation and the index formats"""
+    obj_file = p_(__file__, "../models_out/polygons.obj")
+    with open(obj_file, "w") as fh:
+        fh.write("v 0 0 0\nv 1 0 0\nv 1 1 0\nv 0 1 0\n"
+                 "vn 0 0 1\n"
+                 "f -4//-1 -3//-1 -2//-1 -1//-1\n"
+                 "v 0.5 1.5 0\n"
+                 "f 1/1/1 2/1/1 3/1/1 \\\n  5/1/1 4/1/1\n")
+    mesh = Obj(obj_file)
+    assert len(mesh.vertices) == 5
+    assert mesh.faces.tolist() == [[0, 1, 2], [0, 2, 3],
+                                   [0, 1, 2], [0, 2, 4], [0, 4, 3]]
+    assert (mesh.normals_index == 0).all()
+    assert numpy.allclose(mesh.normals, [0, 0, 1])
+
+    indexed = IndexedMesh.from_obj(obj_file)
+    assert indexed.nb_vertices == 5
+    assert indexed.nb_faces == 5
+
+
+def test_groups_and_materials():
+    r"""Test that groups and materials are kept on load and save"""
+    obj_file = p_(__file__, "../models_out/groups.obj")
+    with open(obj_file, "w") as fh:
+        fh.write("mtllib patches.mtl\n"
+                 "v 0 0 0\nv 1 0 0\nv 1 1 0\nv 0 1 0\n"
+                 "f 1 2 3\n"
+                 "g inlet\nusemtl red\nf 1 2 3 4\n"
+                 "g\ng outlet\nusemtl blue\nf 1 3 4\nf 2 3 4\n")
+    mesh = Obj(obj_file)
+    assert [tuple(r) for r in mesh.regions] == [("default", 0, 1),
+                                                ("inlet", 1, 2),
+                                                ("outlet", 3, 2)]
+    assert [tuple(r) for r in mesh.materials] == [("red", 1, 2),
+                                                  ("blue", 3, 2)]
+    assert mesh.mtllib == ["patches.mtl"]
+    assert mesh.region_slice("outlet") == slice(3, 5)
+
+    saved_file = p_(__file__, "../models_out/groups_saved.obj")
+    mesh.save_obj(saved_file)
+    saved = Obj(saved_file)
+    assert saved.regions == mesh.regions
+    assert saved.materials == mesh.materials
+    assert saved.mtllib == mesh.mtllib
+    assert numpy.array_equal(saved.vectors, mesh.vectors)
+
+
+def test_concatenate_and_extract():
+    r"""Test that concatenate, extract and join rebuild the OBJ faces"""
+    obj_file = p_(__file__, "../models_out/2_boxes.obj")
+    Stl(filename=p_(__file__, "../models_in/2_boxes_binary.stl")).save_obj(
+        obj_file, write_normals=True)
+    a = Obj(obj_file)
+    b = Obj(obj_file).translate_x(100.)
+
+    mesh = Obj.concatenate([a, b])
+    assert isinstance(mesh, Obj)
+    assert len(mesh.faces) == len(a.faces) + len(b.faces)
+    assert len(mesh.vertices) == len(a.vertices) + len(b.vertices)
+    assert numpy.array_equal(mesh.vertices[mesh.faces],
+                             mesh.vectors[:, :, :3])
+    assert numpy.allclose(mesh.vertex_normals[mesh.normals_index[:, 0]],
+                          mesh.normals)
+
+    second = mesh.extract(1)
+    assert numpy.array_equal(second.faces, a.faces)
+    assert numpy.array_equal(second.vertices[second.faces],
+                             b.vectors[:, :, :3])
+
+    a.join(b)
+    assert numpy.array_equal(a.faces, mesh.faces)
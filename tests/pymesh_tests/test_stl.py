@@ -3,10 +3,14 @@
 
 r"""checks.py module tests"""
 
-# import pytest
+import pytest
+
+import numpy
 
 from corelib.core.files import p_
-from aocxchange.pymesh.stl import Stl
+from aocxchange.pymesh.base import MODE_STL_ASCII, Region
+from aocxchange.pymesh.stl import Stl, detect_format
+from aocxchange.stl_xtra import merge_stls
 
 
 def test_happy_path_ascii():
@@ -22,4 +26,219 @@ def test_happy_path_binary():
     s = Stl(filename=p_(__file__, "../models_in/2_boxes_binary.stl"))
     assert s is not None
     assert s.name == ""
-    assert s.mode == Stl.MODE_BINARY
\ No newline at end of file
+    assert s.mode == Stl.MODE_BINARY
+
+
+def test_binary_blank_header():
+    r"""Test a binary file whose header is only spaces"""
+    with open(p_(__file__, "../models_in/box_binary.stl"), "rb") as fh:
+        content = fh.read()
+    blank = p_(__file__, "../models_out/box_blank_header.stl")
+    with open(blank, "wb") as fh:
+        fh.write(b" " * Stl.HEADER_SIZE + content[Stl.HEADER_SIZE:])
+    s = Stl(filename=blank)
+    assert s.mode == Stl.MODE_BINARY
+    assert len(s.vectors) == 108
+
+
+def test_mode_policy():
+    r"""Test forcing the format instead of detecting it"""
+    binary = p_(__file__, "../models_in/2_boxes_binary.stl")
+    ascii_ = p_(__file__, "../models_in/2_boxes_ascii.stl")
+    assert Stl(binary, mode_policy=Stl.MODE_BINARY).mode == Stl.MODE_BINARY
+    assert Stl(ascii_, mode_policy=Stl.MODE_ASCII).mode == Stl.MODE_ASCII
+    # A binary file is not parsed as ASCII
+    with pytest.raises(RuntimeError):
+        Stl(binary, mode_policy=Stl.MODE_ASCII)
+    with pytest.raises(ValueError):
+        Stl(binary, mode_policy=3)
+
+
+def test_mmap_binary():
+    r"""Test memory-mapping a binary file"""
+    s = Stl(filename=p_(__file__, "../models_in/2_boxes_binary.stl"),
+            mmap=True)
+    assert s.read_only is True
+    assert s.vectors.shape == (216, 3, 3)
+    assert s.vectors.flags.writeable is False
+    volume = s.get_volume()
+
+    # Applying the first mutation makes a private copy
+    s.translate_x(10.)
+    assert s.vectors.flags.writeable is True
+    assert s.read_only is False
+    assert abs(s.get_volume() - volume) < 1e-3 * abs(volume)
+
+
+def test_mmap_save_to_mapped_file():
+    r"""Test saving a memory-mapped mesh to the file it is mapped from"""
+    filename = p_(__file__, "../models_out/2_boxes_mapped.stl")
+    Stl(filename=p_(__file__, "../models_in/2_boxes_binary.stl")).save_stl(
+        filename)
+    s = Stl(filename=filename, mmap=True)
+    vectors = numpy.array(s.vectors)
+    s.save_stl(filename)
+    assert s.read_only is False
+    assert numpy.array_equal(Stl(filename, dtype=numpy.float32).vectors,
+                             vectors)
+
+
+def test_mmap_extract():
+    r"""Test extracting a region of a memory-mapped mesh"""
+    s = Stl(filename=p_(__file__, "../models_in/2_boxes_binary.stl"),
+            mmap=True)
+    s.regions = [Region("a", 0, 100), Region("b", 100, 116)]
+    b = s.extract("b")
+    assert b.read_only is False
+    assert b.vectors.shape == (116, 3, 4)
+    assert b.vectors.dtype == numpy.float64
+    assert numpy.array_equal(b.vectors[:, :, :3], s.vectors[100:])
+    assert (b.vectors[:, :, 3] == 1.).all()
+    assert s.read_only is True
+
+
+def test_iter_chunks():
+    r"""Test reading a binary file by blocks of triangles"""
+    filename = p_(__file__, "../models_in/2_boxes_binary.stl")
+    chunks = list(Stl.iter_chunks(filename, chunk_triangles=100))
+    assert [chunk.size for chunk in chunks] == [100, 100, 16]
+    assert all(chunk.dtype == Stl.stl_dtype for chunk in chunks)
+    assert (numpy.concatenate(chunks) == Stl(filename).data).all()
+
+
+def test_ascii_same_as_binary():
+    r"""Test the ASCII parser against the binary version of the same file"""
+    s_ascii = Stl(filename=p_(__file__, "../models_in/2_boxes_ascii.stl"))
+    s_binary = Stl(filename=p_(__file__, "../models_in/2_boxes_binary.stl"))
+    assert s_ascii.data.shape == s_binary.data.shape
+    assert numpy.allclose(s_ascii.vectors, s_binary.vectors)
+    assert numpy.allclose(s_ascii.normals, s_binary.normals)
+
+
+def test_ascii_multi_solid():
+    r"""Test loading every solid of a merged ASCII file"""
+    merged = p_(__file__, "../models_out/merged_ascii.stl")
+    merge_stls([p_(__file__, "../models_in/box_ascii.stl"),
+                p_(__file__, "../models_in/2_boxes_ascii.stl")], merged)
+    s = Stl(filename=merged)
+    assert len(s.regions) == 2
+    assert [region.count for region in s.regions] == [108, 216]
+    assert s.region_slice(1) == slice(108, 324)
+    assert len(s.vectors[s.region_slice(1)]) == 216
+
+
+def test_ascii_facet_outside_solid():
+    r"""A facet between endsolid and the next solid is a parse error"""
+    with open(p_(__file__, "../models_in/box_ascii.stl"), "rb") as fh:
+        content = fh.read()
+    end = content.lower().rindex(b"endsolid")
+    facets = content[content.index(b"\n") + 1:end]
+    malformed = p_(__file__, "../models_out/facet_outside_solid.stl")
+    with open(malformed, "wb") as fh:
+        fh.write(content[:end] + b"endsolid a\n" + facets + content)
+    with pytest.raises(RuntimeError):
+        Stl(filename=malformed)
+
+
+def test_detect_format():
+    r"""Test the format detection and triangle count"""
+    assert detect_format(p_(__file__, "../models_in/box_binary.stl")) == \
+        (True, 108)
+    assert detect_format(p_(__file__, "../models_in/box_ascii.stl")) == \
+        (False, None)
+
+
+def test_update_normals_degenerate():
+    r"""Test normals of degenerate triangles"""
+    s = Stl(filename=p_(__file__, "../models_in/box_binary.stl"))
+    assert s.update_normals() is s
+    assert s.count_degenerate() == 0
+    assert numpy.allclose(numpy.linalg.norm(s.normals, axis=1), 1.)
+
+    s.vectors[0, 1] = s.vectors[0, 0]
+    assert s.update_normals().count_degenerate() == 1
+    assert (s.normals[0] == 0).all()
+
+
+def test_mass_properties():
+    r"""Test the integral properties of a box"""
+    s = Stl(filename=p_(__file__, "../models_in/box_binary.stl"))
+    properties = s.get_mass_properties()
+    bb_min, bb_max = properties.bounding_box
+    dx, dy, dz = bb_max - bb_min
+    volume = dx * dy * dz
+
+    assert numpy.isclose(properties.volume, volume)
+    assert numpy.isclose(s.get_volume(), volume)
+    assert numpy.isclose(s.get_area(), 2 * (dx * dy + dy * dz + dz * dx))
+    assert numpy.allclose(s.get_centroid(), (bb_min + bb_max) / 2.)
+    assert numpy.allclose(s.get_inertia(),
+                          numpy.diag([dy ** 2 + dz ** 2,
+                                      dx ** 2 + dz ** 2,
+                                      dx ** 2 + dy ** 2]) * volume / 12.)
+
+
+def test_lazy_transforms():
+    r"""Test that chained transforms are composed and applied once"""
+    s = Stl(filename=p_(__file__, "../models_in/box_binary.stl"))
+    initial = s.vectors.copy()
+    s.translate_x(10.).scale(2., 2., 2.).rotate_z(90.)
+    assert s._pending_transform is not None
+
+    expected = initial.copy()
+    expected[:, :, 0] += 10.
+    expected[:, :, :3] *= 2.
+    expected[:, :, [0, 1]] = expected[:, :, [1, 0]]
+    expected[:, :, 0] *= -1.
+    assert numpy.allclose(s.vectors, expected)
+    assert s._pending_transform is None
+
+    with pytest.raises(ValueError):
+        s.apply_transform(numpy.ones((4, 4)))
+
+
+def test_compact_float32():
+    r"""Test the compact float32 storage of vectors"""
+    filename = p_(__file__, "../models_in/box_binary.stl")
+    s = Stl(filename=filename, dtype=numpy.float32)
+    reference = Stl(filename=filename)
+    assert s.vectors.shape == (108, 3, 3)
+    assert s.vectors.dtype == numpy.float32
+
+    s.rotate_x(45.).translate_y(5.)
+    reference.rotate_x(45.).translate_y(5.)
+    assert s.vectors.dtype == numpy.float32
+    assert numpy.allclose(s.vectors, reference.vectors[:, :, :3], atol=1e-3)
+
+
+def test_save_ascii_round_trip():
+    r"""Test saving as ASCII with a reduced precision and reading back"""
+    s = Stl(filename=p_(__file__, "../models_in/2_boxes_binary.stl"))
+    ascii_file = p_(__file__, "../models_out/2_boxes_round_trip.stl")
+    s.save_stl(ascii_file, mode=MODE_STL_ASCII, precision=3)
+
+    s_ascii = Stl(filename=ascii_file)
+    assert s_ascii.mode == Stl.MODE_ASCII
+    assert numpy.allclose(s_ascii.vectors, s.vectors, atol=1e-3)
+
+
+def test_concatenate_and_split():
+    r"""Test concatenating meshes and splitting them back"""
+    box = Stl(filename=p_(__file__, "../models_in/box_binary.stl"))
+    boxes = Stl(filename=p_(__file__, "../models_in/2_boxes_binary.stl"))
+    box.translate_x(100.)
+    result = Stl.concatenate([box, boxes, box], names=["a", "b", "c"])
+    assert isinstance(result, Stl)
+    assert result.vectors.shape == (432, 3, 4)
+    assert [tuple(region) for region in result.regions] == \
+        [("a", 0, 108), ("b", 108, 216), ("c", 324, 108)]
+
+    parts = result.split()
+    assert len(parts) == 3
+    assert numpy.array_equal(parts[0].vectors, box.vectors)
+    assert numpy.array_equal(parts[1].vectors, boxes.vectors)
+    assert numpy.array_equal(parts[1].normals, boxes.normals)
+
+    joined = Stl(filename=p_(__file__, "../models_in/box_binary.stl"))
+    joined.join(boxes)
+    assert numpy.array_equal(joined.vectors[108:], result.vectors[108:324])
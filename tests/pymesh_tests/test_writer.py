@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+r"""writer.py module tests"""
+
+import numpy
+
+from corelib.core.files import p_
+from aocxchange.pymesh.base import MODE_STL_BINARY
+from aocxchange.pymesh.stl import Stl, detect_format
+from aocxchange.pymesh.writer import StlWriter
+
+
+def test_stl_writer_blocks():
+    r"""Test writing a mesh by blocks and patching the count"""
+    s = Stl(filename=p_(__file__, "../models_in/2_boxes_binary.stl"))
+    filename = p_(__file__, "../models_out/2_boxes_blocks.stl")
+    with StlWriter(filename) as writer:
+        writer.write(s.vectors[:100], attr=1)
+        writer.write(s.vectors[100:], attr=2)
+        assert writer.count == 216
+    assert writer.closed
+
+    assert detect_format(filename) == (True, 216)
+    s_blocks = Stl(filename=filename)
+    assert numpy.allclose(s_blocks.vectors, s.vectors)
+    assert numpy.allclose(s_blocks.normals, s.normals, atol=1e-6)
+    assert (s_blocks.attr[:100] == 1).all()
+    assert (s_blocks.attr[100:] == 2).all()
+
+
+def test_save_binary():
+    r"""Test saving as binary, from float32 views and from float64"""
+    filename = p_(__file__, "../models_in/2_boxes_binary.stl")
+    for dtype in (numpy.float32, None):
+        s = Stl(filename=filename, dtype=dtype)
+        s.translate_x(10.)
+        out = p_(__file__, "../models_out/2_boxes_saved.stl")
+        s.save_stl(out, mode=MODE_STL_BINARY)
+        assert numpy.allclose(Stl(filename=out).vectors[:, :, :3],
+                              s.vectors[:, :, :3])
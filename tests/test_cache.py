@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+r"""BREP cache tests"""
+
+import os
+import shutil
+
+import pytest
+
+from OCC.Core.TopAbs import TopAbs_COMPOUND
+
+from aocutils.topology import Topo
+
+from aocxchange.cache import BrepCache
+from aocxchange.iges import IgesImporter
+from aocxchange.step import StepImporter
+from corelib.core.files import path_from_file
+
+
+def _empty_cache(max_size=1 << 30):
+    r"""A cache in models_out, without any entry"""
+    directory = path_from_file(__file__, "./models_out/cache")
+    shutil.rmtree(directory, ignore_errors=True)
+    return BrepCache(directory, max_size=max_size)
+
+
+def test_step_importer_cache():
+    r"""The second import of a STEP file is served from the cache"""
+    cache = _empty_cache()
+    filename = path_from_file(__file__, "./models_in/2_boxes_203.stp")
+
+    importer = StepImporter(filename, cache=cache)
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entries) == (0, 1, 1)
+    assert stats.size > 0
+
+    cached = StepImporter(filename, cache=cache)
+    assert cache.stats().hits == 1
+    assert cached.root_types == importer.root_types
+    assert len(cached.shapes) == len(importer.shapes) == 1
+    assert cached.shape(0).ShapeType() == TopAbs_COMPOUND
+    assert Topo(cached.compound, return_iter=False).number_of_solids == 2
+
+    # Lazy importers are served from the cache too
+    lazy = StepImporter(filename, lazy=True, cache=cache)
+    assert cache.stats().hits == 2
+    assert lazy.shapes[0].ShapeType() == TopAbs_COMPOUND
+
+
+def test_step_importer_lazy_cache():
+    r"""A lazy import is stored once all its roots are transferred"""
+    cache = _empty_cache()
+    filename = path_from_file(__file__, "./models_in/2_boxes_203.stp")
+
+    lazy = StepImporter(filename, lazy=True, cache=cache)
+    assert cache.stats().entries == 0
+    assert lazy.shape(0).ShapeType() == TopAbs_COMPOUND
+    assert cache.stats().entries == 1
+
+    cached = StepImporter(filename, cache=cache)
+    assert cache.stats().hits == 1
+    assert cached.root_types == lazy.root_types
+
+
+def test_iges_importer_cache():
+    r"""The second import of an IGES file is served from the cache"""
+    cache = _empty_cache()
+    filename = path_from_file(__file__, "./models_in/box.igs")
+
+    importer = IgesImporter(filename, cache=cache)
+    cached = IgesImporter(filename, cache=cache)
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entries) == (1, 1, 1)
+    assert len(cached.shapes) == len(importer.shapes)
+    assert Topo(cached.compound, return_iter=False).number_of_faces == 6
+
+
+def test_cache_put_error(monkeypatch):
+    r"""A failure to store an entry is not mistaken for a concurrent put"""
+    cache = _empty_cache()
+
+    def rename(source, destination):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(os, "rename", rename)
+    with pytest.raises(OSError):
+        cache.put("key", [])
+    assert os.listdir(cache.directory) == []
+
+
+def test_importers_cache_write_error(monkeypatch):
+    r"""A failure to store the shapes in the cache does not fail imports"""
+    cache = _empty_cache()
+
+    def rename(source, destination):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(os, "rename", rename)
+    step_file = path_from_file(__file__, "./models_in/2_boxes_203.stp")
+    assert len(StepImporter(step_file, cache=cache).shapes) == 1
+    lazy = StepImporter(step_file, lazy=True, cache=cache)
+    assert lazy.shapes[0].ShapeType() == TopAbs_COMPOUND
+    importer = IgesImporter(path_from_file(__file__, "./models_in/box.igs"),
+                            cache=cache)
+    assert len(importer.shapes) > 0
+    assert cache.stats().entries == 0
+
+
+def test_cache_eviction():
+    r"""The least recently used entries are evicted"""
+    cache = _empty_cache(max_size=1)
+    StepImporter(path_from_file(__file__, "./models_in/2_boxes_203.stp"),
+                 cache=cache)
+    IgesImporter(path_from_file(__file__, "./models_in/box.igs"),
+                 cache=cache)
+    stats = cache.stats()
+    assert stats.evictions == 1
+    assert stats.entries == 1
+
+    cache.clear()
+    assert cache.stats().entries == 0
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+r"""STEP and IGES inspection tests"""
+
+import pytest
+
+from aocxchange.exceptions import IncompatibleFileFormatException, \
+    IgesFileReadException, StepFileReadException
+from aocxchange.inspection import inspect, inspect_step, inspect_iges
+from corelib.core.files import path_from_file
+
+# Python 2 and 3 compatibility
+try:
+    FileNotFoundError
+except NameError:
+    FileNotFoundError = IOError
+
+
+def test_inspect_wrong_path():
+    r"""Wrong filename"""
+    with pytest.raises(FileNotFoundError):
+        inspect_step("C:/stupid-filename.stp")
+
+
+def test_inspect_wrong_extension():
+    r"""Neither STEP nor IGES"""
+    with pytest.raises(IncompatibleFileFormatException):
+        inspect(path_from_file(__file__, "./models_in/box_binary.stl"))
+
+
+def test_inspect_wrong_file_content():
+    r"""Files that are not STEP or IGES files"""
+    with pytest.raises(StepFileReadException):
+        inspect(path_from_file(__file__, "./models_in/empty.stp"))
+    with pytest.raises(IgesFileReadException):
+        inspect(path_from_file(__file__, "./models_in/empty.igs"))
+
+
+def test_inspect_step_header():
+    r"""Header only"""
+    info = inspect(path_from_file(__file__, "./models_in/aube_pleine.stp"))
+    assert info.schema == "CONFIG_CONTROL_DESIGN"
+    assert info.application_protocol == "AP203"
+    assert info.description == "CATIA V5 STEP Exchange"
+    assert info.implementation_level == "2;1"
+    assert info.name.endswith("\\wx\\aube_pleine.stp")
+    assert info.originating_system == "CATIA V5 STEP AP203"
+    assert info.author == "none"
+    assert info.entity_counts is None
+    assert info.nb_roots is None
+
+    info = inspect_step(path_from_file(__file__, "./models_in/box_214.stp"))
+    assert info.application_protocol == "AP214"
+    assert info.name == "box_214"
+
+
+def test_inspect_step_entities():
+    r"""Entity counts"""
+    info = inspect_step(path_from_file(__file__,
+                                       "./models_in/2_boxes_203.stp"),
+                        count_entities=True)
+    assert info.nb_roots == 1
+    assert info.length_unit == "MILLIMETRE"
+    assert info.entity_counts["MANIFOLD_SOLID_BREP"] == 2
+    assert info.entity_counts["ADVANCED_FACE"] == 12
+    assert info.entity_counts["LENGTH_UNIT NAMED_UNIT SI_UNIT"] == 1
+    assert info.nb_entities == sum(info.entity_counts.values())
+
+
+def test_inspect_iges():
+    r"""Global, directory entry and terminate sections"""
+    info = inspect(path_from_file(__file__, "./models_in/aube_pleine.iges"))
+    assert info.version == "5.3"
+    assert info.product_id == "CNEXT - IGES PRODUCT"
+    assert info.file_name == "aube_pleine.igs"
+    assert info.native_system.startswith("IBM CATIA IGES")
+    assert info.unit == "MM"
+    assert info.model_space_scale == 1.
+    assert info.author == "thomas"
+    assert info.section_counts == {"S": 1, "G": 4, "D": 290, "P": 841}
+    assert info.nb_entities == 145
+    assert info.entity_counts[144] == 13
+    assert info.nb_roots == 13
+
+    info = inspect_iges(path_from_file(__file__, "./models_in/box.igs"))
+    assert info.native_system == "Rhinoceros ( Jan 18 2007 )"
+    assert info.product_id is None
+    assert info.section_counts["D"] == 2 * info.nb_entities
+    assert info.entity_counts == {314: 6, 406: 6, 128: 6}
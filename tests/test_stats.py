@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+r"""Instrumentation tests"""
+
+import pytest
+
+from aocxchange.stats import Stats, PhaseStats
+
+
+def test_stats_phases():
+    r"""Phases are recorded in order, with the callback called at the end
+    of each phase"""
+    events = list()
+    stats = Stats("Importer", callback=lambda s, p: events.append((s, p)))
+    with stats.phase("parse"):
+        sum(range(100000))
+    with stats.phase("transfer"):
+        pass
+    stats.count("roots", 2)
+
+    assert [phase.name for phase in stats.phases] == ["parse", "transfer"]
+    assert [p for _, p in events] == stats.phases
+    assert all(s is stats for s, _ in events)
+    for phase in stats.phases:
+        assert isinstance(phase, PhaseStats)
+        assert phase.wall_time >= 0.
+        assert phase.cpu_time >= 0.
+        assert phase.process_peak_rss is None or \
+            phase.process_peak_rss > 0
+    assert stats.wall_time == pytest.approx(sum(p.wall_time
+                                                for p in stats.phases))
+
+    d = stats.as_dict()
+    assert d["name"] == "Importer"
+    assert d["counts"] == {"roots": 2}
+    assert [p["name"] for p in d["phases"]] == ["parse", "transfer"]
+
+
+def test_stats_lazy_count():
+    r"""A callable count is only evaluated when the counts are read"""
+    calls = list()
+
+    def faces():
+        calls.append(None)
+        return 12
+
+    stats = Stats("Importer")
+    stats.count("faces", faces)
+    assert calls == []
+    assert stats.counts == {"faces": 12}
+    assert stats.as_dict()["counts"] == {"faces": 12}
+    assert len(calls) == 1
+
+
+def test_stats_failed_phase():
+    r"""A phase that raises is recorded"""
+    stats = Stats("Exporter")
+    with pytest.raises(RuntimeError):
+        with stats.phase("write"):
+            raise RuntimeError("write failed")
+    assert [phase.name for phase in stats.phases] == ["write"]
@@ -3,16 +3,20 @@
 
 r"""STEP file reading tests"""
 
+import numpy
 import pytest
 
+from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakeBox
+from OCC.Core.GProp import GProp_GProps
+from OCC.Core.gp import gp_Pnt
 from OCC.Core.TopoDS import TopoDS_Shape, TopoDS_Compound
 from OCC.Core.TopAbs import TopAbs_SOLID, TopAbs_COMPOUND
 
 from aocutils.topology import Topo
 
 from aocxchange.exceptions import IncompatibleFileFormatException,\
-    StepFileReadException
-from aocxchange.step import StepImporter
+    StepFileReadException, StepShapeTransferException
+from aocxchange.step import StepImporter, StepExporter
 from corelib.core.files import path_from_file
 
 # Python 2 and 3 compatibility
@@ -21,6 +25,20 @@ try:
 except NameError:
     FileNotFoundError = IOError
 
+try:
+    from OCC.Core.BRepGProp import brepgprop_VolumeProperties
+except ImportError:
+    # pythonocc >= 7.7.1
+    from OCC.Core.BRepGProp import brepgprop
+    brepgprop_VolumeProperties = brepgprop.VolumeProperties
+
+
+def _volume(shape):
+    r"""Volume of a shape"""
+    props = GProp_GProps()
+    brepgprop_VolumeProperties(shape, props)
+    return props.Mass()
+
 
 def test_step_importer_wrong_path():
     r"""Wrong filename"""
@@ -80,3 +98,78 @@ def test_step_importer_2_boxes():
     assert topo.number_of_comp_solids == 0
     assert topo.number_of_solids == 2
     assert topo.number_of_shells == 2
+
+
+def test_step_importer_lazy():
+    r"""Lazy mode : roots are transferred on first access"""
+    importer = StepImporter(path_from_file(__file__,
+                                           "./models_in/2_boxes_203.stp"),
+                            lazy=True)
+    assert importer.nb_roots == 1
+    assert len(importer.root_types) == 1
+    assert importer.root_types[0].startswith("Step")
+    assert len(importer.shapes) == 1
+    assert importer._transferred == {}
+
+    shape = importer.shape(0)
+    assert shape.ShapeType() == TopAbs_COMPOUND
+    assert importer.shapes[0] is shape
+    assert importer.shapes[-1] is shape
+    assert len(importer.shapes[:]) == 1
+
+    with pytest.raises(IndexError):
+        importer.shape(1)
+
+
+def test_step_importer_lazy_failed_root():
+    r"""Lazy mode : a root that cannot be transferred is not skipped"""
+    step_file = path_from_file(__file__, "./models_out/3_roots.stp")
+    exporter = StepExporter(step_file)
+    for i in range(3):
+        exporter.add_shape(BRepPrimAPI_MakeBox(gp_Pnt(20. * i, 0., 0.),
+                                               10., 10., 10.).Shape())
+    exporter.write_file()
+
+    importer = StepImporter(step_file, lazy=True)
+    # As if the transfer of the second root had failed
+    importer._transferred[1] = None
+    assert len(importer.shapes) == importer.nb_roots == 3
+    assert importer.shapes[0].ShapeType() == TopAbs_SOLID
+    with pytest.raises(StepShapeTransferException):
+        importer.shapes[1]
+    with pytest.raises(StepShapeTransferException):
+        list(importer.shapes)
+    # The compound only has the shapes that can be transferred
+    assert Topo(importer.compound, return_iter=False).number_of_solids == 2
+
+
+def test_step_importer_workers():
+    r"""Roots transferred by a pool of processes, in root order"""
+    step_file = path_from_file(__file__, "./models_out/4_roots.stp")
+    exporter = StepExporter(step_file)
+    for i in range(4):
+        exporter.add_shape(BRepPrimAPI_MakeBox(gp_Pnt(20. * i, 0., 0.),
+                                               10., 10., 10. + i).Shape())
+    exporter.write_file()
+
+    serial = StepImporter(step_file)
+    parallel = StepImporter(step_file, workers=3)
+    assert parallel.nb_roots == serial.nb_roots == 4
+    assert parallel.root_types == serial.root_types
+    assert len(parallel.shapes) == 4
+    for i, shape in enumerate(parallel.shapes):
+        assert Topo(shape, return_iter=False).number_of_solids == 1
+        assert numpy.isclose(_volume(shape), 1000. + 100. * i)
+
+
+def test_step_importer_stats():
+    r"""Phases and counts of an import"""
+    phases = list()
+    importer = StepImporter(path_from_file(__file__,
+                                           "./models_in/2_boxes_203.stp"),
+                            callback=lambda stats, phase: phases.append(phase))
+    assert importer.compound is not None
+    assert [phase.name for phase in importer.stats.phases] == \
+        ["parse", "transfer", "compound"]
+    assert phases == importer.stats.phases
+    assert importer.stats.counts == {"roots": 1, "shapes": 1, "faces": 12}